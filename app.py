@@ -1,45 +1,101 @@
-from services.jwt_config import jwt, configure_jwt
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-from models import db
-from config import config
-from routes import api
-import redis
+import os
+
+# Flask, the extensions, the routes and the services are imported inside
+# create_app() rather than here, so `import app` is cheap for anything that
+# only needs a function from it (the CLI, gunicorn.conf.py, the job workers).
+
+
+def create_app(background=True):
+    """Build the app. Background threads start here unless background is
+    False, in which case each serving process must call start_background(app)
+    itself (gunicorn.conf.py does this after fork)."""
+    from flask import Flask
+    from flask_cors import CORS
+    from config import config
+    from models import db
+    from routes import api
+    from services.jwt_config import configure_jwt
+    from services.search import init_search
+    from services.cache import init_response_cache
+    from services.activity import init_activity_tracking
+    from services.redis_store import init_redis_instrumentation
+    from services.profiling import init_profiling
+    from services.taxonomy import init_taxonomy
+    from services.slugs import init_slugs
+    from postloom import FLASK_COMMANDS
+
+    app = Flask(__name__, static_url_path='/static', static_folder='static')
+    app.config.from_object(config)
+
+    # Register API Blueprint
+    app.register_blueprint(api)
+    app.add_url_rule('/', 'Home', Home)
+
+    # Initialize CORS
+    CORS(app, resources={r"/api/*": {"origins": "*"}}, 
+         supports_credentials=True, 
+         allow_headers=["Content-Type", "Authorization"])
+
+    db.init_app(app)
+    configure_jwt(app)
+    init_redis_instrumentation(app)
+    init_profiling(app)
+    init_search(app)
+    init_response_cache(app)
+    init_activity_tracking(app)
+    init_taxonomy(app)
+    init_slugs(app)
+
+    # `flask <name>` aliases for the postloom commands
+    for name, command in FLASK_COMMANDS.items():
+        app.cli.add_command(command, name)
+
+    if background:
+        start_background(app)
+    return app
+
+
+def start_background(app):
+    """Start this process's flusher and indexer threads (once per process)"""
+    from services.analytics import start_flusher
+    from services.ranking import start_ranking
+    from services.search import start_indexer
+    from services.activity import start_activity_flusher
+    from services.profiling import start_metrics_flusher
+    from services.taxonomy import start_reconciler
+
+    if app.extensions.get("postloom_background_pid") == os.getpid():
+        return
+    app.extensions["postloom_background_pid"] = os.getpid()
+    start_flusher(app)
+    start_ranking(app)
+    start_indexer(app)
+    start_activity_flusher(app)
+    start_metrics_flusher(app)
+    start_reconciler(app)
+
+
+def after_fork(app):
+    """Give a forked worker its own connections and threads
+
+    Pools inherited from a preloading parent share sockets with it, so drop
+    them without closing (that would close the parent's too); they reopen
+    lazily in this process.
+    """
+    from models import db
+    from services.redis_store import redis_client
 
-
-# Initialize Flask app
-app = Flask(__name__, static_url_path='/static', static_folder='static')
-app.config.from_object(config)
-
-
-# Register API Blueprint
-app.register_blueprint(api)
-
-
-# Initialize CORS
-CORS(app, resources={r"/api/*": {"origins": "*"}}, 
-     supports_credentials=True, 
-     allow_headers=["Content-Type", "Authorization"])
-
-db.init_app(app)
-configure_jwt(app)
-
-
-
-# create tables (run this separately)
-def init_db():
     with app.app_context():
-        db.create_all()
-        print("Database tables created!")
+        db.engine.dispose(close=False)
+    redis_client.connection_pool.reset()
+    start_background(app)
 
 
-@app.route('/')
 def Home():
+    from config import config
     return f"Welcome to our Site {config.JWT_SECRET_KEY}"
 
-if __name__ == '__main__': 
-
-    init_db()
-    app.run(debug=True, port=8057, host='0.0.0.0')
-
 
+if __name__ == '__main__': 
+    # Development server only; production runs under gunicorn (see wsgi.py)
+    create_app().run(debug=True, port=8057, host='0.0.0.0')
@@ -0,0 +1,67 @@
+import json
+
+# Compares a results file with a baseline. Each tracked metric knows whether
+# higher or lower is better; a change in the bad direction larger than
+# `threshold` (a fraction) is a regression.
+
+# metric name -> True if higher is better
+DIRECTIONS = {
+    "ops_per_sec": True,
+    "rows_per_sec": True,
+    "rps": True,
+    "p50_us": False,
+    "p95_us": False,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "seconds": False,
+    "cold_start_s": False,
+    "first_request_ms": False,
+    "import_ms": False,
+    "storage_bytes": False,
+    "round_trips": False,
+    "mb_per_sec": True,
+    "peak_kib": False,
+}
+
+
+def flatten(results):
+    """{"micro.record_view.ops_per_sec": value, ...} for every tracked metric"""
+    flat = {}
+    for section in ("micro", "load", "ratelimit", "roundtrips", "jobs", "uploads", "serve", "imports"):
+        for name, stats in (results.get(section) or {}).items():
+            if name.startswith("_"):
+                continue
+            for metric, value in stats.items():
+                if metric in DIRECTIONS and isinstance(value, (int, float)):
+                    flat[f"{section}.{name}.{metric}"] = value
+    return flat
+
+
+def compare(baseline, current, threshold=0.10):
+    """Rows of (metric, baseline, current, change, regressed) for metrics present in both"""
+    old, new = flatten(baseline), flatten(current)
+    rows = []
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key], new[key]
+        if not before:
+            continue
+        change = (after - before) / before
+        higher_is_better = DIRECTIONS[key.rsplit(".", 1)[1]]
+        regressed = change < -threshold if higher_is_better else change > threshold
+        rows.append((key, before, after, change, regressed))
+    return rows
+
+
+def report(rows):
+    width = max((len(row[0]) for row in rows), default=10)
+    lines = [f"{'metric':<{width}}  {'baseline':>12}  {'current':>12}  {'change':>8}"]
+    for key, before, after, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        lines.append(f"{key:<{width}}  {before:>12g}  {after:>12g}  {change:>+7.1%}{flag}")
+    return "\n".join(lines)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+import types
+from datetime import timedelta
+
+# Builds the configuration the benchmarks run against and imports the app
+# with it. The `config` module is always replaced, never read, so a benchmark
+# can't touch the real database or Redis by accident.
+
+
+def configure(database_url=None, redis_url=None, workdir=None, flush_redis=None, background=True, **overrides):
+    """Install a benchmark config and return the Flask app
+
+    `redis_url="fake"` runs against an in-process fakeredis server (install
+    fakeredis[lua] for the Lua scripts); the default is database 15 of a
+    local Redis. Either of those is flushed first, a URL you pass only with
+    `flush_redis=True`. `background=False` builds the app without its flusher
+    threads. Other keyword arguments become config settings.
+    Must be called before anything imports config, models or services.
+    """
+    if "app" in sys.modules:
+        raise RuntimeError("configure() must run before the app is imported")
+
+    workdir = workdir or tempfile.mkdtemp(prefix="postloom-bench-")
+    settings = {
+        "SQLALCHEMY_DATABASE_URI": database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "REDIS_URL": "redis://localhost:6379/15" if redis_url in (None, "fake") else redis_url,
+        "SECRET_KEY": "benchmark",
+        "JWT_SECRET_KEY": "benchmark",
+        "JWT_ACCESS_TOKEN_EXPIRES": timedelta(hours=2),
+        "SEARCH_INDEX_PATH": os.path.join(workdir, "search_index.db"),
+        "MEDIA_ROOT": os.path.join(workdir, "uploads"),
+        "PROFILE_DIR": os.path.join(workdir, "profiles"),
+        **overrides,
+    }
+    module = types.ModuleType("config")
+    module.config = type("BenchmarkConfig", (), settings)
+    sys.modules["config"] = module
+
+    if redis_url == "fake":
+        import fakeredis
+        from services import redis_store
+
+        server = fakeredis.FakeServer()
+        redis_store.create_client = lambda url=None, **options: fakeredis.FakeRedis(server=server)
+
+    from app import create_app
+    from models import db
+    from services.redis_store import redis_client
+
+    app = create_app(background=background)
+    with app.app_context():
+        db.create_all()
+    if flush_redis is None:
+        flush_redis = redis_url in (None, "fake")
+    if flush_redis:
+        redis_client.flushdb()
+    app.config["BENCHMARK_WORKDIR"] = workdir
+    return app
@@ -0,0 +1,110 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+# Import-time budget check. Each target is imported in a fresh interpreter
+# under `python -X importtime` and the cumulative time of its top-level
+# imports is compared with a budget; the interpreter's own startup is not
+# counted. Run it before merging anything that adds a module-level import:
+#
+#   python -m benchmarks.importtime            # exits 1 over budget
+#   python -m benchmarks.importtime --runs 10
+#
+# The same numbers are collected by `python -m benchmarks.run --only imports`.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# name -> (statement, budget in ms). The CLI and app.py must stay cheap to
+# import; the full app is everything a worker imports before serving.
+TARGETS = {
+    "cli": ("import postloom", 60),
+    "app_module": ("import app", 20),
+    "full_app": ("import benchmarks.wsgi", 1500),
+}
+
+
+def parse(stderr, baseline=()):
+    """Total cumulative microseconds of the top-level imports in -X importtime output"""
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        if name.startswith("  ") or not cumulative.strip().isdigit():
+            continue  # nested import, or the header
+        name = name.strip()
+        if name not in baseline:
+            total += int(cumulative)
+    return total
+
+
+def _interpreter_modules():
+    """Top-level modules imported by an empty interpreter, not charged to any target"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"],
+                            capture_output=True, text=True, check=True)
+    return {line.rsplit("|", 1)[1].strip() for line in result.stderr.splitlines() if "|" in line}
+
+
+def measure(statement, runs=5, environ=None):
+    """Best of `runs` import times for `statement`, in ms"""
+    baseline = _interpreter_modules()
+    best = None
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                                cwd=ROOT, env=environ, capture_output=True, text=True)
+        if result.returncode:
+            raise RuntimeError(f"{statement!r} failed:\n{result.stderr[-2000:]}")
+        total = parse(result.stderr, baseline) / 1000
+        best = total if best is None else min(best, total)
+    return best
+
+
+def run(runs=5, targets=None):
+    """{target: {import_ms, budget_ms, over_budget}}"""
+    workdir = tempfile.mkdtemp(prefix="postloom-importtime-")
+    environ = dict(
+        os.environ,
+        BENCH_DB=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        BENCH_REDIS=os.environ.get("BENCH_REDIS", "redis://localhost:6379/15"),
+        BENCH_WORKDIR=workdir,
+    )
+    report = {}
+    for name in targets or TARGETS:
+        statement, budget = TARGETS[name]
+        try:
+            import_ms = round(measure(statement, runs, environ), 1)
+        except RuntimeError as e:
+            report[name] = {"error": str(e)}
+            continue
+        report[name] = {"import_ms": import_ms, "budget_ms": budget, "over_budget": import_ms > budget}
+    return report
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.importtime", description="Import-time budget check")
+    parser.add_argument("--runs", type=int, default=5, help="Imports per target; the best is kept")
+    parser.add_argument("targets", nargs="*", help=f"Default: all of {', '.join(TARGETS)}")
+    args = parser.parse_args(argv)
+    unknown = set(args.targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+
+    report = run(args.runs, args.targets or None)
+    failed = False
+    for name, stats in report.items():
+        if "error" in stats:
+            failed = True
+            print(f"{name:<12} ERROR {stats['error']}")
+            continue
+        flag = "  OVER BUDGET" if stats["over_budget"] else ""
+        failed = failed or stats["over_budget"]
+        print(f"{name:<12} {stats['import_ms']:>8.1f} ms  (budget {stats['budget_ms']} ms){flag}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+import threading
+import time
+
+# Job queue throughput. N no-op jobs are enqueued on a queue of their own,
+# one XADD at a time and pipelined with enqueue_many, then drained by 1 and
+# by 4 consumers (threads running services.job_queue.work in this process).
+# Reports enqueue and processing rates and the enqueue-to-done latency.
+
+QUEUE = "bench"
+CONSUMERS = (1, 4)  # the blocking client's pool holds 4 connections
+
+
+def _enqueue_rate(jobs, enqueue, enqueue_many):
+    started = time.perf_counter()
+    for i in range(jobs):
+        enqueue("bench_noop", {"t": time.time()}, QUEUE)
+    one_by_one = jobs / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for start in range(0, jobs, 1000):
+        enqueue_many("bench_noop", [{"t": time.time()} for _ in range(start, min(jobs, start + 1000))], QUEUE)
+    pipelined = jobs / (time.perf_counter() - started)
+    return round(one_by_one, 1), round(pipelined, 1)
+
+
+def _drain(jobs, consumers, done, work):
+    from benchmarks.load import percentile
+
+    del done[:]
+    threads = [
+        threading.Thread(target=work, kwargs={
+            "queue": QUEUE, "consumer": f"bench-{i}", "block_ms": 100,
+            "stop": lambda: len(done) >= jobs,
+        })
+        for i in range(consumers)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+
+    latencies = sorted(done[:jobs])
+    return {
+        "jobs": jobs,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(jobs / seconds, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+    }
+
+
+def run(app, jobs=5_000):
+    """{"enqueue": {...}, "drain_<n>_consumers": {...}}; jobs/sec is reported as rows_per_sec"""
+    from services import job_queue
+    from services.redis_store import redis_client
+
+    done = []
+
+    @job_queue.job("bench_noop", queue=QUEUE)
+    def bench_noop(t):
+        done.append(time.time() - t)
+
+    keys = (job_queue.stream_key(QUEUE), job_queue.delayed_key(QUEUE), job_queue.dead_key(QUEUE))
+    report = {}
+    try:
+        with app.app_context():
+            redis_client.delete(*keys)
+            one_by_one, pipelined = _enqueue_rate(jobs, job_queue.enqueue, job_queue.enqueue_many)
+            report["enqueue"] = {"ops_per_sec": one_by_one, "rows_per_sec": pipelined}
+            # Both enqueue passes are drained; time the drain on fresh jobs
+            report["drain_backlog"] = _drain(2 * jobs, 1, done, job_queue.work)
+            for consumers in CONSUMERS:
+                job_queue.enqueue_many("bench_noop", [{"t": time.time()} for _ in range(jobs)], QUEUE)
+                report[f"drain_{consumers}_consumers"] = _drain(jobs, consumers, done, job_queue.work)
+    finally:
+        job_queue.handlers.pop("bench_noop", None)
+        redis_client.delete(*keys)
+    return report
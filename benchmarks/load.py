@@ -0,0 +1,205 @@
+import http.client
+import json
+import random
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit, quote
+
+# Closed-loop HTTP load generator: `concurrency` threads each send one
+# request at a time for `duration` seconds, picking endpoints by weight.
+# Latency is recorded per endpoint and reported as throughput and
+# p50/p95/p99. Runs against a URL, or against the app served in-process by
+# werkzeug when no URL is given.
+
+# name -> (weight, needs auth, method)
+ENDPOINTS = {
+    "posts_list": (4, False, "GET"),
+    "post_detail": (6, False, "GET"),
+    "popular": (2, False, "GET"),
+    "search": (2, False, "GET"),
+    "comments": (2, False, "GET"),
+    "sessions": (1, True, "GET"),
+    "like": (2, True, "POST"),
+}
+
+# The default mix leaves out the rate limited write (see run_rate_limit)
+DEFAULT_ENDPOINTS = ("posts_list", "post_detail", "popular", "search", "comments", "sessions")
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Client:
+    """One keep-alive connection per thread"""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        headers.setdefault("User-Agent", "postloom-bench")
+        if body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            self.conn.close()
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            raise
+
+
+def _serve(app):
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-server", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def _discover(client, email, password):
+    """Slugs, post ids and search words to request, and a token for authenticated endpoints"""
+    status, body = client.request("GET", "/api/posts/?limit=100")
+    if status != 200:
+        raise RuntimeError(f"GET /api/posts/ answered {status}; is the database seeded?")
+    items = json.loads(body)["items"]
+    if not items:
+        raise RuntimeError("No published posts to request; seed the database first")
+    words = sorted({word.lower() for item in items for word in item["title"].split() if len(word) > 3})
+
+    token = None
+    status, body = client.request("POST", "/api/auth/login", {"email": email, "password": password})
+    if status == 200:
+        token = json.loads(body)["access_token"]
+    return {
+        "slugs": [item["slug"] for item in items],
+        "ids": [item["id"] for item in items],
+        "words": words or ["post"],
+        "token": token,
+    }
+
+
+def _path(name, targets, rng):
+    if name == "posts_list":
+        return "/api/posts/?limit=20"
+    if name == "post_detail":
+        return "/api/posts/" + quote(rng.choice(targets["slugs"]))
+    if name == "popular":
+        return "/api/posts/popular?kind=" + rng.choice(("trending", "popular"))
+    if name == "search":
+        return "/api/posts/search?q=" + quote(rng.choice(targets["words"]))
+    if name == "comments":
+        return f"/api/posts/{rng.choice(targets['ids'])}/comments"
+    if name == "sessions":
+        return "/api/auth/sessions"
+    if name == "like":
+        return f"/api/posts/{rng.choice(targets['ids'])}/like"
+    raise ValueError(f"Unknown endpoint: {name}")
+
+
+def run(app=None, url=None, duration=10, concurrency=8, endpoints=None, email=None, password=None, seed=1):
+    """Drive load for `duration` seconds and return {endpoint: stats} plus totals"""
+    from benchmarks.seed import PASSWORD
+
+    server = None
+    if url is None:
+        server, url = _serve(app)
+    try:
+        targets = _discover(Client(url), email or "bench0@example.com", password or PASSWORD)
+        names = [name for name in (endpoints or DEFAULT_ENDPOINTS) if targets["token"] or not ENDPOINTS[name][1]]
+        weights = [ENDPOINTS[name][0] for name in names]
+        auth = {"Authorization": f"Bearer {targets['token']}"} if targets["token"] else {}
+
+        latencies = {name: [] for name in names}
+        statuses = {name: Counter() for name in names}
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def worker(index):
+            rng = random.Random(seed + index)
+            client = Client(url)
+            local = {name: [] for name in names}
+            local_statuses = {name: Counter() for name in names}
+            while time.monotonic() < deadline:
+                name = rng.choices(names, weights)[0]
+                started = time.perf_counter()
+                try:
+                    _, needs_auth, method = ENDPOINTS[name]
+                    status, _ = client.request(method, _path(name, targets, rng),
+                                               headers=auth if needs_auth else None)
+                except (http.client.HTTPException, OSError):
+                    status = "error"
+                local[name].append(time.perf_counter() - started)
+                local_statuses[name][str(status)] += 1
+            with lock:
+                for name in names:
+                    latencies[name].extend(local[name])
+                    statuses[name].update(local_statuses[name])
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    report = {}
+    for name in names:
+        values = sorted(latencies[name])
+        errors = sum(count for status, count in statuses[name].items() if not status.startswith(("2", "3")))
+        report[name] = {
+            "requests": len(values),
+            "errors": errors,
+            "rps": round(len(values) / elapsed, 1),
+            "p50_ms": round(percentile(values, 50) * 1000, 2) if values else None,
+            "p95_ms": round(percentile(values, 95) * 1000, 2) if values else None,
+            "p99_ms": round(percentile(values, 99) * 1000, 2) if values else None,
+            "max_ms": round(values[-1] * 1000, 2) if values else None,
+            "statuses": dict(statuses[name]),
+        }
+    total = sum(item["requests"] for item in report.values())
+    report["_total"] = {
+        "requests": total,
+        "rps": round(total / elapsed, 1),
+        "seconds": round(elapsed, 2),
+        "concurrency": concurrency,
+        "url": url if server is None else "in-process",
+    }
+    return report
+
+
+def run_rate_limit(app, duration=10, concurrency=8, endpoints=("post_detail", "like"), **kwargs):
+    """The same in-process load with the rate limiter off, then on
+
+    "like" is limited per user and every thread shares one token, so with
+    the limiter on nearly all of it is answered 429 by the pre-limiter;
+    "post_detail" is not limited and shows what the rest of the app pays.
+    Returns {"off_<endpoint>": stats, "on_<endpoint>": stats}.
+    """
+    from services import rate_limit
+
+    enabled = rate_limit.ENABLED
+    report = {}
+    try:
+        for label, on in (("off", False), ("on", True)):
+            rate_limit.ENABLED = on
+            for name, stats in run(app, duration=duration, concurrency=concurrency,
+                                   endpoints=endpoints, **kwargs).items():
+                report[f"_{label}_total" if name == "_total" else f"{label}_{name}"] = stats
+    finally:
+        rate_limit.ENABLED = enabled
+    return report
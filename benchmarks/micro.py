@@ -0,0 +1,216 @@
+import random
+import statistics
+import time
+import uuid
+
+# In-process microbenchmarks of hot paths. Each runs for about `min_time`
+# seconds, split into `repeat` timed batches; per-operation times are derived
+# from whole batches so timer overhead doesn't dominate sub-microsecond
+# operations.
+
+
+def measure(fn, min_time=0.2, repeat=20):
+    """Time `fn()` and return ops/sec (best sample) and per-op latency stats in microseconds"""
+    # Calibrate a batch that takes about min_time / repeat
+    target = min_time / repeat
+    batch = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(batch):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= target:
+            break
+        batch = batch * 2 if elapsed == 0 else max(batch * 2, int(batch * target / elapsed) + 1)
+
+    per_op = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(batch):
+            fn()
+        per_op.append((time.perf_counter() - started) / batch)
+
+    per_op.sort()
+    return {
+        "ops_per_sec": round(1 / per_op[0], 1),
+        "mean_us": round(statistics.fmean(per_op) * 1e6, 3),
+        "p50_us": round(per_op[len(per_op) // 2] * 1e6, 3),
+        "p95_us": round(per_op[max(0, int(len(per_op) * 0.95) - 1)] * 1e6, 3),
+    }
+
+
+def once(fn):
+    """Time a single run of a bulk operation, for things too slow to repeat"""
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def _edit(rng, body):
+    """One editing session: rewrite, insert or delete a paragraph"""
+    paragraphs = body.split("\n\n")
+    i = rng.randrange(len(paragraphs))
+    words = paragraphs[i].split()
+    action = rng.random()
+    if action < 0.8:
+        words[rng.randrange(len(words))] = f"edit{rng.randrange(10 ** 6)}"
+        paragraphs[i] = " ".join(words)
+    elif action < 0.9 or len(paragraphs) < 3:
+        paragraphs.insert(i, " ".join(rng.sample(words, min(len(words), 40))))
+    else:
+        del paragraphs[i]
+    return "\n\n".join(paragraphs)
+
+
+def _version_history(author_id, body, interval, edits, min_time):
+    """Save `edits` versions of a throwaway post with every `interval`-th one a snapshot
+
+    Reports the time to save them, the bytes stored and the latency of
+    reading back a random version. Everything is rolled back afterwards.
+    """
+    from models import db, Post, PostVersion
+    from services import versioning
+
+    saved_interval = versioning.SNAPSHOT_INTERVAL
+    versioning.SNAPSHOT_INTERVAL = interval
+    try:
+        post = Post(title="Versioning benchmark", slug=f"bench-versions-{uuid.uuid4().hex}",
+                    body_md=body, body_html="", author_id=author_id)
+        db.session.add(post)
+        db.session.flush()
+
+        rng = random.Random(1)
+        started = time.perf_counter()
+        for _ in range(edits):
+            post.body_md = _edit(rng, post.body_md)
+            versioning.create_version(post)
+            db.session.flush()
+        seconds = time.perf_counter() - started
+
+        stored = db.session.execute(
+            db.select(db.func.sum(db.func.length(db.func.coalesce(PostVersion.body_md, PostVersion.delta))))
+            .where(PostVersion.post_id == post.id)
+        ).scalar()
+        numbers = iter(rng.randrange(1, edits + 1) for _ in range(10 ** 7))
+        read = measure(lambda: versioning.get_version_body(post.id, next(numbers)), min_time, repeat=5)
+        return {"seconds": round(seconds, 3), "storage_bytes": int(stored)}, read
+    finally:
+        db.session.rollback()
+        versioning.SNAPSHOT_INTERVAL = saved_interval
+
+
+def run(app, min_time=0.2):
+    """Run every microbenchmark against the seeded data. Returns {name: stats}."""
+    from models import db, Post, User, Comment, Tag, serialize_posts, serialize_users, serialize_tags
+    from services import analytics, comments, ranking, slugs, sessions, subscribers, taxonomy
+    from services.analytics import record_view, flush
+    from services.jwt_config import check_if_token_revoked
+    from services.keys import new_id
+    from services.profiling import collecting
+    from services.token_cache import revocation_cache
+
+    results = {}
+    with app.app_context():
+        posts = Post.query.order_by(Post.created_at.desc()).limit(50).all()
+        users = User.query.limit(50).all()
+
+        # -- serialization --
+        results["serialize_posts_50"] = measure(lambda: serialize_posts(posts), min_time)
+        # The query count must not grow with the number of posts
+        queries = {}
+        for size in (1, 10, len(posts)):
+            with collecting() as stats:
+                serialize_posts(posts[:size])
+            queries[f"queries_{size}"] = int(stats["db_queries"])
+        results["serialize_posts_queries"] = {**queries, "over_budget": len(set(queries.values())) > 1}
+        results["post_to_dict_x50"] = measure(lambda: [post.to_dict() for post in posts], min_time)
+        results["serialize_users_50"] = measure(lambda: serialize_users(users), min_time)
+        tags = Tag.query.order_by(Tag.name).limit(500).all()
+        results["serialize_tags_500"] = measure(lambda: serialize_tags(tags), min_time)
+
+        busiest = (db.session.query(Comment.post_id)
+                   .group_by(Comment.post_id).order_by(db.func.count().desc()).limit(1).scalar())
+        if busiest:
+            roots = Comment.query.filter_by(post_id=busiest, parent_id=None).all()
+            results["comment_threads_busiest_post"] = measure(lambda: comments.serialize_threads(roots), min_time)
+
+        # A 10k-comment thread: everything under the first page of roots
+        # (eager) versus the default per-level reply limit (lazy)
+        from benchmarks.seed import seed_thread, drop_thread
+        levels = seed_thread(posts[0].id, [user.id for user in users])
+        try:
+            roots = (Comment.query.filter_by(post_id=posts[0].id, parent_id=None)
+                     .order_by(Comment.created_at.desc()).limit(20).all())
+            results["comment_thread_10k_eager"] = measure(
+                lambda: comments.serialize_threads(roots, replies_limit=None), min_time, repeat=5)
+            results["comment_thread_10k_lazy"] = measure(lambda: comments.serialize_threads(roots), min_time, repeat=5)
+            db.session.rollback()
+        finally:
+            drop_thread(levels)
+
+        # -- versioning: 1,000 edits stored as full snapshots versus keyframes and deltas --
+        from services.versioning import SNAPSHOT_INTERVAL
+        for name, interval in (("snapshot", 1), ("delta", SNAPSHOT_INTERVAL)):
+            saved, read = _version_history(posts[0].author_id, posts[0].body_md, interval, 1_000, min_time)
+            results[f"versions_1k_{name}_save"] = saved
+            results[f"versions_1k_{name}_read"] = read
+
+        # -- auth --
+        user = users[0]
+        revoked_jti, live_jti = str(uuid.uuid4()), str(uuid.uuid4())
+        sessions.create_session(user.id, revoked_jti, {"device": "bench", "ip": "127.0.0.1"})
+        sessions.create_session(user.id, live_jti, {"device": "bench", "ip": "127.0.0.1"})
+        sessions.revoke_token(user.id, revoked_jti)
+        revocation_cache.sync_bloom()
+        results["blocklist_check_live"] = measure(lambda: check_if_token_revoked({}, {"jti": live_jti}), min_time)
+        results["blocklist_check_revoked"] = measure(lambda: check_if_token_revoked({}, {"jti": revoked_jti}), min_time)
+        results["blocklist_check_unknown"] = measure(
+            lambda: check_if_token_revoked({}, {"jti": str(uuid.uuid4())}), min_time)
+        # The same checks with REVOCATION_CACHE_ENABLED = False: one GET each
+        cache_enabled, revocation_cache.enabled = revocation_cache.enabled, False
+        try:
+            results["blocklist_check_live_uncached"] = measure(
+                lambda: check_if_token_revoked({}, {"jti": live_jti}), min_time)
+            results["blocklist_check_revoked_uncached"] = measure(
+                lambda: check_if_token_revoked({}, {"jti": revoked_jti}), min_time)
+        finally:
+            revocation_cache.enabled = cache_enabled
+        results["get_sessions"] = measure(lambda: sessions.get_sessions(user.id), min_time)
+
+        # -- slugs and keys --
+        results["slugify_ascii"] = measure(lambda: slugs.slugify("Tuning Redis pools for Flask workers"), min_time)
+        results["slugify_unicode"] = measure(lambda: slugs.slugify("Crème brûlée à la Straße — Łódź 2025"), min_time)
+        results["slug_resolve_cached"] = measure(lambda: slugs.resolve(posts[0].slug), min_time)
+        results["new_id"] = measure(new_id, min_time)
+
+        # -- view counting and rankings --
+        post_ids = [post.id for post in posts]
+        counter = iter(range(10 ** 12))
+        results["record_view"] = measure(lambda: record_view(post_ids[next(counter) % len(post_ids)]), min_time)
+        # Direct mode (ANALYTICS_WRITE_BEHIND = False): an UPDATE and commit per hit
+        write_behind, analytics.WRITE_BEHIND = analytics.WRITE_BEHIND, False
+        try:
+            results["record_view_direct"] = measure(
+                lambda: record_view(post_ids[next(counter) % len(post_ids)]), min_time)
+        finally:
+            analytics.WRITE_BEHIND = write_behind
+        seconds, _ = once(flush)
+        results["analytics_flush"] = {"seconds": round(seconds, 4)}
+        seconds, _ = once(ranking.refresh_trending)
+        results["ranking_refresh"] = {"seconds": round(seconds, 4)}
+        results["ranking_top_10"] = measure(lambda: ranking.top("trending", limit=10), min_time)
+
+        # -- tags and counters --
+        names = [tag.name for tag in tags[:15]] + [f"bench-new-tag-{i}" for i in range(5)]
+        seconds, _ = once(lambda: taxonomy.resolve_tags(names))
+        db.session.rollback()
+        results["resolve_tags_20"] = {"seconds": round(seconds, 4)}
+        seconds, _ = once(taxonomy.reconcile)
+        results["counts_reconcile"] = {"seconds": round(seconds, 4)}
+
+        # -- bulk import --
+        emails = [f"bench-{i}@example.org" for i in range(20_000)]
+        seconds, stats = once(lambda: subscribers.import_emails(emails))
+        results["subscriber_import_20k"] = {"seconds": round(seconds, 3), "rows_per_sec": stats["rows_per_sec"]}
+
+    return results
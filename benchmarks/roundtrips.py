@@ -0,0 +1,113 @@
+import random
+import sys
+
+# Redis round-trip budgets of the hot endpoints. Each endpoint is called
+# in-process through the Flask test client once to warm the caches and Lua
+# scripts, then again; the X-Redis-Round-Trips header of the second call (see
+# services.redis_store.init_redis_instrumentation) must be within budget.
+# Round trips are only counted on real Redis connections, not fakeredis:
+#
+#   python -m benchmarks.roundtrips                  # exits 1 over budget
+#   python -m benchmarks.roundtrips --redis redis://localhost:6379/15
+#
+# The same numbers are collected by `python -m benchmarks.run --only roundtrips`.
+
+EMAIL = "roundtrips@example.com"
+
+# endpoint -> round trips allowed. Authenticated calls may spend one on the
+# revocation check while this worker's Bloom filter is still syncing.
+BUDGETS = {
+    "login": 2,           # rate limit script, session hash and index
+    "sessions": 3,        # revocation check, prune and list, session hashes
+    "revoke_session": 3,  # revocation check, delete session, blocklist it
+    "logout": 2,          # revocation check, blocklist and delete session
+    "logout_all": 3,      # revocation check, list jtis, blocklist them all
+    "post_detail": 1,     # cached page: view counter and rankings in one pipeline
+}
+
+
+def _user():
+    from models import db, User
+    from benchmarks.seed import PASSWORD
+
+    user = User.query.filter_by(email=EMAIL).first()
+    if user is None:
+        user = User(email=EMAIL, username="roundtrips", role="author")
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+    return PASSWORD
+
+
+def run(app):
+    """{endpoint: {round_trips, budget_round_trips, over_budget}}"""
+    from flask_jwt_extended import decode_token
+    from models import Post
+
+    with app.app_context():
+        password = _user()
+        post = Post.query.filter_by(status="published").first()
+        slug = post.slug if post is not None else None
+
+    client = app.test_client()
+    # An address of our own, so earlier logins don't count against the login limit
+    client.environ_base["REMOTE_ADDR"] = f"10.{random.randrange(256)}.{random.randrange(256)}.1"
+    report = {}
+
+    def call(name, method, path, token=None, warm=True):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        body = {"email": EMAIL, "password": password} if name == "login" else None
+        if warm:
+            client.open(path, method=method, headers=headers, json=body)
+        response = client.open(path, method=method, headers=headers, json=body)
+        if response.status_code != 200:
+            report[name] = {"error": f"{method} {path} answered {response.status_code}"}
+            return response
+        count = int(response.headers.get("X-Redis-Round-Trips", 0))
+        report[name] = {"round_trips": count, "budget_round_trips": BUDGETS[name],
+                        "over_budget": count > BUDGETS[name]}
+        return response
+
+    first = call("login", "POST", "/api/auth/login", warm=False).get_json() or {}
+    second = call("login", "POST", "/api/auth/login").get_json() or {}
+    token, other = first.get("access_token"), second.get("access_token")
+    if token and other:
+        with app.app_context():
+            other_jti = decode_token(other)["jti"]
+        call("sessions", "GET", "/api/auth/sessions", token)
+        call("revoke_session", "POST", f"/api/auth/revoke-session/{other_jti}", token, warm=False)
+        call("logout", "POST", "/api/auth/logout", token, warm=False)
+        last = client.post("/api/auth/login", json={"email": EMAIL, "password": password}).get_json() or {}
+        if last.get("access_token"):
+            call("logout_all", "POST", "/api/auth/logout_all", last["access_token"], warm=False)
+    if slug is not None:
+        call("post_detail", "GET", f"/api/posts/{slug}")
+    return report
+
+
+def main(argv=None):
+    import argparse
+    from benchmarks import env
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.roundtrips", description="Redis round-trip budgets")
+    parser.add_argument("--db", help="SQLAlchemy URL (default: a fresh SQLite file)")
+    parser.add_argument("--redis", help="Redis URL (default: localhost db 15, flushed)")
+    args = parser.parse_args(argv)
+    if args.redis == "fake":
+        parser.error("round trips are only counted on a real Redis")
+
+    app = env.configure(args.db, args.redis, background=False)
+    failed = False
+    for name, stats in run(app).items():
+        if "error" in stats:
+            failed = True
+            print(f"{name:<16} ERROR {stats['error']}")
+            continue
+        flag = "  OVER BUDGET" if stats["over_budget"] else ""
+        failed = failed or stats["over_budget"]
+        print(f"{name:<16} {stats['round_trips']:>3} round trips  (budget {stats['budget_round_trips']}){flag}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# Benchmark runner.
+#
+#   python -m benchmarks.run                         # seed "small", micro + load
+#   python -m benchmarks.run --scale medium --redis fake
+#   python -m benchmarks.run --only load --url http://localhost:8057 --duration 30
+#   python -m benchmarks.run --only ratelimit --duration 20
+#   python -m benchmarks.run --only jobs --jobs 20000
+#   python -m benchmarks.run --only uploads
+#   python -m benchmarks.run --baseline benchmarks/baseline.json
+#   python -m benchmarks.run --save-baseline
+#   python -m benchmarks.run --db mysql+pymysql://... --scale large --compact-keys --only micro
+#   python -m benchmarks.run --redis redis://localhost:6379/15 --flush-redis --only serve --worker-classes sync,gthread
+#   python -m benchmarks.run --no-seed --only imports
+#   python -m benchmarks.run --redis redis://localhost:6379/15 --flush-redis --only roundtrips
+#
+# Results are written to benchmarks/results/<timestamp>.json. With a
+# baseline the run is compared against it and exits with status 1 if any
+# metric regressed by more than --threshold; it does too if serialize_posts'
+# query count grew with the list or an endpoint went over its Redis
+# round-trip budget.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    from benchmarks.seed import SCALES
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="PostLoom benchmarks")
+    parser.add_argument("--db", help="SQLAlchemy URL (default: a fresh SQLite file)")
+    parser.add_argument("--redis", help='Redis URL, or "fake" for fakeredis (default: localhost db 15, flushed)')
+    parser.add_argument("--flush-redis", action="store_true", help="Flush the Redis database given with --redis")
+    parser.add_argument("--compact-keys", action="store_true", help="Create the schema with COMPACT_KEYS on")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    for name in ("users", "categories", "tags", "posts", "comments"):
+        parser.add_argument(f"--{name}", type=int, help=f"Override the scale's {name} count")
+    parser.add_argument("--no-seed", action="store_true", help="Use the data already in --db")
+    parser.add_argument("--only", default="micro,load", help="Comma-separated: micro, load, ratelimit, roundtrips, jobs, uploads, serve, imports")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per microbenchmark")
+    parser.add_argument("--url", help="Load test a running server instead of the in-process app")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--endpoints", help="Comma-separated load test endpoints")
+    parser.add_argument("--jobs", type=int, default=5_000, help="Jobs per job queue run")
+    parser.add_argument("--worker-classes", default="sync,gthread,gevent", help="gunicorn worker classes to serve")
+    parser.add_argument("--workers", type=int, help="gunicorn workers (default: one per core)")
+    parser.add_argument("--threads", type=int, help="Threads per gthread worker")
+    parser.add_argument("--no-warmup", action="store_true", help="Serve without the boot warmup")
+    parser.add_argument("--out", help="Results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="Compare against this results file")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Also write results to {DEFAULT_BASELINE}")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Regression threshold (fraction)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from benchmarks import compare, env
+    from benchmarks.seed import SCALES, seed
+
+    args = parse_args(argv)
+    sections = {section.strip() for section in args.only.split(",") if section.strip()}
+    if "serve" in sections and args.redis == "fake":
+        print("--only serve needs a real Redis: gunicorn workers can't share fakeredis")
+        return 2
+    if "roundtrips" in sections and args.redis == "fake":
+        print("--only roundtrips needs a real Redis: fakeredis round trips aren't counted")
+        return 2
+
+    app = env.configure(args.db, args.redis, flush_redis=args.flush_redis or None, COMPACT_KEYS=args.compact_keys)
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": app.config["SQLALCHEMY_DATABASE_URI"].split("://", 1)[0],
+            "redis": "fake" if args.redis == "fake" else "redis",
+            "scale": args.scale,
+            "compact_keys": args.compact_keys,
+        }
+    }
+
+    if not args.no_seed:
+        counts = dict(SCALES[args.scale])
+        for name in counts:
+            if getattr(args, name) is not None:
+                counts[name] = getattr(args, name)
+        print(f"Seeding {counts} ...", flush=True)
+        with app.app_context():
+            results["seed"] = seed(**counts)
+        print(f"Seeded in {results['seed']['seconds']}", flush=True)
+
+    if "micro" in sections:
+        from benchmarks import micro
+        print("Running microbenchmarks ...", flush=True)
+        results["micro"] = micro.run(app, args.min_time)
+        for name, stats in results["micro"].items():
+            print(f"  {name:<32} {stats}")
+
+    if "load" in sections:
+        from benchmarks import load
+        print(f"Load testing for {args.duration}s at concurrency {args.concurrency} ...", flush=True)
+        results["load"] = load.run(
+            app, url=args.url, duration=args.duration, concurrency=args.concurrency,
+            endpoints=args.endpoints.split(",") if args.endpoints else None
+        )
+        for name, stats in results["load"].items():
+            print(f"  {name:<16} {stats}")
+
+    if "ratelimit" in sections:
+        from benchmarks import load
+        print(f"Load testing with the rate limiter off and on, {args.duration}s each ...", flush=True)
+        results["ratelimit"] = load.run_rate_limit(app, duration=args.duration, concurrency=args.concurrency)
+        for name, stats in results["ratelimit"].items():
+            print(f"  {name:<20} {stats}")
+
+    if "roundtrips" in sections:
+        from benchmarks import roundtrips
+        print("Checking Redis round-trip budgets ...", flush=True)
+        results["roundtrips"] = roundtrips.run(app)
+        for name, stats in results["roundtrips"].items():
+            print(f"  {name:<16} {stats}")
+
+    if "jobs" in sections:
+        from benchmarks import jobs
+        print(f"Running {args.jobs} jobs through the job queue ...", flush=True)
+        results["jobs"] = jobs.run(app, args.jobs)
+        for name, stats in results["jobs"].items():
+            print(f"  {name:<20} {stats}")
+
+    if "uploads" in sections:
+        from benchmarks import uploads
+        print("Uploading media ...", flush=True)
+        results["uploads"] = uploads.run(app)
+        for name, stats in results["uploads"].items():
+            print(f"  {name:<24} {stats}")
+
+    if "serve" in sections:
+        from benchmarks import serve
+        print("Serving under gunicorn per worker class ...", flush=True)
+        results["serve"] = serve.run(
+            app, worker_classes=args.worker_classes.split(","), workers=args.workers, threads=args.threads,
+            duration=args.duration, concurrency=args.concurrency,
+            endpoints=args.endpoints.split(",") if args.endpoints else None, warmup=not args.no_warmup
+        )
+        for name, stats in results["serve"].items():
+            print(f"  {name:<16} {stats}")
+
+    if "imports" in sections:
+        from benchmarks import importtime
+        print("Measuring import times ...", flush=True)
+        results["imports"] = importtime.run()
+        for name, stats in results["imports"].items():
+            print(f"  {name:<16} {stats}")
+
+    out = args.out or os.path.join(HERE, "results", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {out}")
+    if args.save_baseline:
+        with open(DEFAULT_BASELINE, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {DEFAULT_BASELINE}")
+
+    status = 0
+    # Query counts (micro) and Redis round trips (roundtrips) have fixed budgets
+    over_budget = [f"{section}.{name}" for section in ("micro", "roundtrips")
+                   for name, stats in (results.get(section) or {}).items()
+                   if stats.get("over_budget") or "error" in stats]
+    if over_budget:
+        print(f"Over budget: {', '.join(over_budget)}")
+        status = 1
+
+    if args.baseline:
+        rows = compare.compare(compare.load(args.baseline), results, args.threshold)
+        print(compare.report(rows))
+        if any(row[4] for row in rows):
+            print(f"Regressions beyond {args.threshold:.0%} found")
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
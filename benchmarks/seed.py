@@ -0,0 +1,209 @@
+import random
+import time
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+
+# Synthetic data at a configurable scale, inserted with executemany in
+# chunks. Generation is seeded, so two runs at the same scale produce the
+# same rows (ids aside).
+
+SCALES = {
+    "small": {"users": 50, "categories": 10, "tags": 50, "posts": 1_000, "comments": 5_000},
+    "medium": {"users": 500, "categories": 30, "tags": 200, "posts": 20_000, "comments": 100_000},
+    "large": {"users": 5_000, "categories": 50, "tags": 1_000, "posts": 1_000_000, "comments": 2_000_000},
+}
+
+PASSWORD = "benchmark-password"
+CHUNK = 5_000
+
+WORDS = (
+    "redis cache query index latency python flask token session draft publish "
+    "editor comment thread ranking search render markdown stream batch worker "
+    "queue slug tag category profile metric pool schema migration backup deploy"
+).split()
+
+
+def _chunks(rows, size=CHUNK):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _insert(model_or_table, rows):
+    from models import db
+    table = getattr(model_or_table, "__table__", model_or_table)
+    for chunk in _chunks(rows):
+        db.session.execute(table.insert(), chunk)
+    db.session.commit()
+
+
+def _title(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 8))).capitalize()
+
+
+def _body(rng):
+    paragraphs = []
+    for _ in range(rng.randint(2, 6)):
+        paragraphs.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(30, 80))))
+    return "## " + _title(rng) + "\n\n" + "\n\n".join(paragraphs)
+
+
+def table_sizes():
+    """{table: {"data_bytes", "index_bytes"}} where the database can tell us"""
+    from models import db
+
+    dialect = db.engine.dialect.name
+    if dialect == "mysql":
+        rows = db.session.execute(db.text(
+            "SELECT table_name, data_length, index_length FROM information_schema.tables "
+            "WHERE table_schema = DATABASE()"
+        ))
+    elif dialect == "postgresql":
+        rows = db.session.execute(db.text(
+            "SELECT relname, pg_relation_size(relid), pg_indexes_size(relid) FROM pg_stat_user_tables"
+        ))
+    else:
+        return {}
+    return {name: {"data_bytes": int(data), "index_bytes": int(index)} for name, data, index in rows}
+
+
+def seed(users, categories, tags, posts, comments, seed=1):
+    """Insert the data and prime the derived stores (counters, search index, rankings). Needs an app context."""
+    from models import User, Category, Tag, Post, PostAnalytics, Comment, post_tags
+    from services.keys import new_id
+    from services.slugs import slugify
+    from services import search, ranking, taxonomy
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    timings = {}
+
+    started = time.perf_counter()
+    password_hash = generate_password_hash(PASSWORD)
+    user_rows = [{
+        "id": new_id(), "username": f"bench{i}", "email": f"bench{i}@example.com",
+        "password_hash": password_hash,
+        "role": "admin" if i == 0 else "editor" if i % 10 == 0 else "author",
+        "created_at": now - timedelta(days=rng.randint(0, 730))
+    } for i in range(users)]
+    _insert(User, user_rows)
+    category_rows = [{"id": new_id(), "name": f"category-{i}"} for i in range(categories)]
+    _insert(Category, category_rows)
+    tag_rows = [{"id": new_id(), "name": f"tag-{i}"} for i in range(tags)]
+    _insert(Tag, tag_rows)
+    timings["users_categories_tags"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    post_ids = []
+    for chunk_start in range(0, posts, CHUNK):
+        rows, analytics, links = [], [], []
+        for i in range(chunk_start, min(posts, chunk_start + CHUNK)):
+            post_id = new_id()
+            post_ids.append(post_id)
+            title = _title(rng)
+            body = _body(rng)
+            rows.append({
+                "id": post_id, "title": title, "slug": f"{slugify(title)}-{i}",
+                "body_md": body, "body_html": "<p>" + body.replace("\n\n", "</p><p>") + "</p>",
+                "read_time_estimate": max(1, len(body.split()) // 200),
+                "status": "published" if rng.random() < 0.9 else "draft",
+                "version_count": 0,
+                "created_at": now - timedelta(minutes=rng.randint(0, 525_600)),
+                "author_id": rng.choice(user_rows)["id"],
+                "category_id": rng.choice(category_rows)["id"] if category_rows else None,
+            })
+            analytics.append({
+                "id": new_id(), "post_id": post_id,
+                "views": int(rng.paretovariate(1.2) * 10), "likes": int(rng.paretovariate(1.5))
+            })
+            for tag in rng.sample(tag_rows, min(len(tag_rows), rng.randint(0, 4))):
+                links.append({"post_id": post_id, "tag_id": tag["id"]})
+        _insert(Post, rows)
+        _insert(PostAnalytics, analytics)
+        _insert(post_tags, links)
+    timings["posts"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    # Replies attach to an earlier comment on the same post; counts are
+    # tallied here because the inserts bypass add_comment()
+    by_post = {}
+    comment_rows = []
+    for i in range(comments):
+        post_id = rng.choice(post_ids)
+        siblings = by_post.setdefault(post_id, [])
+        parent = rng.choice(siblings) if siblings and rng.random() < 0.4 else None
+        row = {
+            "id": new_id(), "post_id": post_id, "user_id": rng.choice(user_rows)["id"],
+            "body": " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40))),
+            "parent_id": parent["id"] if parent else None, "replies_count": 0,
+            "created_at": now - timedelta(minutes=rng.randint(0, 525_600))
+        }
+        if parent:
+            parent["replies_count"] += 1
+        siblings.append(row)
+        comment_rows.append(row)
+    # Parents first, for the self-referencing foreign key
+    _insert(Comment, comment_rows)
+    timings["comments"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    # The bulk inserts bypass the ORM, so the posts_count columns start at 0
+    taxonomy.reconcile()
+    timings["counters"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    search.rebuild_index()
+    timings["search_index"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    ranking.reconcile()
+    ranking.refresh_trending()
+    timings["rankings"] = time.perf_counter() - started
+
+    return {
+        "tables": table_sizes(),
+        "counts": {"users": users, "categories": categories, "tags": tags, "posts": posts, "comments": comments},
+        "seconds": {name: round(value, 3) for name, value in timings.items()},
+    }
+
+
+def seed_thread(post_id, user_ids, size=10_000, roots=100, seed=1):
+    """Add one busy comment thread of `size` comments to `post_id`
+
+    Returns the inserted rows grouped by depth, for drop_thread().
+    """
+    from models import Comment
+    from services.comments import MAX_DEPTH
+    from services.keys import new_id
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    levels = [[] for _ in range(MAX_DEPTH + 1)]
+    everything = []
+    for i in range(size):
+        parent = rng.choice(everything) if i >= roots else None
+        if parent is not None and parent["depth"] == MAX_DEPTH:
+            parent = None
+        depth = parent["depth"] + 1 if parent else 0
+        row = {
+            "id": new_id(), "post_id": post_id, "user_id": rng.choice(user_ids),
+            "body": " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40))),
+            "parent_id": parent["id"] if parent else None, "replies_count": 0,
+            "created_at": now - timedelta(seconds=size - i), "depth": depth
+        }
+        if parent:
+            parent["replies_count"] += 1
+        levels[depth].append(row)
+        everything.append(row)
+    for level in levels:
+        _insert(Comment, [{k: v for k, v in row.items() if k != "depth"} for row in level])
+    return levels
+
+
+def drop_thread(levels):
+    """Delete a seed_thread() thread, deepest comments first"""
+    from models import db, Comment
+
+    for level in reversed(levels):
+        for chunk in _chunks([row["id"] for row in level]):
+            db.session.execute(Comment.__table__.delete().where(Comment.__table__.c.id.in_(chunk)))
+    db.session.commit()
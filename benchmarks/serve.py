@@ -0,0 +1,90 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+# Serves the seeded app under gunicorn, once per worker class, and measures
+# cold start (launch until the first successful response, workers warmed up
+# included), the latency of that first response, and steady-state
+# throughput with benchmarks.load. Needs gunicorn (and gevent for the gevent
+# class) and a Redis server the workers can share, so not fakeredis.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+WORKER_CLASSES = ("sync", "gthread", "gevent")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url, process, timeout):
+    """Seconds until GET /api/posts/ answers 200, and that response's latency"""
+    from benchmarks.load import Client
+
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {process.returncode}")
+        try:
+            request_started = time.perf_counter()
+            status, _ = Client(url).request("GET", "/api/posts/?limit=20")
+            if status == 200:
+                return time.monotonic() - started, time.perf_counter() - request_started
+        except OSError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f"Server not ready after {timeout}s")
+
+
+def run(app, worker_classes=WORKER_CLASSES, workers=None, threads=None, duration=10, concurrency=8,
+        endpoints=None, warmup=True, timeout=60):
+    """{worker_class: {cold_start_s, first_request_ms, rps, p50_ms, ...}} for each class"""
+    from benchmarks import load
+
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    redis_url = app.config["REDIS_URL"]
+    workers = workers or os.cpu_count()
+    report = {}
+    for worker_class in worker_classes:
+        port = _free_port()
+        url = f"http://127.0.0.1:{port}"
+        environ = dict(
+            os.environ,
+            BENCH_DB=uri,
+            BENCH_REDIS=redis_url,
+            BENCH_WORKDIR=app.config["BENCHMARK_WORKDIR"],
+            BENCH_COMPACT_KEYS="1" if app.config.get("COMPACT_KEYS") else "0",
+            POSTLOOM_WORKER_CLASS=worker_class,
+            POSTLOOM_WORKERS=str(workers),
+            POSTLOOM_BIND=f"127.0.0.1:{port}",
+            POSTLOOM_ACCESS_LOG="/dev/null",
+            POSTLOOM_LOG_LEVEL="warning",
+            POSTLOOM_WARMUP="1" if warmup else "0",
+        )
+        if threads:
+            environ["POSTLOOM_THREADS"] = str(threads)
+        command = [sys.executable, "-m", "gunicorn", "-c", os.path.join(ROOT, "gunicorn.conf.py"), "benchmarks.wsgi:app"]
+        process = subprocess.Popen(command, cwd=ROOT, env=environ)
+        try:
+            cold_start, first_request = _wait_ready(url, process, timeout)
+            stats = load.run(url=url, duration=duration, concurrency=concurrency, endpoints=endpoints)["_total"]
+            report[worker_class] = {
+                "workers": workers,
+                "cold_start_s": round(cold_start, 2),
+                "first_request_ms": round(first_request * 1000, 2),
+                "rps": stats["rps"],
+                "requests": stats["requests"],
+            }
+        except RuntimeError as e:
+            report[worker_class] = {"error": str(e)}
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    return report
@@ -0,0 +1,70 @@
+import os
+import time
+import tracemalloc
+
+# Media upload throughput and memory. Files of each size are POSTed to
+# /api/media/upload through the test client, as a raw body and as CKEditor's
+# multipart form. Throughput is the best of untraced runs; one more run of
+# each traces the Python heap while the request is handled: the upload is
+# streamed to disk in media.CHUNK_SIZE chunks, so the peak should
+# stay flat as the files grow. The bodies are random bytes behind a PNG
+# signature, so the variants queued afterwards fail off the request path.
+
+SIZES = {"64k": 64 * 1024, "1m": 1024 * 1024, "16m": 16 * 1024 * 1024}
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _upload(client, headers, size, multipart, trace=False):
+    from io import BytesIO
+
+    body = PNG_SIGNATURE + os.urandom(size - len(PNG_SIGNATURE))
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    if multipart:
+        response = client.post("/api/media/upload", headers=headers,
+                                data={"upload": (BytesIO(body), "bench.png")}, content_type="multipart/form-data")
+    else:
+        response = client.post("/api/media/upload?filename=bench.png", headers=headers,
+                               data=body, content_type="application/octet-stream")
+    seconds = time.perf_counter() - started
+    peak = None
+    if trace:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    if response.status_code != 201:
+        raise RuntimeError(f"Upload answered {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return seconds, peak
+
+
+def run(app, repeat=5):
+    """{"upload_<size>_<raw|multipart>": {"mb_per_sec", "seconds", "peak_kib"}}"""
+    from flask_jwt_extended import create_access_token
+    from models import User
+    from services import rate_limit
+
+    with app.app_context():
+        user = User.query.first()
+        if user is None:
+            raise RuntimeError("No users to upload as; seed the database first")
+        token = create_access_token(identity=str(user.id), additional_claims={"role": user.role})
+    headers = {"Authorization": f"Bearer {token}"}
+    client = app.test_client()
+
+    # The upload limit would stop the run long before it finishes
+    enabled = rate_limit.ENABLED
+    rate_limit.ENABLED = False
+    report = {}
+    try:
+        for name, size in SIZES.items():
+            for multipart in (False, True):
+                best = min(_upload(client, headers, size, multipart)[0] for _ in range(repeat))
+                _, peak = _upload(client, headers, size, multipart, trace=True)
+                report[f"upload_{name}_{'multipart' if multipart else 'raw'}"] = {
+                    "mb_per_sec": round(size / best / 1024 ** 2, 1),
+                    "seconds": round(best, 4),
+                    "peak_kib": round(peak / 1024, 1),
+                }
+    finally:
+        rate_limit.ENABLED = enabled
+    return report
@@ -0,0 +1,12 @@
+import os
+
+from benchmarks import env
+
+# WSGI entry point for benchmarks.serve: builds the app against the database,
+# Redis and work directory the parent benchmark process seeded, passed in
+# BENCH_DB, BENCH_REDIS and BENCH_WORKDIR.
+
+app = env.configure(
+    os.environ["BENCH_DB"], os.environ["BENCH_REDIS"], os.environ["BENCH_WORKDIR"],
+    flush_redis=False, background=False, COMPACT_KEYS=os.environ.get("BENCH_COMPACT_KEYS") == "1"
+)
@@ -0,0 +1,56 @@
+import multiprocessing
+import os
+
+# gunicorn settings for PostLoom:  gunicorn -c gunicorn.conf.py
+#
+# POSTLOOM_WORKER_CLASS picks the worker model:
+#   sync     one request at a time per process; the most predictable, size
+#            POSTLOOM_WORKERS to about 2 x cores + 1
+#   gthread  POSTLOOM_THREADS requests per process; the default, good for this
+#            app's mix of short database and Redis calls
+#   gevent   green threads with the standard library monkey-patched; many
+#            concurrent slow clients per process (needs gevent, and a pure
+#            Python database driver such as pymysql to yield on queries)
+#
+# The app is preloaded in the master so imports, compiled regexes and the
+# markdown renderer are shared copy-on-write; database and Redis pools are
+# dropped after fork and reopened by each worker, which then warms up before
+# it is handed requests.
+
+worker_class = os.environ.get("POSTLOOM_WORKER_CLASS", "gthread")
+
+if worker_class == "gevent":
+    # Must happen before the app (and its sockets and threading locks) is imported
+    from gevent import monkey
+    monkey.patch_all()
+
+wsgi_app = "wsgi:app"
+bind = os.environ.get("POSTLOOM_BIND", "0.0.0.0:8057")
+workers = int(os.environ.get("POSTLOOM_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("POSTLOOM_THREADS", 8 if worker_class == "gthread" else 1))
+worker_connections = int(os.environ.get("POSTLOOM_WORKER_CONNECTIONS", 1000))
+preload_app = True
+
+# Recycle workers now and then so slow leaks can't accumulate; the jitter
+# keeps them from all restarting at once
+max_requests = int(os.environ.get("POSTLOOM_MAX_REQUESTS", 10000))
+max_requests_jitter = max_requests // 10
+timeout = int(os.environ.get("POSTLOOM_TIMEOUT", 30))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = os.environ.get("POSTLOOM_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.environ.get("POSTLOOM_LOG_LEVEL", "info")
+
+
+def post_fork(server, worker):
+    from app import after_fork
+    after_fork(server.app.wsgi())
+
+
+def post_worker_init(worker):
+    # Runs in the worker before it accepts connections
+    if os.environ.get("POSTLOOM_WARMUP", "1") != "0":
+        from services.warmup import warmup
+        warmup(worker.wsgi)
@@ -1,8 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
-import re
-import uuid
+from services.keys import KeyType, new_id
 
 # Initialize SQLAlchemy
 db = SQLAlchemy()
@@ -10,13 +10,15 @@ db = SQLAlchemy()
 
 # Association table for many-to-many relationship between Post and Tag
 post_tags = db.Table('post_tags',
-    db.Column('post_id', db.String(36), db.ForeignKey('post.id'), primary_key=True),
-    db.Column('tag_id', db.String(36), db.ForeignKey('tag.id'), primary_key=True)
+    db.Column('post_id', KeyType, db.ForeignKey('post.id'), primary_key=True),
+    db.Column('tag_id', KeyType, db.ForeignKey('tag.id'), primary_key=True)
 )
 
 # Models
 class User(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    __table_args__ = (db.Index('ix_user_created_at', 'created_at'),)
+
+    id = db.Column(KeyType, primary_key=True, default=new_id)
     username = db.Column(db.String(150), unique=True, nullable=False)
     email = db.Column(db.String(150), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
@@ -33,19 +35,20 @@ class User(db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
     
-    def to_dict(self):
+    def to_dict(self, posts_count=None):
         return {
             'id': self.id,
             'username': self.username,
             'email': self.email,
             'role': self.role,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'posts_count': len(self.posts)
+            'posts_count': posts_count if posts_count is not None else grouped_counts(Post.author_id, [self.id]).get(self.id, 0)
         }
 
 class Category(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(KeyType, primary_key=True, default=new_id)
     name = db.Column(db.String(50), unique=True, nullable=False)
+    posts_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # maintained by services.taxonomy
     
     posts = db.relationship("Post", backref="category", lazy=True)
     
@@ -53,33 +56,40 @@ class Category(db.Model):
         return {
             'id': self.id,
             'name': self.name,
-            'posts_count': len(self.posts)
+            'posts_count': self.posts_count or 0
         }
 
 class Tag(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(KeyType, primary_key=True, default=new_id)
     name = db.Column(db.String(50), unique=True, nullable=False)
+    posts_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # maintained by services.taxonomy
     
     def to_dict(self):
         return {
             'id': self.id,
             'name': self.name,
-            'posts_count': len(self.posts)
+            'posts_count': self.posts_count or 0
         }
 
 class Post(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    __table_args__ = (
+        db.Index('ix_post_status_created_at', 'status', 'created_at'),
+        db.Index('ix_post_created_at', 'created_at'),
+    )
+
+    id = db.Column(KeyType, primary_key=True, default=new_id)
     title = db.Column(db.String(255), nullable=False)
     slug = db.Column(db.String(255), unique=True, nullable=False)
     body_md = db.Column(db.Text, nullable=False)
     body_html = db.Column(db.Text, nullable=False)
     read_time_estimate = db.Column(db.Integer)
     status = db.Column(db.String(50), default="draft")  # draft, pending, published, archived
+    version_count = db.Column(db.Integer, nullable=False, default=0)  # last assigned PostVersion.version_number
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    author_id = db.Column(db.String(36), db.ForeignKey("user.id"), nullable=False)
-    category_id = db.Column(db.String(36), db.ForeignKey("category.id"))
+    author_id = db.Column(KeyType, db.ForeignKey("user.id"), nullable=False)
+    category_id = db.Column(KeyType, db.ForeignKey("category.id"))
     
     versions = db.relationship("PostVersion", backref="post", lazy=True, cascade="all, delete-orphan")
     tags = db.relationship("Tag", secondary=post_tags, backref="posts")
@@ -90,52 +100,43 @@ class Post(db.Model):
     def generate_slug(self):
         """Generate URL-friendly slug from title"""
         if self.title:
-            slug = re.sub(r'[^\w\s-]', '', self.title.lower())
-            slug = re.sub(r'[-\s]+', '-', slug).strip('-')
-            return slug
+            from services.slugs import slugify
+            return slugify(self.title)
         return ''
+
+    def assign_slug(self, base=None):
+        """Reserve a unique slug from `base` (default: title), keeping the old one as a redirect"""
+        from services.slugs import assign
+        return assign(self, base)
+    
+    def render_body(self):
+        """Render body_md into body_html and read_time_estimate (cached by content hash)"""
+        from services.markdown import render_post
+        return render_post(self)
     
     def create_version(self):
         """Create a new version when post is updated"""
-        version_count = PostVersion.query.filter_by(post_id=self.id).count()
-        version = PostVersion(
-            post_id=self.id,
-            version_number=version_count + 1,
-            body_md=self.body_md
-        )
-        db.session.add(version)
-        return version
+        from services.versioning import create_version
+        return create_version(self)
     
     def to_dict(self, include_body=False):
-        data = {
-            'id': self.id,
-            'title': self.title,
-            'slug': self.slug,
-            'status': self.status,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'author': self.author.username if self.author else None,
-            'category': self.category.name if self.category else None,
-            'tags': [tag.name for tag in self.tags],
-            'comments_count': len(self.comments),
-            'versions_count': len(self.versions),
-            'read_time_estimate': self.read_time_estimate if self.read_time_estimate else None
-        }
-        
-        if include_body:
-            data['body_md'] = self.body_md
-            data['body_html'] = self.body_html
-            
-        if self.analytics:
-            data['analytics'] = self.analytics.to_dict()
-            
-        return data
+        return serialize_posts([self], include_body=include_body)[0]
+
+class SlugRedirect(db.Model):
+    id = db.Column(KeyType, primary_key=True, default=new_id)
+    old_slug = db.Column(db.String(255), unique=True, nullable=False)
+    post_id = db.Column(KeyType, db.ForeignKey("post.id", ondelete="CASCADE"), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class PostVersion(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    post_id = db.Column(db.String(36), db.ForeignKey("post.id"), nullable=False)
+    __table_args__ = (db.UniqueConstraint('post_id', 'version_number'),)
+
+    id = db.Column(KeyType, primary_key=True, default=new_id)
+    post_id = db.Column(KeyType, db.ForeignKey("post.id"), nullable=False)
     version_number = db.Column(db.Integer, nullable=False)
+    is_snapshot = db.Column(db.Boolean, nullable=False, default=True)  # full body_md, otherwise a delta (see services.versioning)
     body_md = db.Column(db.Text)
+    delta = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self):
@@ -147,11 +148,14 @@ class PostVersion(db.Model):
         }
 
 class Comment(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    post_id = db.Column(db.String(36), db.ForeignKey("post.id"), nullable=False)
-    user_id = db.Column(db.String(36), db.ForeignKey("user.id"), nullable=False)
+    __table_args__ = (db.Index('ix_comment_thread', 'post_id', 'parent_id', 'created_at'),)
+
+    id = db.Column(KeyType, primary_key=True, default=new_id)
+    post_id = db.Column(KeyType, db.ForeignKey("post.id"), nullable=False)
+    user_id = db.Column(KeyType, db.ForeignKey("user.id"), nullable=False)
     body = db.Column(db.Text, nullable=False)
-    parent_id = db.Column(db.String(36), db.ForeignKey("comment.id"), nullable=True)
+    parent_id = db.Column(KeyType, db.ForeignKey("comment.id"), nullable=True)
+    replies_count = db.Column(db.Integer, nullable=False, default=0)  # maintained by services.comments.add_comment
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     replies = db.relationship("Comment", backref=db.backref("parent", remote_side=[id]), lazy=True)
@@ -165,7 +169,7 @@ class Comment(db.Model):
             'body': self.body,
             'parent_id': self.parent_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'replies_count': len(self.replies)
+            'replies_count': self.replies_count or 0
         }
         
         if include_replies:
@@ -174,53 +178,63 @@ class Comment(db.Model):
         return data
 
 class PostAnalytics(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    post_id = db.Column(db.String(36), db.ForeignKey("post.id"), unique=True, nullable=False)
+    id = db.Column(KeyType, primary_key=True, default=new_id)
+    post_id = db.Column(KeyType, db.ForeignKey("post.id"), unique=True, nullable=False)
     views = db.Column(db.Integer, default=0)
     likes = db.Column(db.Integer, default=0)
     read_time_seconds = db.Column(db.Integer, default=0)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def increment_views(self):
-        self.views += 1
-        self.updated_at = datetime.utcnow()
-        db.session.commit()
+        """Queue a view; counters are flushed in batches by services.analytics"""
+        from services.analytics import record_view
+        record_view(self.post_id)
     
     def increment_likes(self):
-        self.likes += 1
-        self.updated_at = datetime.utcnow()
-        db.session.commit()
+        """Queue a like; counters are flushed in batches by services.analytics"""
+        from services.analytics import record_like
+        record_like(self.post_id)
     
-    def to_dict(self):
+    def to_dict(self, pending=None):
+        if pending is None:
+            from services.analytics import pending_counts
+            pending = pending_counts([self.post_id]).get(self.post_id, {})
         return {
             'id': self.id,
             'post_id': self.post_id,
-            'views': self.views,
-            'likes': self.likes,
+            'views': (self.views or 0) + pending.get('views', 0),
+            'likes': (self.likes or 0) + pending.get('likes', 0),
             'read_time_seconds': self.read_time_seconds,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
 class MediaAsset(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(KeyType, primary_key=True, default=new_id)
     filename = db.Column(db.String(255), nullable=False)
     filepath = db.Column(db.String(255), nullable=False)
-    uploaded_by = db.Column(db.String(36), db.ForeignKey("user.id"), nullable=False)
-    post_id = db.Column(db.String(36), db.ForeignKey("post.id"))
+    uploaded_by = db.Column(KeyType, db.ForeignKey("user.id"), nullable=False)
+    post_id = db.Column(KeyType, db.ForeignKey("post.id"))
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # sha256 of the stored bytes; filepath is derived from it, so identical
+    # uploads share one file on disk
+    content_hash = db.Column(db.String(64), index=True)
+    content_type = db.Column(db.String(50))
+    size = db.Column(db.Integer)
     
     def to_dict(self):
         return {
             'id': self.id,
             'filename': self.filename,
             'filepath': self.filepath,
+            'content_type': self.content_type,
+            'size': self.size,
             'uploaded_by': self.uploader.username if self.uploader else None,
             'post_id': self.post_id,
             'uploaded_at': self.uploaded_at.isoformat() if self.uploaded_at else None
         }
 
 class Subscriber(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(KeyType, primary_key=True, default=new_id)
     email = db.Column(db.String(255), unique=True, nullable=False)
     active = db.Column(db.Boolean, default=True)
     subscribed_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -231,4 +245,92 @@ class Subscriber(db.Model):
             'email': self.email,
             'active': self.active,
             'subscribed_at': self.subscribed_at.isoformat() if self.subscribed_at else None
-        }
\ No newline at end of file
+        }
+
+
+# Bulk serializers
+#
+# Listing endpoints should use these instead of calling to_dict() per row:
+# every relationship is fetched once for the whole batch and the *_count
+# fields come from grouped COUNT queries, so the number of queries stays
+# fixed no matter how many rows are serialized.
+
+def grouped_counts(column, ids):
+    """Return {id: row count} for rows whose `column` is in `ids`, using one GROUP BY query"""
+    ids = list(ids)
+    if not ids:
+        return {}
+    rows = db.session.query(column, func.count()).filter(column.in_(ids)).group_by(column).all()
+    return {key: count for key, count in rows}
+
+def _by_id(model, ids):
+    ids = [i for i in set(ids) if i is not None]
+    if not ids:
+        return {}
+    return {obj.id: obj for obj in model.query.filter(model.id.in_(ids)).all()}
+
+def serialize_posts(posts, include_body=False):
+    """Serialize a list of posts in a fixed number of queries"""
+    if not posts:
+        return []
+
+    post_ids = [post.id for post in posts]
+    authors = _by_id(User, [post.author_id for post in posts])
+    categories = _by_id(Category, [post.category_id for post in posts])
+
+    tags = {}
+    tag_rows = (db.session.query(post_tags.c.post_id, Tag.name)
+                .join(Tag, Tag.id == post_tags.c.tag_id)
+                .filter(post_tags.c.post_id.in_(post_ids))
+                .order_by(Tag.name)
+                .all())
+    for post_id, name in tag_rows:
+        tags.setdefault(post_id, []).append(name)
+
+    analytics = {a.post_id: a for a in PostAnalytics.query.filter(PostAnalytics.post_id.in_(post_ids)).all()}
+    from services.analytics import pending_counts
+    pending = pending_counts(analytics)
+    comments_count = grouped_counts(Comment.post_id, post_ids)
+    versions_count = grouped_counts(PostVersion.post_id, post_ids)
+
+    results = []
+    for post in posts:
+        author = authors.get(post.author_id)
+        category = categories.get(post.category_id)
+        data = {
+            'id': post.id,
+            'title': post.title,
+            'slug': post.slug,
+            'status': post.status,
+            'created_at': post.created_at.isoformat() if post.created_at else None,
+            'updated_at': post.updated_at.isoformat() if post.updated_at else None,
+            'author': author.username if author else None,
+            'category': category.name if category else None,
+            'tags': tags.get(post.id, []),
+            'comments_count': comments_count.get(post.id, 0),
+            'versions_count': versions_count.get(post.id, 0),
+            'read_time_estimate': post.read_time_estimate if post.read_time_estimate else None
+        }
+
+        if include_body:
+            data['body_md'] = post.body_md
+            data['body_html'] = post.body_html
+
+        if post.id in analytics:
+            data['analytics'] = analytics[post.id].to_dict(pending=pending.get(post.id, {}))
+
+        results.append(data)
+    return results
+
+def serialize_users(users):
+    """Serialize a list of users with posts_count from one grouped query"""
+    counts = grouped_counts(Post.author_id, [user.id for user in users])
+    return [user.to_dict(posts_count=counts.get(user.id, 0)) for user in users]
+
+def serialize_categories(categories):
+    """Serialize a list of categories (posts_count is a stored column)"""
+    return [category.to_dict() for category in categories]
+
+def serialize_tags(tags):
+    """Serialize a list of tags (posts_count is a stored column)"""
+    return [tag.to_dict() for tag in tags]
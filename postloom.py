@@ -0,0 +1,259 @@
+import functools
+import click
+
+# PostLoom management CLI:
+#
+#   python -m postloom db init
+#   python -m postloom users create admin@example.com --role admin
+#   python -m postloom users hash-password
+#   python -m postloom reindex
+#   python -m postloom reconcile-counts
+#   python -m postloom worker --queue default
+#   python -m postloom --help
+#
+# Only click is imported up front. Each command imports what it needs when it
+# runs: `users hash-password` and `convert-time` never load Flask, SQLAlchemy
+# or Redis, the database commands build a bare app with just the models, and
+# only the commands that use the services build the full one (without its
+# background threads). The same commands are registered on `flask` under
+# their old names (FLASK_COMMANDS); there they use the app flask loaded.
+
+ROLES = ("author", "editor", "admin")
+
+
+def _flask_app():
+    """The app flask loaded, when running as a `flask` subcommand"""
+    from flask.cli import ScriptInfo
+    info = click.get_current_context().find_object(ScriptInfo)
+    return info.load_app() if info is not None else None
+
+
+def _models_app():
+    """Just enough app for the models: no routes, services or Redis"""
+    from flask import Flask
+    from config import config
+    from models import db
+
+    app = Flask("app")
+    app.config.from_object(config)
+    db.init_app(app)
+    return app
+
+
+def with_app(models_only=False):
+    """Run the command inside an app context"""
+
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            app = _flask_app()
+            if app is None and models_only:
+                app = _models_app()
+            elif app is None:
+                from app import create_app
+                app = create_app(background=False)
+            with app.app_context():
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@click.group()
+def cli():
+    """PostLoom management commands"""
+
+
+@cli.group()
+def db():
+    """Database schema"""
+
+
+# Not part of startup: run once per deploy before serving
+@db.command("init")
+@with_app(models_only=True)
+def db_init():
+    """Create any missing database tables"""
+    from models import db as database
+    database.create_all()
+    print("Database tables created!")
+
+
+@db.command("migrate-keys")
+@click.option("--dry-run", is_flag=True, help="Print the SQL without running it.")
+@with_app(models_only=True)
+def db_migrate_keys(dry_run):
+    """Convert CHAR(36) id columns to BINARY(16); set COMPACT_KEYS = True afterwards"""
+    from models import db as database
+    from services.keys import migrate
+    for statement in migrate(database.engine, database.metadata, dry_run=dry_run):
+        print(statement + ";")
+    if not dry_run:
+        print("Key columns converted. Set COMPACT_KEYS = True in config and restart.")
+
+
+@db.command("backfill-versions")
+@with_app(models_only=True)
+def db_backfill_versions():
+    """Add post.version_count if missing and set it from each post's stored versions"""
+    from models import db as database
+    from services.versioning import backfill_version_counts
+    print(f"Version counters set on {backfill_version_counts(database.engine)} posts")
+
+
+@cli.group()
+def users():
+    """User accounts"""
+
+
+@users.command("create")
+@click.argument("email")
+@click.option("--username", help="Defaults to the part of EMAIL before the @.")
+@click.option("--role", type=click.Choice(ROLES), default="author")
+@click.password_option(help="Prompted for when not given.")
+@with_app(models_only=True)
+def users_create(email, username, role, password):
+    """Create a user"""
+    from models import db as database, User
+
+    username = username or email.split("@", 1)[0]
+    if User.query.filter((User.email == email) | (User.username == username)).first():
+        raise click.ClickException(f"A user with email {email} or username {username} already exists")
+    user = User(email=email, username=username, role=role)
+    user.set_password(password)
+    database.session.add(user)
+    database.session.commit()
+    print(f"Created {role} {username} ({user.id})")
+
+
+@users.command("hash-password")
+@click.password_option(help="Prompted for when not given.")
+def users_hash_password(password):
+    """Print a password hash for a User.password_hash column"""
+    from werkzeug.security import generate_password_hash
+    print(generate_password_hash(password))
+
+
+@cli.command("reindex")
+@with_app()
+def reindex():
+    """Rebuild the post search index from scratch"""
+    from services.search import rebuild_index
+    rebuild_index()
+    print("Search index rebuilt")
+
+
+@cli.command("rerender-posts")
+@with_app()
+def rerender_posts():
+    """Re-render every post's body_html with the current markdown renderer"""
+    from services.markdown import rerender_posts as rerender
+    count = rerender()
+    print(f"Re-rendered {count} posts")
+
+
+@cli.command("rebuild-rankings")
+@with_app()
+def rebuild_rankings():
+    """Rebuild the popular and trending rankings from the database"""
+    from services.ranking import reconcile, refresh_trending
+    reconcile()
+    refresh_trending()
+    print("Rankings rebuilt")
+
+
+@cli.command("reconcile-counts")
+@click.option("--add-columns", is_flag=True, help="First add the posts_count columns to an older schema.")
+@with_app(models_only=True)
+def reconcile_counts(add_columns):
+    """Recompute the Tag and Category posts_count columns"""
+    from services import taxonomy
+    if add_columns:
+        from models import db as database
+        altered = taxonomy.add_count_columns(database.engine)
+        print(f"Added posts_count to: {', '.join(altered) or 'nothing'}")
+    print(f"Counters corrected: {taxonomy.reconcile()}")
+
+
+@cli.command("worker")
+@click.option("--queue", default="default", help="Queue to consume.")
+@click.option("--processes", type=int, default=None, help="Worker processes (default: one per core).")
+def worker(queue, processes):
+    """Run background job workers"""
+    # Each worker process builds its own app
+    from services.job_queue import run_workers
+    run_workers(queue, processes)
+
+
+@cli.group()
+def subscribers():
+    """Newsletter subscribers"""
+
+
+@subscribers.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), default="csv")
+@with_app()
+def subscribers_import(path, fmt):
+    """Bulk import subscribers from a CSV or NDJSON file"""
+    from services.subscribers import read_emails, import_emails
+    with open(path, encoding="utf-8", newline="") as f:
+        stats = import_emails(
+            read_emails(f, fmt),
+            progress=lambda s: print(f"\r{s['processed']} processed, {s['inserted']} new", end="", flush=True)
+        )
+    print(f"\nDone: {stats}")
+
+
+@subscribers.command("export")
+@click.argument("path", type=click.Path(dir_okay=False, writable=True))
+@click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), default="csv")
+@with_app()
+def subscribers_export(path, fmt):
+    """Export all subscribers to a CSV or NDJSON file"""
+    from services.subscribers import iter_export
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for chunk in iter_export(fmt):
+            f.write(chunk)
+    print(f"Exported subscribers to {path}")
+
+
+@cli.command("serve")
+@click.option("--host", default="0.0.0.0")
+@click.option("--port", type=int, default=8057)
+@click.option("--debug/--no-debug", default=True)
+def serve(host, port, debug):
+    """Run the development server (production: gunicorn -c gunicorn.conf.py)"""
+    from app import create_app
+    create_app().run(debug=debug, port=port, host=host)
+
+
+@cli.command("convert-time")
+@click.argument("timestamp")
+@click.option("--tz", "tz_name", default="Asia/Kolkata", help="IANA time zone to convert to.")
+def convert_time(timestamp, tz_name):
+    """Convert a stored UTC timestamp (ISO 8601) to local time"""
+    from datetime import datetime, timezone
+    from zoneinfo import ZoneInfo
+
+    local = datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc).astimezone(ZoneInfo(tz_name))
+    print(local.isoformat())
+    print(local.strftime("%d-%m-%Y %I:%M:%S %p"))
+
+
+# flask CLI name -> command, registered by create_app()
+FLASK_COMMANDS = {
+    "init-db": db_init,
+    "migrate-keys": db_migrate_keys,
+    "create-user": users_create,
+    "reindex": reindex,
+    "rerender-posts": rerender_posts,
+    "rebuild-rankings": rebuild_rankings,
+    "reconcile-counts": reconcile_counts,
+    "worker": worker,
+    "import-subscribers": subscribers_import,
+    "export-subscribers": subscribers_export,
+}
+
+
+if __name__ == "__main__":
+    cli(prog_name="postloom")
@@ -1,10 +1,14 @@
 from flask import Blueprint
 from .auth import auth_api
 from .test import posts_api
+from .subscribers import subscribers_api
+from .media import media_api
 
 
 api = Blueprint('api', __name__)
 
 api.register_blueprint(auth_api, url_prefix='/api/auth')
 api.register_blueprint(posts_api, url_prefix='/api/posts')
+api.register_blueprint(subscribers_api, url_prefix='/api/subscribers')
+api.register_blueprint(media_api, url_prefix='/api/media')
 
@@ -0,0 +1,105 @@
+from flask import Blueprint, request, jsonify, send_from_directory, url_for
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models import db, MediaAsset, Post
+from services import media
+from services.auth_utils import rate_limit
+import os
+import uuid
+
+media_api = Blueprint('media_api', __name__)
+
+# Stored paths are content-addressed, so a response never goes stale
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def _upload_error(message, status):
+    # CKEditor's SimpleUploadAdapter reads the message from error.message
+    return jsonify({'error': {'message': message}}), status
+
+
+def _urls(asset):
+    urls = {'default': url_for('api.media_api.serve_media', filepath=asset.filepath)}
+    for width in media.VARIANT_WIDTHS:
+        urls[str(width)] = url_for('api.media_api.serve_media', filepath=asset.filepath, w=width)
+    return urls
+
+
+@media_api.route("/upload", methods=["POST", "PUT"])
+@jwt_required()
+@rate_limit(60, 3600, scope="user")
+def upload():
+    """Accept an image as multipart field `upload` (CKEditor) or as the raw request body"""
+    if request.content_length and request.content_length > media.MAX_BYTES + 64 * 1024:
+        return _upload_error('File too large', 413)
+
+    if request.mimetype == "multipart/form-data":
+        # Werkzeug spools large parts to a temp file, so this is read in chunks too
+        file = request.files.get('upload')
+        if file is None:
+            return _upload_error('Missing "upload" file field', 400)
+        stream, filename = file.stream, file.filename
+        post_id = request.form.get('post_id') or request.args.get('post_id') or None
+    else:
+        # Reading request.form here could consume the body
+        stream, filename = request.stream, request.args.get('filename', 'upload')
+        post_id = request.args.get('post_id') or None
+
+    if post_id is not None:
+        try:
+            post_id = str(uuid.UUID(post_id))
+        except ValueError:
+            return _upload_error('Invalid post_id', 400)
+        if db.session.get(Post, post_id) is None:
+            return _upload_error('Post not found', 404)
+
+    try:
+        filepath, sha, size, content_type, created = media.store(stream)
+    except media.UploadError as e:
+        return _upload_error(str(e), 413 if str(e) == 'File too large' else 415)
+
+    user_id = get_jwt_identity()
+
+    asset = MediaAsset.query.filter_by(content_hash=sha, uploaded_by=user_id, post_id=post_id).first()
+    if asset is None:
+        asset = MediaAsset(
+            filename=os.path.basename(filename or 'upload')[:255],
+            filepath=filepath,
+            uploaded_by=user_id,
+            post_id=post_id,
+            content_hash=sha,
+            content_type=content_type,
+            size=size
+        )
+        db.session.add(asset)
+        db.session.commit()
+
+    if created:
+        media.schedule_variants(filepath)
+
+    urls = _urls(asset)
+    return jsonify({'id': asset.id, 'url': urls['default'], 'urls': urls, 'deduplicated': not created}), 201
+
+
+@media_api.route("/<path:filepath>", methods=["GET"])
+def serve_media(filepath):
+    """Serve a stored file or, with ?w=, one of its resized variants"""
+    if filepath.startswith('tmp/'):
+        return jsonify({'error': 'Not found'}), 404
+    max_age = IMMUTABLE_MAX_AGE
+    width = request.args.get('w', type=int)
+    if width in media.VARIANT_WIDTHS:
+        variant = media.variant_path(filepath, width)
+        if os.path.exists(os.path.join(media.MEDIA_ROOT, variant)):
+            filepath = variant
+        else:
+            # Variant not generated yet (or image narrower than `w`); don't
+            # let caches pin the original under this URL for long
+            max_age = 60
+
+    # conditional=True gives ETag/Last-Modified and Range support; the file is
+    # handed to the server's sendfile via wsgi.file_wrapper where available
+    response = send_from_directory(media.MEDIA_ROOT, filepath, conditional=True, max_age=max_age)
+    if max_age == IMMUTABLE_MAX_AGE:
+        response.cache_control.immutable = True
+    response.cache_control.public = True
+    return response
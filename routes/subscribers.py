@@ -0,0 +1,42 @@
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from services.auth_utils import role_required
+from services import subscribers
+import io
+
+subscribers_api = Blueprint('subscribers_api', __name__)
+
+FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+}
+
+
+@subscribers_api.route("/import", methods=["POST"])
+@role_required(["admin"])
+def import_subscribers():
+    """Bulk import from a CSV (one email per row) or NDJSON ({"email": ...}) request body"""
+    fmt = request.args.get("format") or FORMATS.get(request.mimetype)
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({'error': 'Send text/csv or application/x-ndjson'}), 415
+
+    # Read the body as it arrives instead of buffering it
+    lines = io.TextIOWrapper(request.stream, encoding="utf-8", newline="")
+    try:
+        stats = subscribers.import_emails(subscribers.read_emails(lines, fmt))
+    except (ValueError, KeyError) as e:
+        return jsonify({'error': f'Malformed input: {e}'}), 400
+    return jsonify(stats)
+
+
+@subscribers_api.route("/export", methods=["GET"])
+@role_required(["admin"])
+def export_subscribers():
+    fmt = request.args.get("format", "csv")
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    response = Response(stream_with_context(subscribers.iter_export(fmt)), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename=subscribers.{fmt}"
+    return response
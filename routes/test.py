@@ -1,9 +1,13 @@
-from services.auth_utils import role_required
-from flask import request, jsonify, Blueprint, render_template
-from models import User
-from services.redis_store import redis_client
-from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
-from datetime import datetime, timedelta
+from services.auth_utils import role_required, rate_limit
+from flask import request, jsonify, Blueprint, render_template, redirect, url_for
+from models import db, User, Post, Category, Tag, Comment, PostAnalytics
+from models import serialize_users, serialize_posts, serialize_categories, serialize_tags
+from services import autosave, search, comments, ranking, slugs, taxonomy
+from services.pagination import paginate, page_size, decode_cursor, stream_export, InvalidCursor
+from services.cache import response_cache, cached_json, post_deps, posts_deps
+from services.analytics import record_view, record_like
+from tasks import notify
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 
 
 posts_api = Blueprint('posts_api',__name__)
@@ -15,57 +19,377 @@ posts_api = Blueprint('posts_api',__name__)
 @jwt_required()
 @role_required(["editor", "author"])
 def get_users():
+    try:
+        page = paginate(User.query, (User.created_at, User.id), serialize_users)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(page)
 
-    jti = get_jwt()["jti"]
+
+
+def _filtered_posts(args=None):
+    args = request.args if args is None else args
+    status = args.get('status', 'published')
+    category_id = args.get('category_id')
+    author_id = args.get('author_id')
+
+    query = Post.query
+    if status != 'all':
+        query = query.filter_by(status=status)
+    if category_id:
+        query = query.filter_by(category_id=category_id)
+    if author_id:
+        query = query.filter_by(author_id=author_id)
+    return query
+
+
+
+# Query arguments that select a posts page; nothing else reaches the cache key
+POSTS_LIST_FILTERS = ('status', 'category_id', 'author_id')
+
+
+@posts_api.route('/', methods=['GET'])
+def get_posts():
+    args = {name: request.args[name] for name in POSTS_LIST_FILTERS if request.args.get(name)}
+    cursor = request.args.get('cursor')
+    limit = page_size()
+    with_total = request.args.get('total') == 'estimate'
+    try:
+        if cursor:
+            decode_cursor(cursor, (Post.created_at, Post.id))
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+
+    def compute():
+        # May run in a background refresh, so it must not touch the request
+        page = paginate(_filtered_posts(args), (Post.created_at, Post.id), serialize_posts,
+                        cursor=cursor, limit=limit, with_total=with_total, from_request=False)
+        return page, {'posts'} | posts_deps(item['id'] for item in page['items'])
+
+    key = "posts_list:" + "&".join(
+        [f"{k}={v}" for k, v in sorted(args.items())] + [f"cursor={cursor or ''}", f"limit={limit}", f"total={int(with_total)}"]
+    )
+    return cached_json(response_cache.get(key, compute))
+
+
+
+@posts_api.route('/', methods=['POST'])
+@role_required(["author", "editor", "admin"])
+def create_post():
+    data = request.get_json() or {}
+    if not data.get('title') or 'body_md' not in data:
+        return jsonify({'error': 'title and body_md are required'}), 400
+
+    post = Post(
+        title=data['title'],
+        body_md=data['body_md'],
+        author_id=get_jwt_identity(),
+        category_id=data.get('category_id'),
+        status='draft'
+    )
+    post.render_body()
+    try:
+        post.tags = taxonomy.resolve_tags(data.get('tags', []))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Inserts the post; a taken slug gets the next free suffix
+    post.assign_slug(data.get('slug'))
+    db.session.add(PostAnalytics(post_id=post.id))
+    db.session.commit()
+    return jsonify(post.to_dict(include_body=True)), 201
+
+
+
+@posts_api.route('/<post_id>/slug', methods=['PUT'])
+@role_required(["author", "editor", "admin"])
+def rename_post(post_id):
+    """Change a post's slug (from `slug`, or from its title); the old one keeps redirecting"""
+    post = db.session.get(Post, post_id)
+    if not post:
+        return jsonify({'error': 'Post not found'}), 404
+    if post.author_id != get_jwt_identity() and get_jwt().get('role') not in ('editor', 'admin'):
+        return jsonify(msg="Insufficient access"), 403
+
+    data = request.get_json() or {}
+    slug = post.assign_slug(data.get('slug'))
+    db.session.commit()
+    return jsonify(id=post.id, slug=slug)
+
+
+
+@posts_api.route('/cache-stats', methods=['GET'])
+@role_required(["admin"])
+def cache_stats():
+    return jsonify(response_cache.report())
+
+
+
+@posts_api.route('/export', methods=['GET'])
+@role_required(["editor", "admin"])
+def export_posts():
+    return stream_export(
+        _filtered_posts(), (Post.created_at, Post.id),
+        lambda posts: serialize_posts(posts, include_body=True)
+    )
+
+
+
+@posts_api.route('/categories', methods=['GET'])
+def get_categories():
+    try:
+        page = paginate(Category.query, (Category.name, Category.id), serialize_categories, descending=False)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(page)
+
+
+
+@posts_api.route('/tags', methods=['GET'])
+def get_tags():
+    try:
+        page = paginate(Tag.query, (Tag.name, Tag.id), serialize_tags, descending=False)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(page)
+
+
+
+@posts_api.route('/tags/resolve', methods=['POST'])
+@role_required(["author", "editor", "admin"])
+def resolve_tags():
+    """Look up a list of tag names, creating the missing ones in one statement"""
+    names = (request.get_json() or {}).get('names')
+    if not isinstance(names, list):
+        return jsonify({'error': 'names must be a list'}), 400
+    try:
+        tags = taxonomy.resolve_tags(names)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    db.session.commit()
+    return jsonify(serialize_tags(tags))
+
+
+
+@posts_api.route("/drafts/<post_id>", methods=["GET"])
+@jwt_required()
+def get_draft(post_id):
     user_id = get_jwt_identity()
-    now = datetime.utcnow().isoformat()
+    draft = autosave.get_draft(user_id, post_id)
+    if draft is None:
+        return jsonify(msg="Draft not found"), 404
+    return jsonify(draft)
 
-    redis_client.hset(f"session_{user_id}_{jti}", "last_active", now)
 
 
-    users = User.query.all()
-    return jsonify([user.to_dict() for user in users])
+@posts_api.route("/drafts/<post_id>/autosave", methods=["POST"])
+@jwt_required()
+@rate_limit(30, 60, scope="user", algorithm="bucket")
+def autosave_draft(post_id):
+    """Save a draft either as a full upload or as a splice against a known revision
+
+    Full upload:  {"content": "..."}
+    Splice:       {"base_rev": 4, "start": 120, "end": 131, "text": "...", "length": 5021}
+    """
+    data = request.get_json(silent=True) or {}
+    user_id = get_jwt_identity()
+
+    def is_int(value):
+        return isinstance(value, int) and not isinstance(value, bool)
+
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    if "content" in data:
+        if not isinstance(data["content"], str):
+            return jsonify({'error': 'content must be a string'}), 400
+    else:
+        start, end, text = data.get("start"), data.get("end"), data.get("text", "")
+        if not (is_int(start) and is_int(end) and 0 <= start <= end):
+            return jsonify({'error': 'start and end must be integers with 0 <= start <= end'}), 400
+        if not isinstance(text, str):
+            return jsonify({'error': 'text must be a string'}), 400
+        if not is_int(data.get("base_rev")):
+            return jsonify({'error': 'base_rev must be an integer'}), 400
+        if data.get("length") is not None and not (is_int(data["length"]) and data["length"] >= 0):
+            return jsonify({'error': 'length must be a non-negative integer'}), 400
+
+    try:
+        if "content" in data:
+            rev, timestamp = autosave.save_draft(user_id, post_id, content=data["content"])
+        else:
+            rev, timestamp = autosave.save_draft(
+                user_id, post_id,
+                base_rev=data["base_rev"],
+                splice=(start, end, text),
+                length=data.get("length")
+            )
+    except autosave.StaleDraft as e:
+        return jsonify(msg="Stale draft, send full content", rev=e.rev), 409
+
+    return jsonify(msg="Draft autosaved", rev=rev, saved_at=timestamp)
+
+
+
+@posts_api.route('/<post_id>/comments', methods=['GET'])
+def get_post_comments(post_id):
+    """Top-level comments, newest first, each with its reply tree
 
+    ?depth= limits how deep replies are nested and ?replies= how many
+    replies are returned per comment; the rest are fetched from
+    /comments/<comment_id>/replies.
+    """
+    max_depth = min(request.args.get('depth', comments.MAX_DEPTH, type=int), comments.MAX_DEPTH)
+    replies_limit = request.args.get('replies', comments.REPLIES_PER_LEVEL, type=int)
 
+    query = Comment.query.filter_by(post_id=post_id, parent_id=None)
+    try:
+        page = paginate(query, (Comment.created_at, Comment.id),
+                        lambda rows: comments.serialize_threads(rows, max_depth, replies_limit))
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(page)
 
-@posts_api.route("/autosave", methods=["POST"])
-def autosave_draft():
+
+
+@posts_api.route('/comments/<comment_id>/replies', methods=['GET'])
+def get_comment_replies(comment_id):
+    max_depth = min(request.args.get('depth', comments.MAX_DEPTH, type=int), comments.MAX_DEPTH)
+    replies_limit = request.args.get('replies', comments.REPLIES_PER_LEVEL, type=int)
+
+    query = Comment.query.filter_by(parent_id=comment_id)
+    try:
+        page = paginate(query, (Comment.created_at, Comment.id),
+                        lambda rows: comments.serialize_threads(rows, max_depth, replies_limit),
+                        descending=False)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(page)
+
+
+
+@posts_api.route('/<post_id>/comments', methods=['POST'])
+@jwt_required()
+@rate_limit(5, 60, scope="user")
+@rate_limit(30, 60, scope="ip")
+def create_comment(post_id):
     data = request.get_json()
-    user_id = "123"
-    content = data.get("content", "")
+    if not data or not data.get('body'):
+        return jsonify({'error': 'body is required'}), 400
 
-    timestamp = datetime.utcnow().isoformat()
-    redis_client.hmset(f"draft_{user_id}", {
-        "content": content,
-        "last_saved": timestamp
-    })
-    redis_client.expire(f"draft_{user_id}", timedelta(hours=1))
+    parent_id = data.get('parent_id')
+    if parent_id and not Comment.query.filter_by(id=parent_id, post_id=post_id).first():
+        return jsonify({'error': 'Parent comment not found'}), 404
 
-    return jsonify(msg="Draft autosaved", saved_at=timestamp)
+    comment = comments.add_comment(post_id, get_jwt_identity(), data['body'], parent_id)
+    db.session.commit()
+    return jsonify(comment.to_dict()), 201
 
 
 
-# @posts_api.route("/drafts/autosave", methods=["POST"])
-# @jwt_required()
-# def autosave_draft():
-#     data = request.get_json()
-#     user_id = get_jwt_identity()
-#     content = data.get("content", "")
+@posts_api.route('/<post_id>/like', methods=['POST'])
+@jwt_required()
+@rate_limit(30, 60, scope="user")
+def like_post(post_id):
+    if not db.session.get(Post, post_id):
+        return jsonify({'error': 'Post not found'}), 404
+    record_like(post_id)
+    return jsonify({'message': 'Post liked'})
+
+
+
+@posts_api.route("/search", methods=["GET"])
+def search_posts():
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({'error': 'Query parameter q is required'}), 400
+
+    try:
+        results, next_cursor = search.search(
+            q,
+            limit=request.args.get("limit", 20, type=int),
+            cursor=request.args.get("cursor")
+        )
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    return jsonify(results=results, next_cursor=next_cursor)
+
+
+
+@posts_api.route("/popular", methods=["GET"])
+def popular_posts():
+    """Top posts from the precomputed rankings: ?kind=trending|popular, optionally by category_id or tag_id"""
+    kind = request.args.get('kind', 'trending')
+    if kind not in ranking.KINDS:
+        return jsonify({'error': 'kind must be trending or popular'}), 400
+    category_id = request.args.get('category_id')
+    tag_id = request.args.get('tag_id')
+    dim = ranking.category_dim(category_id) if category_id else ranking.tag_dim(tag_id) if tag_id else None
+    limit = page_size()
+
+    def compute():
+        ranked = ranking.top(kind, dim, limit)
+        posts = {post.id: post for post in Post.query.filter(Post.id.in_([post_id for post_id, _ in ranked]))}
+        ordered = [posts[post_id] for post_id, _ in ranked if post_id in posts]
+        items = serialize_posts(ordered)
+        scores = dict(ranked)
+        for item in items:
+            item['score'] = round(scores[item['id']], 3)
+        return {'kind': kind, 'items': items}, posts_deps(item['id'] for item in items)
+
+    entry = response_cache.get(f"popular:{kind}:{dim}:{limit}", compute, ttl=ranking.REFRESH_SECONDS)
+    return cached_json(entry)
+
+
+
+@posts_api.route("/publish/<slug>", methods=["PUT"])
+@role_required(["editor", "admin"])
+def publish_post(slug):
+    post_id = slugs.resolve(slug)
+    post = db.session.get(Post, post_id) if post_id else None
+    if not post:
+        return jsonify({'error': 'Post not found'}), 404
+
+    post.status = 'published'
+    db.session.commit()
+    ranking.index_post(post)
+
+    # Rendering, subscriber e-mails and webhooks run on the job workers
+    notify.publish_post.delay(post_id=post.id)
+    return jsonify(msg="Post published", id=post.id), 202
+
+
+
+@posts_api.route('/<slug>', methods=['GET'])
+def get_post(slug):
+    """Published post page, served from the response cache"""
+
+    def compute():
+        post_id = slugs.resolve(slug)
+        post = db.session.get(Post, post_id) if post_id else None
+        if not post or post.status != 'published':
+            # Cached as a miss until any post changes
+            return None, ['posts']
+        if post.slug != slug:
+            # A former slug
+            return {'moved_to': post.slug}, post_deps(post)
+        return post.to_dict(include_body=True), post_deps(post)
 
-#     timestamp = datetime.utcnow().isoformat()
-#     redis_client.hmset(f"draft_{user_id}", {
-#         "content": content,
-#         "last_saved": timestamp
-#     })
-#     redis_client.expire(f"draft_{user_id}", timedelta(hours=1))
+    entry = response_cache.get(f"post_slug:{slug}", compute)
+    if entry['payload'] is None:
+        return jsonify({'error': 'Post not found'}), 404
+    if 'moved_to' in entry['payload']:
+        return redirect(url_for('api.posts_api.get_post', slug=entry['payload']['moved_to']), 301)
 
-#     return jsonify(msg="Draft autosaved", saved_at=timestamp)
+    record_view(entry['payload']['id'])
+    return cached_json(entry)
 
 
 
 @posts_api.route("/editor_page", methods=["GET"])
 def editor_page():
-    return render_template('index.html')
+    # main.js autosaves drafts under the post id on #editor
+    return render_template('index.html', post_id=request.args.get('post_id', 'new'))
 
 # @app.route('/users', methods=['POST'])
 # def create_user():
@@ -0,0 +1,90 @@
+import threading
+import time
+from datetime import datetime
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from config import config
+from services.cache import LRUCache
+from services.redis_store import redis_client
+from services.sessions import session_key
+
+# Keeps `last_active` on session hashes current without a Redis write per
+# request. After each authenticated request the session is marked active in a
+# per-worker memo; it is only queued for a write if this worker has not
+# written it within the last ACTIVITY_GRANULARITY seconds. Queued updates are
+# flushed every ACTIVITY_FLUSH_SECONDS as one script call, so /sessions is
+# accurate to roughly granularity + flush interval.
+
+GRANULARITY = getattr(config, "ACTIVITY_GRANULARITY", 60)
+FLUSH_SECONDS = getattr(config, "ACTIVITY_FLUSH_SECONDS", 5)
+MAX_PENDING = 1000
+
+# Only touch sessions that still exist: HSET on a logged-out session would
+# recreate its hash without a TTL
+TOUCH_SESSIONS = """
+for i, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('HSET', key, 'last_active', ARGV[i])
+    end
+end
+return #KEYS
+"""
+
+_touch_sessions = redis_client.register_script(TOUCH_SESSIONS)
+_memo = LRUCache(getattr(config, "ACTIVITY_MEMO_SIZE", 100_000))
+_pending = {}
+_lock = threading.Lock()
+
+
+def mark_active(user_id, jti):
+    key = session_key(user_id, jti)
+    if _memo.get(key) is not None:
+        return
+    _memo.set(key, True, GRANULARITY)
+    with _lock:
+        _pending[key] = datetime.utcnow().isoformat()
+        full = len(_pending) >= MAX_PENDING
+    if full:
+        flush()
+
+
+def flush():
+    global _pending
+    with _lock:
+        if not _pending:
+            return 0
+        batch, _pending = _pending, {}
+    keys = list(batch)
+    _touch_sessions(keys=keys, args=[batch[key] for key in keys])
+    return len(keys)
+
+
+def _track(response):
+    try:
+        jti = get_jwt().get("jti")
+    except RuntimeError:
+        # No JWT was verified for this request
+        return response
+    if jti and response.status_code < 400:
+        mark_active(get_jwt_identity(), jti)
+    return response
+
+
+def _flusher(app):
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        try:
+            flush()
+        except Exception:
+            app.logger.exception("Session activity flush failed")
+
+
+def init_activity_tracking(app):
+    """Record session last_active after every authenticated request"""
+    app.after_request(_track)
+
+
+def start_activity_flusher(app):
+    """Write the debounced last_active updates in a daemon thread of this process"""
+    thread = threading.Thread(target=_flusher, args=(app,), name="activity-flusher", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,208 @@
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+from sqlalchemy import bindparam
+import redis
+from config import config
+from services.redis_store import redis_client, pipelined
+from services import ranking
+
+# Write-behind view and like counters.
+#
+# A hit is a single HINCRBY on a Redis hash of pending deltas; nothing touches
+# the database on the request path. A background flusher periodically claims
+# the pending hash with RENAME, under a short Redis lock so that flushers in
+# several workers never apply the same batch twice, and applies it to
+# post_analytics in one executemany `UPDATE ... SET views = views + :delta`.
+# Reads add the still-pending delta to the persisted value.
+#
+# What a crash can lose is bounded by Redis persistence, not by the flush
+# interval: the deltas live in Redis until they are committed. A flusher that
+# dies between the commit and deleting the claimed hash re-applies at most one
+# interval's worth of hits on the next run.
+#
+# Each hit also updates the trending/popular rankings (services/ranking.py)
+# in the same pipeline.
+#
+# Deltas for posts deleted before their flush are dropped, so one missing
+# row never holds the claimed hash back.
+
+PENDING_KEY = "analytics_pending"
+FLUSHING_KEY = "analytics_flushing"
+FLUSH_LOCK_KEY = "analytics_flush_lock"
+FIELDS = ("views", "likes")
+
+WRITE_BEHIND = getattr(config, "ANALYTICS_WRITE_BEHIND", True)
+FLUSH_SECONDS = getattr(config, "ANALYTICS_FLUSH_SECONDS", 5)
+
+logger = logging.getLogger(__name__)
+
+# Release the flush lock only if it still holds our token; a flusher that
+# outlived the lock's expiry must not delete the next flusher's lock
+RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_release_lock = redis_client.register_script(RELEASE_LOCK)
+
+
+def _field(post_id, name):
+    return f"{post_id}:{name}"
+
+
+def _record(post_id, name, amount=1):
+    if WRITE_BEHIND:
+        # Counter and rankings in one round trip
+        with pipelined(raise_on_error=False) as pipe:
+            pipe.hincrby(PENDING_KEY, _field(post_id, name), amount)
+            ranking.record(post_id, name, amount, pipe)
+        counted, ranked = pipe.results
+        if isinstance(counted, Exception):
+            raise counted
+        ranking.recorded(post_id, name, amount, ranked)
+        return
+
+    ranking.record(post_id, name, amount)
+
+    # Direct mode: still a single atomic UPDATE rather than read-modify-write
+    from models import db, PostAnalytics
+    table = PostAnalytics.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.post_id == post_id)
+        .values({name: table.c[name] + amount, "updated_at": datetime.utcnow()})
+    )
+    db.session.commit()
+
+
+def record_view(post_id):
+    _record(post_id, "views")
+
+
+def record_like(post_id):
+    _record(post_id, "likes")
+
+
+def pending_counts(post_ids):
+    """Return {post_id: {"views": n, "likes": n}} of deltas not yet flushed to the database"""
+    post_ids = list(post_ids)
+    if not post_ids or not WRITE_BEHIND:
+        return {}
+
+    fields = [_field(post_id, name) for post_id in post_ids for name in FIELDS]
+    pipe = redis_client.pipeline()
+    pipe.hmget(PENDING_KEY, fields)
+    pipe.hmget(FLUSHING_KEY, fields)
+    pending, flushing = pipe.execute()
+
+    counts = {}
+    values = iter(zip(pending, flushing))
+    for post_id in post_ids:
+        for name in FIELDS:
+            a, b = next(values)
+            delta = int(a or 0) + int(b or 0)
+            if delta:
+                counts.setdefault(post_id, {})[name] = delta
+    return counts
+
+
+def _claim():
+    # Leftovers from a flusher that died mid-run are applied first
+    if redis_client.exists(FLUSHING_KEY):
+        return redis_client.hgetall(FLUSHING_KEY)
+    try:
+        redis_client.rename(PENDING_KEY, FLUSHING_KEY)
+    except redis.ResponseError:
+        # Nothing pending
+        return {}
+    return redis_client.hgetall(FLUSHING_KEY)
+
+
+def flush():
+    """Apply pending deltas to post_analytics. Must run inside an app context."""
+    token = uuid.uuid4().hex
+    if not redis_client.set(FLUSH_LOCK_KEY, token, nx=True, ex=max(30, FLUSH_SECONDS * 6)):
+        return 0
+    try:
+        return _flush()
+    finally:
+        _release_lock(keys=[FLUSH_LOCK_KEY], args=[token])
+
+
+def _flush():
+    from models import db, Post, PostAnalytics
+
+    claimed = _claim()
+    if not claimed:
+        return 0
+
+    deltas = {}
+    for key, value in claimed.items():
+        post_id, name = key.decode().rsplit(":", 1)
+        deltas.setdefault(post_id, {"views": 0, "likes": 0})[name] += int(value)
+
+    posts = {post_id for (post_id,) in db.session.query(Post.id).filter(Post.id.in_(list(deltas))).all()}
+    dropped = [post_id for post_id in deltas if post_id not in posts]
+    if dropped:
+        logger.warning("Dropping analytics deltas of %d deleted posts: %s", len(dropped), ", ".join(dropped))
+        for post_id in dropped:
+            del deltas[post_id]
+
+    now = datetime.utcnow()
+    existing = {
+        post_id for (post_id,) in
+        db.session.query(PostAnalytics.post_id).filter(PostAnalytics.post_id.in_(list(deltas))).all()
+    }
+
+    # No response cache invalidation: a flush moves deltas from pending to
+    # stored and leaves the served totals unchanged. Cached pages show counts
+    # as of when they were built, up to the cache TTL old, either way.
+    table = PostAnalytics.__table__
+    rows = [
+        {"b_post_id": post_id, "b_views": d["views"], "b_likes": d["likes"]}
+        for post_id, d in deltas.items() if post_id in existing
+    ]
+    if rows:
+        db.session.execute(
+            table.update()
+            .where(table.c.post_id == bindparam("b_post_id"))
+            .values(
+                views=table.c.views + bindparam("b_views"),
+                likes=table.c.likes + bindparam("b_likes"),
+                updated_at=now
+            ),
+            rows
+        )
+    for post_id, d in deltas.items():
+        if post_id not in existing:
+            db.session.add(PostAnalytics(post_id=post_id, views=d["views"], likes=d["likes"]))
+
+    db.session.commit()
+    redis_client.delete(FLUSHING_KEY)
+    return len(deltas)
+
+
+def start_flusher(app, interval=FLUSH_SECONDS):
+    """Run flush() every `interval` seconds in a daemon thread of this process"""
+    if not WRITE_BEHIND:
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    flush()
+                except Exception:
+                    app.logger.exception("Analytics flush failed")
+                    from models import db
+                    db.session.rollback()
+
+    thread = threading.Thread(target=run, name="analytics-flusher", daemon=True)
+    thread.start()
+    return thread
@@ -1,6 +1,7 @@
-from flask_jwt_extended import jwt_required, get_jwt
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity, verify_jwt_in_request
 from functools import wraps
-from flask import jsonify
+from flask import jsonify, request
+from services.rate_limit import RateLimiter
 
 def role_required(required_roles):
     def wrapper(fn):
@@ -12,4 +13,37 @@ def role_required(required_roles):
                 return jsonify(msg="Insufficient access"), 403
             return fn(*args, **kwargs)
         return decorated
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+def _rate_limit_key(scope):
+    if scope == "ip":
+        return request.remote_addr or "unknown"
+    if scope == "user":
+        # Fall back to the IP for anonymous callers
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity() or f"ip:{request.remote_addr or 'unknown'}"
+    if scope == "route":
+        return "all"
+    raise ValueError(f"Unknown rate limit scope: {scope}")
+
+def rate_limit(limit, period, scope="ip", algorithm="sliding", name=None):
+    """Allow `limit` requests per `period` seconds per caller
+
+    `scope` is "ip", "user" or "route" (one budget shared by everyone);
+    `algorithm` is "sliding" (sliding window) or "bucket" (token bucket,
+    allows bursts of up to `limit`). Stack the decorator for several policies.
+    """
+    def wrapper(fn):
+        limiter = RateLimiter(f"{name or fn.__name__}_{scope}", limit, period, algorithm)
+
+        @wraps(fn)
+        def decorated(*args, **kwargs):
+            allowed, remaining, retry_after = limiter.hit(_rate_limit_key(scope))
+            if not allowed:
+                response = jsonify(msg="Too many requests")
+                response.status_code = 429
+                response.headers["Retry-After"] = str(retry_after)
+                return response
+            return fn(*args, **kwargs)
+        return decorated
+    return wrapper
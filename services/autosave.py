@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+import redis
+from services.redis_store import redis_client
+
+# Drafts live in a `draft_{user_id}_{post_id}` hash holding the content, a
+# revision number and the last save time. Clients send a splice against the
+# revision the server last acknowledged instead of the whole document; if
+# their base revision is stale they are told to upload the full content.
+#
+# Offsets are in UTF-16 code units, which is what JavaScript string indices
+# count, so the editor can compute them with plain string comparisons.
+
+DRAFT_TTL = timedelta(hours=1)
+MAX_RETRIES = 5
+
+
+class StaleDraft(Exception):
+    """The client's base revision does not match the stored draft"""
+
+    def __init__(self, rev):
+        super().__init__(f"Draft is at revision {rev}")
+        self.rev = rev
+
+
+def draft_key(user_id, post_id):
+    return f"draft_{user_id}_{post_id}"
+
+
+def _utf16_len(text):
+    return len(text.encode("utf-16-le", "surrogatepass")) // 2
+
+
+def apply_splice(content, start, end, text):
+    """Replace content[start:end] with text, indices counted in UTF-16 code units"""
+    if not 0 <= start <= end <= _utf16_len(content):
+        raise ValueError("Splice out of range")
+    raw = content.encode("utf-16-le", "surrogatepass")
+    patched = raw[:2 * start] + text.encode("utf-16-le", "surrogatepass") + raw[2 * end:]
+    return patched.decode("utf-16-le", "surrogatepass")
+
+
+def get_draft(user_id, post_id):
+    data = redis_client.hgetall(draft_key(user_id, post_id))
+    if not data:
+        return None
+    return {
+        "content": data.get(b"content", b"").decode(),
+        "rev": int(data.get(b"rev", 0)),
+        "last_saved": data.get(b"last_saved", b"").decode()
+    }
+
+
+def save_draft(user_id, post_id, content=None, base_rev=None, splice=None, length=None):
+    """Store a full upload or apply a splice atomically. Returns (rev, saved_at).
+
+    A splice is (start, end, text) against revision `base_rev`; `length` is
+    the client's document length after applying it and guards against the two
+    sides having diverged. Raises StaleDraft when the splice cannot be applied.
+    """
+    key = draft_key(user_id, post_id)
+    for _ in range(MAX_RETRIES):
+        with redis_client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                current_rev, current = pipe.hmget(key, "rev", "content")
+                current_rev = int(current_rev or 0)
+
+                if splice is not None:
+                    if current is None or base_rev != current_rev:
+                        raise StaleDraft(current_rev)
+                    try:
+                        new_content = apply_splice(current.decode(), *splice)
+                    except ValueError:
+                        raise StaleDraft(current_rev)
+                    if length is not None and _utf16_len(new_content) != length:
+                        raise StaleDraft(current_rev)
+                else:
+                    new_content = content
+
+                rev = current_rev + 1
+                timestamp = datetime.utcnow().isoformat()
+                pipe.multi()
+                pipe.hset(key, mapping={
+                    "content": new_content,
+                    "rev": rev,
+                    "last_saved": timestamp
+                })
+                pipe.expire(key, DRAFT_TTL)
+                pipe.execute()
+                return rev, timestamp
+            except redis.WatchError:
+                # Another save of the same draft landed first; re-read and retry
+                continue
+    raise StaleDraft(current_rev)
+
+
+def delete_draft(user_id, post_id):
+    redis_client.delete(draft_key(user_id, post_id))
@@ -0,0 +1,355 @@
+import hashlib
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
+from flask import current_app, request, jsonify, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from config import config
+from services.redis_store import redis_client
+
+
+class LRUCache:
+    """Thread-safe LRU mapping with a per-entry expiry"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Read-through response cache
+#
+# Serialized payloads (a post page, a page of a listing) are cached in an
+# in-process LRU in front of Redis. Each entry records the dependency tags it
+# was built from, e.g. post:<id>, author:<id>, category:<id>, tag:<id>, and
+# Redis keeps a set of entry keys per tag. Committing a change to a Post, Tag
+# or Category invalidates exactly the entries carrying its tags; the deleted
+# keys are broadcast so every worker drops them from its LRU too.
+#
+# Entries are fresh for `ttl` seconds and then served stale for up to
+# `stale_ttl` more while one background refresh rebuilds them. Misses are
+# single-flight: one computation per key per worker, and a short Redis lock
+# keeps other workers waiting for that result rather than piling onto the
+# database.
+
+RESPONSE_CACHE_TTL = getattr(config, "RESPONSE_CACHE_TTL", 60)
+RESPONSE_CACHE_STALE_TTL = getattr(config, "RESPONSE_CACHE_STALE_TTL", 300)
+RESPONSE_CACHE_SIZE = getattr(config, "RESPONSE_CACHE_SIZE", 5000)
+INVALIDATION_CHANNEL = "response_cache_invalidate"
+STATS_KEY = "rc_stats"
+LOCK_SECONDS = 5
+STATS_FLUSH_SECONDS = 10
+
+
+class ResponseCache:
+
+    def __init__(self, client=redis_client):
+        self.client = client
+        self.local = LRUCache(RESPONSE_CACHE_SIZE)
+        self._locks = [threading.Lock() for _ in range(64)]
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    # -- reads --
+
+    def get(self, key, compute, ttl=RESPONSE_CACHE_TTL, stale_ttl=RESPONSE_CACHE_STALE_TTL):
+        """Return the cache entry for `key`, calling compute() -> (payload, deps) on a miss
+
+        Entries are dicts with "payload", "etag" and "fresh_until".
+        """
+        self._ensure_listener()
+        started = time.perf_counter()
+
+        entry = self.local.get(key)
+        source = "local"
+        if entry is None or entry["fresh_until"] <= time.time():
+            # Another worker may already have refreshed it
+            raw = self.client.get(self._key(key))
+            if raw is not None:
+                remote = json.loads(raw)
+                if entry is None or remote["fresh_until"] > entry["fresh_until"]:
+                    entry = remote
+                    self.local.set(key, entry, ttl + stale_ttl)
+                source = "redis"
+
+        if entry is not None and entry["fresh_until"] > time.time():
+            self._record(f"hit_{source}", started)
+        elif entry is not None:
+            self._refresh_async(key, compute, ttl, stale_ttl)
+            self._record("stale", started)
+        else:
+            entry = self._compute_once(key, compute, ttl, stale_ttl)
+            self._record("miss", started)
+        return entry
+
+    def _key(self, key):
+        return f"rc_{key}"
+
+    def _store(self, key, payload, deps, ttl, stale_ttl):
+        body = json.dumps(payload, sort_keys=True, default=str)
+        entry = {
+            "payload": payload,
+            "etag": hashlib.sha1(body.encode()).hexdigest(),
+            "fresh_until": time.time() + ttl
+        }
+        pipe = self.client.pipeline()
+        pipe.setex(self._key(key), ttl + stale_ttl, json.dumps(entry, default=str))
+        for dep in set(deps):
+            pipe.sadd(f"rcdep_{dep}", key)
+            pipe.expire(f"rcdep_{dep}", ttl + stale_ttl)
+        pipe.execute()
+        self.local.set(key, entry, ttl + stale_ttl)
+        return entry
+
+    def _compute_once(self, key, compute, ttl, stale_ttl):
+        lock_key = f"rclock_{key}"
+        with self._locks[hash(key) % len(self._locks)]:
+            entry = self.local.get(key)
+            if entry is not None and entry["fresh_until"] > time.time():
+                return entry
+
+            if self.client.set(lock_key, "1", nx=True, ex=LOCK_SECONDS):
+                try:
+                    return self._store(key, *compute(), ttl, stale_ttl)
+                finally:
+                    self.client.delete(lock_key)
+
+            # Another worker is computing it; wait for its result
+            deadline = time.monotonic() + LOCK_SECONDS
+            while time.monotonic() < deadline:
+                time.sleep(0.02)
+                raw = self.client.get(self._key(key))
+                if raw is not None:
+                    entry = json.loads(raw)
+                    self.local.set(key, entry, ttl + stale_ttl)
+                    return entry
+            return self._store(key, *compute(), ttl, stale_ttl)
+
+    def _refresh_async(self, key, compute, ttl, stale_ttl):
+        lock_key = f"rclock_{key}"
+        if not self.client.set(lock_key, "1", nx=True, ex=LOCK_SECONDS):
+            return
+        app = current_app._get_current_object()
+
+        def refresh():
+            with app.app_context():
+                try:
+                    self._store(key, *compute(), ttl, stale_ttl)
+                except Exception:
+                    app.logger.exception("Response cache refresh failed for %s", key)
+                finally:
+                    self.client.delete(lock_key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    # -- invalidation --
+
+    def invalidate(self, tags):
+        """Drop every entry that depends on any of `tags`, in every worker"""
+        tags = list(tags)
+        if not tags:
+            return
+        pipe = self.client.pipeline()
+        for tag in tags:
+            pipe.smembers(f"rcdep_{tag}")
+        keys = {member.decode() for members in pipe.execute() for member in members}
+
+        pipe = self.client.pipeline()
+        for key in keys:
+            pipe.delete(self._key(key))
+        for tag in tags:
+            pipe.delete(f"rcdep_{tag}")
+        if keys:
+            pipe.publish(INVALIDATION_CHANNEL, json.dumps(sorted(keys)))
+        pipe.execute()
+        for key in keys:
+            self.local.delete(key)
+
+    # -- stats --
+
+    def _record(self, outcome, started):
+        with self._stats_lock:
+            self._stats[outcome] += 1
+            self._stats[f"{outcome}_ms"] += (time.perf_counter() - started) * 1000
+
+    def _flush_stats(self):
+        with self._stats_lock:
+            stats, self._stats = self._stats, Counter()
+        if stats:
+            pipe = self.client.pipeline()
+            for name, value in stats.items():
+                pipe.hincrbyfloat(STATS_KEY, name, value)
+            pipe.execute()
+
+    def report(self):
+        """Hit ratio and mean latency per outcome, aggregated over all workers"""
+        self._flush_stats()
+        raw = {k.decode(): float(v) for k, v in self.client.hgetall(STATS_KEY).items()}
+        outcomes = ("hit_local", "hit_redis", "stale", "miss")
+        total = sum(raw.get(name, 0) for name in outcomes)
+        report = {"requests": int(total)}
+        for name in outcomes:
+            count = raw.get(name, 0)
+            report[name] = {
+                "count": int(count),
+                "ratio": count / total if total else 0.0,
+                "mean_ms": raw.get(f"{name}_ms", 0) / count if count else 0.0
+            }
+        report["hit_ratio"] = (
+            (raw.get("hit_local", 0) + raw.get("hit_redis", 0) + raw.get("stale", 0)) / total
+            if total else 0.0
+        )
+        return report
+
+    # -- background listener --
+
+    def _ensure_listener(self):
+        if self._listener is not None and self._listener.is_alive():
+            return
+        with self._listener_lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name="response-cache-listener", daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Invalidations may have been missed while unsubscribed
+                self.local.clear()
+                flushed_at = time.monotonic()
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        for key in json.loads(message["data"]):
+                            self.local.delete(key)
+                    if time.monotonic() - flushed_at >= STATS_FLUSH_SECONDS:
+                        self._flush_stats()
+                        flushed_at = time.monotonic()
+            except Exception:
+                self.local.clear()
+                time.sleep(1.0)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+
+response_cache = ResponseCache()
+
+
+def cached_json(entry, max_age=0):
+    """JSON response for a cache entry, or 304 if the client already has this ETag"""
+    if entry["etag"] in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = jsonify(entry["payload"])
+    response.set_etag(entry["etag"])
+    response.headers["Cache-Control"] = f"public, max-age={max_age}, must-revalidate"
+    return response
+
+
+def post_deps(post):
+    """Dependency tags for a cached payload built from `post`"""
+    deps = [f"post:{post.id}", f"author:{post.author_id}"]
+    if post.category_id:
+        deps.append(f"category:{post.category_id}")
+    deps.extend(f"tag:{tag_id}" for tag_id in post_tag_ids([post.id]).get(post.id, []))
+    return deps
+
+
+def posts_deps(post_ids):
+    """Dependency tags for a cached listing of the posts `post_ids`"""
+    from models import db, Post
+    post_ids = list(post_ids)
+    deps = {f"post:{post_id}" for post_id in post_ids}
+    deps.update(
+        f"author:{author_id}" for (author_id,) in
+        db.session.execute(db.select(Post.author_id).where(Post.id.in_(post_ids)).distinct())
+    )
+    for tag_ids in post_tag_ids(post_ids).values():
+        deps.update(f"tag:{tag_id}" for tag_id in tag_ids)
+    return deps
+
+
+def post_tag_ids(post_ids):
+    from models import db, post_tags
+    tag_ids = {}
+    for post_id, tag_id in db.session.execute(
+        db.select(post_tags.c.post_id, post_tags.c.tag_id).where(post_tags.c.post_id.in_(list(post_ids)))
+    ):
+        tag_ids.setdefault(post_id, []).append(tag_id)
+    return tag_ids
+
+
+def _collect(session, flush_context):
+    # Only ORM changes are seen here. Core UPDATEs run through the session
+    # (analytics flushes, markdown.rerender_posts) must invalidate on their own.
+    from models import Post, Tag, Category, User, Comment
+    tags = session.info.setdefault("response_cache_tags", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Post):
+            tags.update({"posts", f"post:{obj.id}"})
+        elif isinstance(obj, Tag):
+            tags.update({"posts", f"tag:{obj.id}"})
+        elif isinstance(obj, Category):
+            tags.update({"posts", f"category:{obj.id}"})
+        elif isinstance(obj, User):
+            tags.add(f"author:{obj.id}")
+        elif isinstance(obj, Comment):
+            tags.add(f"post:{obj.post_id}")
+
+
+def _invalidate(session):
+    tags = session.info.pop("response_cache_tags", None)
+    if tags:
+        response_cache.invalidate(tags)
+
+
+def _discard(session):
+    session.info.pop("response_cache_tags", None)
+
+
+def init_response_cache(app):
+    """Invalidate cached responses whenever the models they depend on are committed"""
+    if not event.contains(Session, "after_flush", _collect):
+        event.listen(Session, "after_flush", _collect)
+        event.listen(Session, "after_commit", _invalidate)
+        event.listen(Session, "after_rollback", _discard)
@@ -0,0 +1,123 @@
+from sqlalchemy import func, select
+from config import config
+from models import db, Comment, User
+
+# Comment threads are read one level at a time, and only the replies that are
+# shown are loaded: each level is one query that ranks the children of the
+# previous level with ROW_NUMBER() OVER (PARTITION BY parent_id) and keeps
+# the first `replies_limit` of each. A thread therefore costs one query for
+# the roots, one per level (up to MAX_DEPTH) and one for usernames: bounded
+# by depth, not constant. The rows read are bounded by what the page
+# returns, not by the size of the thread. (The window can't go inside a
+# recursive CTE: MySQL doesn't allow window functions in the recursive
+# part.) Comments with more replies than were
+# returned carry a replies_cursor for /comments/<id>/replies.
+# replies_count is a denormalized column kept up to date by add_comment(),
+# so counts never require loading the replies themselves.
+
+MAX_DEPTH = getattr(config, "COMMENT_MAX_DEPTH", 8)
+REPLIES_PER_LEVEL = getattr(config, "COMMENT_REPLIES_PER_LEVEL", 20)
+
+
+def add_comment(post_id, user_id, body, parent_id=None):
+    """Create a comment and bump its parent's replies_count in the same transaction"""
+    comment = Comment(post_id=post_id, user_id=user_id, body=body, parent_id=parent_id)
+    db.session.add(comment)
+    if parent_id is not None:
+        table = Comment.__table__
+        db.session.execute(
+            table.update()
+            .where(table.c.id == parent_id)
+            .values(replies_count=table.c.replies_count + 1)
+        )
+    return comment
+
+
+def load_subtrees(root_ids, max_depth=MAX_DEPTH, replies_limit=REPLIES_PER_LEVEL):
+    """Rows of the comments under `root_ids` (roots included), with their depth
+
+    At most `replies_limit` replies per comment, oldest first; None loads
+    them all. Costs one query for the roots and one per level below them,
+    so up to max_depth + 1 (MAX_DEPTH + 2 with build_tree's usernames).
+    """
+    root_ids = list(root_ids)
+    if not root_ids:
+        return []
+
+    table = Comment.__table__
+    rows = [
+        {**row, "depth": 0}
+        for row in db.session.execute(select(table).where(table.c.id.in_(root_ids))).mappings()
+    ]
+    frontier = [row["id"] for row in rows if row["replies_count"]]
+    depth = 0
+    while frontier and (max_depth is None or depth < max_depth):
+        depth += 1
+        level = select(table).where(table.c.parent_id.in_(frontier))
+        if replies_limit is not None:
+            ranked = select(
+                table,
+                func.row_number().over(
+                    partition_by=table.c.parent_id, order_by=(table.c.created_at, table.c.id)
+                ).label("position")
+            ).where(table.c.parent_id.in_(frontier)).subquery()
+            level = select(*[ranked.c[column.name] for column in table.columns]).where(
+                ranked.c.position <= replies_limit
+            )
+            order = (ranked.c.created_at, ranked.c.id)
+        else:
+            order = (table.c.created_at, table.c.id)
+        children = [{**row, "depth": depth} for row in db.session.execute(level.order_by(*order)).mappings()]
+        rows.extend(children)
+        frontier = [row["id"] for row in children if row["replies_count"]]
+    return rows
+
+
+def build_tree(rows, root_ids, replies_limit=REPLIES_PER_LEVEL):
+    """Assemble load_subtrees() rows into nested dicts, keeping the order of `root_ids`"""
+    from services.pagination import encode_cursor
+
+    user_ids = {row["user_id"] for row in rows}
+    usernames = dict(db.session.execute(
+        select(User.id, User.username).where(User.id.in_(user_ids))
+    ).all()) if user_ids else {}
+
+    nodes = {}
+    for row in rows:
+        nodes[row["id"]] = {
+            'id': row["id"],
+            'post_id': row["post_id"],
+            'user_id': row["user_id"],
+            'username': usernames.get(row["user_id"]),
+            'body': row["body"],
+            'parent_id': row["parent_id"],
+            'created_at': row["created_at"].isoformat() if row["created_at"] else None,
+            'depth': row["depth"],
+            'replies_count': row["replies_count"] or 0,
+            'replies': [],
+        }
+
+    # Rows arrive ordered by depth then age, so children are appended oldest first
+    last_reply = {}
+    for row in rows:
+        node = nodes[row["id"]]
+        parent = nodes.get(row["parent_id"]) if row["depth"] > 0 else None
+        if parent is not None and (replies_limit is None or len(parent['replies']) < replies_limit):
+            parent['replies'].append(node)
+            last_reply[parent['id']] = row
+
+    for node in nodes.values():
+        node['has_more_replies'] = node['replies_count'] > len(node['replies'])
+        # Continues /comments/<id>/replies (oldest first) after the last reply shown
+        last = last_reply.get(node['id'])
+        node['replies_cursor'] = (
+            encode_cursor([last["created_at"], last["id"]]) if node['has_more_replies'] and last else None
+        )
+
+    return [nodes[root_id] for root_id in root_ids if root_id in nodes]
+
+
+def serialize_threads(comments, max_depth=MAX_DEPTH, replies_limit=REPLIES_PER_LEVEL):
+    """Serialize a page of comments together with their reply trees"""
+    root_ids = [comment.id for comment in comments]
+    return build_tree(load_subtrees(root_ids, max_depth, replies_limit), root_ids, replies_limit)
@@ -0,0 +1,206 @@
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import time
+import redis
+from config import config
+from services.redis_store import redis_client, blocking_client, pipelined
+
+# Durable background jobs on Redis Streams.
+#
+# Each queue is a stream `jobs_{queue}` read by the consumer group "workers".
+# A job is acknowledged only after its handler returns, so a job whose worker
+# dies is still pending and is re-claimed by another worker once it has been
+# idle for VISIBILITY_TIMEOUT seconds. A failing job is retried with
+# exponential backoff through the `jobs_{queue}_delayed` sorted set; after
+# MAX_ATTEMPTS it is moved to the `jobs_{queue}_dead` stream for inspection.
+
+GROUP = "workers"
+MAX_ATTEMPTS = getattr(config, "JOB_MAX_ATTEMPTS", 5)
+BACKOFF_BASE = getattr(config, "JOB_BACKOFF_SECONDS", 2)
+VISIBILITY_TIMEOUT = getattr(config, "JOB_VISIBILITY_TIMEOUT", 300)
+BATCH_SIZE = 16
+MAX_BACKOFF = 30  # seconds between attempts while Redis is unreachable
+STREAM_MAXLEN = 1_000_000
+
+logger = logging.getLogger(__name__)
+
+handlers = {}
+
+# Move due retries back onto the stream atomically so two workers never
+# re-enqueue the same one. Members carry the failed message's id so that
+# identical jobs stay distinct; the new stream entry gets its own id.
+PROMOTE_DUE = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 100)
+for _, job in ipairs(due) do
+    local fields = cjson.decode(job)
+    redis.call('XADD', KEYS[2], '*', 'type', fields.type, 'payload', fields.payload, 'attempts', fields.attempts)
+    redis.call('ZREM', KEYS[1], job)
+end
+return #due
+"""
+
+_promote_due = redis_client.register_script(PROMOTE_DUE)
+
+
+def stream_key(queue):
+    return f"jobs_{queue}"
+
+
+def delayed_key(queue):
+    return f"jobs_{queue}_delayed"
+
+
+def dead_key(queue):
+    return f"jobs_{queue}_dead"
+
+
+def job(name, queue="default"):
+    """Register a function as the handler for jobs of type `name`"""
+    def wrapper(fn):
+        handlers[name] = (fn, queue)
+        fn.delay = lambda **payload: enqueue(name, payload, queue)
+        return fn
+    return wrapper
+
+
+def enqueue(name, payload, queue="default"):
+    return redis_client.xadd(
+        stream_key(queue),
+        {"type": name, "payload": json.dumps(payload), "attempts": 0},
+        maxlen=STREAM_MAXLEN, approximate=True
+    )
+
+
+def enqueue_many(name, payloads, queue="default"):
+    """Enqueue a batch of jobs of one type in a single round trip"""
+    with pipelined() as pipe:
+        for payload in payloads:
+            pipe.xadd(
+                stream_key(queue),
+                {"type": name, "payload": json.dumps(payload), "attempts": 0},
+                maxlen=STREAM_MAXLEN, approximate=True
+            )
+    return pipe.results
+
+
+def _ensure_group(queue):
+    try:
+        redis_client.xgroup_create(stream_key(queue), GROUP, id="0", mkstream=True)
+    except Exception as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _handle(queue, message_id, fields, app=None):
+    """Run one job and acknowledge it
+
+    Redis errors while acknowledging propagate to work(); the message then
+    stays pending and is claimed again after VISIBILITY_TIMEOUT.
+    """
+    name = fields[b"type"].decode()
+    payload = fields[b"payload"].decode()
+    attempts = int(fields.get(b"attempts", 0)) + 1
+
+    try:
+        fn, _ = handlers[name]
+        if app is not None:
+            # A fresh app context per job, so its database session is
+            # cleaned up when the job ends
+            with app.app_context():
+                fn(**json.loads(payload))
+        else:
+            fn(**json.loads(payload))
+        failed = None
+    except Exception as e:
+        logger.exception("Job %s %s failed (attempt %d)", name, message_id, attempts)
+        failed = e
+
+    with pipelined() as pipe:
+        if failed is not None:
+            job = {"type": name, "payload": payload, "attempts": attempts}
+            if attempts >= MAX_ATTEMPTS:
+                pipe.xadd(dead_key(queue), {**job, "error": repr(failed)[:1000]}, maxlen=STREAM_MAXLEN, approximate=True)
+            else:
+                member = json.dumps({**job, "id": _decode(message_id)})
+                pipe.zadd(delayed_key(queue), {member: time.time() + BACKOFF_BASE ** attempts})
+        pipe.xack(stream_key(queue), GROUP, message_id)
+        pipe.xdel(stream_key(queue), message_id)
+
+
+def work(queue="default", app=None, consumer=None, block_ms=5000, stop=None):
+    """Process jobs from `queue` until `stop()` returns true"""
+    consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+    stream = stream_key(queue)
+    group_ready = False
+    last_housekeeping = 0.0
+    backoff = 0
+
+    while not (stop and stop()):
+        try:
+            if not group_ready:
+                _ensure_group(queue)
+                group_ready = True
+            if time.monotonic() - last_housekeeping >= 1.0:
+                _promote_due(keys=[delayed_key(queue), stream], args=[time.time()])
+                # Take over jobs left pending by workers that died mid-run
+                _, claimed, *_ = redis_client.xautoclaim(
+                    stream, GROUP, consumer, min_idle_time=VISIBILITY_TIMEOUT * 1000, count=BATCH_SIZE
+                )
+                for message_id, fields in claimed:
+                    if fields:
+                        _handle(queue, message_id, fields, app)
+                last_housekeeping = time.monotonic()
+
+            # The blocking client has no socket timeout, so an idle stream
+            # just returns nothing after block_ms
+            response = blocking_client.xreadgroup(GROUP, consumer, {stream: ">"}, count=BATCH_SIZE, block=block_ms)
+            backoff = 0
+            for _, messages in response or []:
+                for message_id, fields in messages:
+                    _handle(queue, message_id, fields, app)
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            # Messages of this batch not yet acknowledged stay pending
+            backoff = min(MAX_BACKOFF, backoff * 2 or 1)
+            logger.warning("Redis unavailable (%s); retrying in %ss", e, backoff)
+            time.sleep(backoff)
+
+
+def _worker_main(queue):
+    # Each process builds its own app, so database and Redis pools are
+    # created after the fork; the web processes run the background flushers
+    from app import create_app
+    from services.search import start_indexer
+    app = create_app(background=False)
+    # Jobs edit posts too; index those changes from this process
+    start_indexer(app)
+    import tasks.notify  # noqa: F401  (registers handlers)
+    work(queue, app=app)
+
+
+def run_workers(queue="default", processes=None):
+    """Run `processes` worker processes (default: one per core) until interrupted"""
+    processes = processes or os.cpu_count()
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_worker_main, args=(queue,), daemon=True) for _ in range(processes)]
+    for proc in procs:
+        proc.start()
+    try:
+        while True:
+            for i, proc in enumerate(procs):
+                if not proc.is_alive():
+                    logger.warning("Worker %s exited with %s, restarting", proc.pid, proc.exitcode)
+                    procs[i] = ctx.Process(target=_worker_main, args=(queue,), daemon=True)
+                    procs[i].start()
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.join()
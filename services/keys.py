@@ -0,0 +1,115 @@
+import os
+import time
+import uuid
+from sqlalchemy import String, text
+from sqlalchemy.dialects import mysql, postgresql
+from sqlalchemy.types import TypeDecorator, CHAR
+from config import config
+
+# Primary and foreign key columns.
+#
+# Ids are UUID strings everywhere in Python, in JSON and in JWT identities.
+# With COMPACT_KEYS on they are stored as BINARY(16) on MySQL and as the
+# native uuid type on PostgreSQL instead of 36-character strings, which
+# shrinks every primary key, foreign key and secondary index (InnoDB copies
+# the primary key into each one). New ids are UUIDv7: the leading bits are a
+# millisecond timestamp, so inserts land at the right edge of the B-tree
+# instead of splitting random pages.
+#
+# Existing MySQL databases are converted in place with `flask migrate-keys`
+# before COMPACT_KEYS is switched on. PostgreSQL databases get the uuid type
+# when their tables are created with COMPACT_KEYS on.
+
+COMPACT_KEYS = getattr(config, "COMPACT_KEYS", False)
+UUID_VERSION = getattr(config, "UUID_VERSION", 7)
+
+
+def uuid7():
+    """Time-ordered UUID (RFC 9562 version 7)"""
+    ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (ms & 0xFFFF_FFFF_FFFF) << 80
+    value |= 0x7 << 76
+    value |= ((rand >> 62) & 0xFFF) << 64
+    value |= 0b10 << 62
+    value |= rand & 0x3FFF_FFFF_FFFF_FFFF
+    return uuid.UUID(int=value)
+
+
+def new_id():
+    return str(uuid7() if UUID_VERSION == 7 else uuid.uuid4())
+
+
+class CompactUUID(TypeDecorator):
+    """UUID string in Python, 16 bytes (or native uuid) in the database"""
+
+    impl = CHAR(36)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name in ("mysql", "mariadb"):
+            return dialect.type_descriptor(mysql.BINARY(16))
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=False))
+        return dialect.type_descriptor(CHAR(36))
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name not in ("mysql", "mariadb"):
+            return value
+        try:
+            return uuid.UUID(str(value)).bytes
+        except ValueError:
+            # Never equal to a stored key, so lookups of junk ids find nothing
+            return str(value).encode()
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            return str(uuid.UUID(bytes=value))
+        return str(value)
+
+
+KeyType = CompactUUID if COMPACT_KEYS else String(36)
+
+
+def key_columns(metadata):
+    """(table, column) for every primary or foreign key column holding a UUID"""
+    return [
+        (table.name, column.name)
+        for table in metadata.sorted_tables
+        for column in table.columns
+        if (column.primary_key or column.foreign_keys)
+        and (isinstance(column.type, CompactUUID) or (isinstance(column.type, String) and column.type.length == 36))
+    ]
+
+
+def migration_statements(metadata, dialect):
+    """SQL that converts existing CHAR(36) key columns to BINARY(16) on MySQL
+
+    Idempotent: rows already converted are 16 bytes long and left alone.
+    """
+    if dialect not in ("mysql", "mariadb"):
+        raise ValueError(f"Key migration is not supported on {dialect}")
+
+    statements = ["SET FOREIGN_KEY_CHECKS = 0"]
+    for table, column in key_columns(metadata):
+        not_null = "" if metadata.tables[table].c[column].nullable else " NOT NULL"
+        statements += [
+            f"ALTER TABLE `{table}` MODIFY `{column}` VARBINARY(36){not_null}",
+            f"UPDATE `{table}` SET `{column}` = UNHEX(REPLACE(`{column}`, '-', '')) WHERE LENGTH(`{column}`) = 36",
+            f"ALTER TABLE `{table}` MODIFY `{column}` BINARY(16){not_null}",
+        ]
+    statements.append("SET FOREIGN_KEY_CHECKS = 1")
+    return statements
+
+
+def migrate(engine, metadata, dry_run=False):
+    """Convert key columns in place; returns the statements run (or that would be)"""
+    statements = migration_statements(metadata, engine.dialect.name)
+    if not dry_run:
+        # One connection, so FOREIGN_KEY_CHECKS applies to every statement
+        with engine.begin() as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+    return statements
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import math
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+import mistune
+from config import config
+from services.cache import LRUCache, response_cache
+from services.redis_store import redis_client
+
+# Markdown -> sanitized HTML, plus the read time estimate, computed in one pass
+# and memoized by content hash. Lookups go to an in-process LRU first, then to
+# Redis, so re-saving an unchanged body or previewing an old version never
+# re-renders. Bump RENDERER_VERSION whenever rendering output changes; every
+# cache key includes it, so old entries simply stop being hit.
+#
+# Raw HTML in the markdown is escaped rather than passed through, which is
+# what keeps the output safe to serve as-is.
+
+RENDERER_VERSION = f"1-mistune{mistune.__version__}"
+WORDS_PER_MINUTE = 200
+CACHE_TTL = timedelta(days=7)
+
+_local = LRUCache(getattr(config, "MARKDOWN_CACHE_SIZE", 2048))
+_markdown = mistune.create_markdown(
+    escape=True,
+    plugins=["strikethrough", "table", "task_lists", "url"]
+)
+_word_re = re.compile(r"\w+")
+
+
+def cache_key(body_md):
+    digest = hashlib.sha256(body_md.encode()).hexdigest()
+    return f"md_{RENDERER_VERSION}_{digest}"
+
+
+def _render(body_md):
+    """Render without any caching. Safe to run in a worker process."""
+    words = len(_word_re.findall(body_md))
+    return {
+        "html": _markdown(body_md),
+        "read_time": max(1, math.ceil(words / WORDS_PER_MINUTE))
+    }
+
+
+def render(body_md):
+    """Return {"html": ..., "read_time": minutes} for a markdown body"""
+    body_md = body_md or ""
+    key = cache_key(body_md)
+
+    result = _local.get(key)
+    if result is not None:
+        return result
+
+    cached = redis_client.get(key)
+    if cached is not None:
+        result = json.loads(cached)
+    else:
+        result = _render(body_md)
+        redis_client.setex(key, CACHE_TTL, json.dumps(result))
+
+    _local.set(key, result, CACHE_TTL.total_seconds())
+    return result
+
+
+def render_post(post):
+    """Fill in body_html and read_time_estimate from the post's body_md"""
+    result = render(post.body_md)
+    post.body_html = result["html"]
+    post.read_time_estimate = result["read_time"]
+    return post
+
+
+def _render_batch(bodies):
+    return [_render(body) for body in bodies]
+
+
+def rerender_posts(batch_size=200, workers=None):
+    """Re-render every post with the current renderer across all cores
+
+    Must run inside an app context. Returns the number of posts updated.
+    """
+    from models import db, Post
+
+    table = Post.__table__
+    stmt = (table.update()
+            .where(table.c.id == db.bindparam("b_id"))
+            .values(body_html=db.bindparam("b_html"), read_time_estimate=db.bindparam("b_read_time")))
+
+    total = 0
+    last_id = None
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        while True:
+            # Keyset pagination over the primary key so memory stays flat
+            query = db.select(Post.id, Post.body_md)
+            if last_id is not None:
+                query = query.where(Post.id > last_id)
+            rows = db.session.execute(query.order_by(Post.id).limit(batch_size * (workers or os.cpu_count()))).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            # Bodies already rendered by this renderer version are a cache hit
+            keys = [cache_key(row.body_md or "") for row in rows]
+            cached = redis_client.mget(keys)
+            misses = [row for row, hit in zip(rows, cached) if hit is None]
+
+            chunks = [misses[i:i + batch_size] for i in range(0, len(misses), batch_size)]
+            rendered = pool.map(_render_batch, [[row.body_md or "" for row in chunk] for chunk in chunks])
+
+            results = {}
+            pipe = redis_client.pipeline()
+            for chunk, chunk_results in zip(chunks, rendered):
+                for row, result in zip(chunk, chunk_results):
+                    results[row.id] = result
+                    pipe.setex(cache_key(row.body_md or ""), CACHE_TTL, json.dumps(result))
+            pipe.execute()
+
+            params = []
+            for row, hit in zip(rows, cached):
+                result = results[row.id] if hit is None else json.loads(hit)
+                params.append({"b_id": row.id, "b_html": result["html"], "b_read_time": result["read_time"]})
+
+            db.session.execute(stmt, params)
+            db.session.commit()
+            # A Core UPDATE skips the response cache's session hooks
+            response_cache.invalidate({f"post:{row.id}" for row in rows})
+            total += len(params)
+    return total
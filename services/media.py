@@ -0,0 +1,134 @@
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from config import config
+
+# Uploaded files are stored by content: the bytes are streamed to a temp file
+# in fixed-size chunks while being hashed, then moved to
+# MEDIA_ROOT/<h[:2]>/<h[2:4]>/<sha256><ext>. Uploading a file we already have
+# just discards the temp copy, and since a path never changes content it can
+# be cached by clients forever. Resized variants are generated in a process
+# pool after the response has been sent.
+
+MEDIA_ROOT = getattr(config, "MEDIA_ROOT", os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads"))
+MAX_BYTES = getattr(config, "MEDIA_MAX_BYTES", 20 * 1024 * 1024)
+CHUNK_SIZE = 64 * 1024
+VARIANT_WIDTHS = getattr(config, "MEDIA_VARIANT_WIDTHS", (320, 768, 1600))
+THUMBNAIL_WORKERS = getattr(config, "MEDIA_THUMBNAIL_WORKERS", 2)
+
+# Magic bytes of the formats we accept
+SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", ".png", "image/png"),
+    (b"\xff\xd8\xff", ".jpg", "image/jpeg"),
+    (b"GIF87a", ".gif", "image/gif"),
+    (b"GIF89a", ".gif", "image/gif"),
+)
+
+
+class UploadError(ValueError):
+    pass
+
+
+def _sniff(head):
+    for signature, ext, content_type in SIGNATURES:
+        if head.startswith(signature):
+            return ext, content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp", "image/webp"
+    raise UploadError("Unsupported file type")
+
+
+def relative_path(digest, ext):
+    # Also used in URLs, so always "/"-separated
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def store(stream):
+    """Stream a file-like object to content-addressed storage
+
+    Returns (relative_path, sha256, size, content_type, created) where
+    `created` is False when an identical file was already stored.
+    """
+    tmp_dir = os.path.join(MEDIA_ROOT, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    kind = None
+
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if kind is None:
+                    kind = _sniff(chunk)
+                size += len(chunk)
+                if size > MAX_BYTES:
+                    raise UploadError("File too large")
+                digest.update(chunk)
+                out.write(chunk)
+        if kind is None:
+            raise UploadError("Empty upload")
+
+        sha = digest.hexdigest()
+        ext, content_type = kind
+        rel = relative_path(sha, ext)
+        final = os.path.join(MEDIA_ROOT, rel)
+        if os.path.exists(final):
+            os.unlink(tmp_path)
+            return rel, sha, size, content_type, False
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        os.replace(tmp_path, final)
+        return rel, sha, size, content_type, True
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def variant_path(rel, width):
+    base, ext = os.path.splitext(rel)
+    return f"{base}_{width}{ext}"
+
+
+def make_variants(rel, widths=VARIANT_WIDTHS):
+    """Write downscaled copies of an image next to it. Runs in a worker process."""
+    from PIL import Image
+
+    source = os.path.join(MEDIA_ROOT, rel)
+    written = []
+    with Image.open(source) as image:
+        if getattr(image, "is_animated", False):
+            return written
+        for width in widths:
+            if width >= image.width:
+                continue
+            target = os.path.join(MEDIA_ROOT, variant_path(rel, width))
+            if os.path.exists(target):
+                continue
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.LANCZOS)
+            tmp = target + ".tmp"
+            resized.save(tmp, format=image.format, optimize=True)
+            os.replace(tmp, target)
+            written.append(width)
+    return written
+
+
+_pool = None
+
+
+def schedule_variants(rel):
+    """Queue variant generation without waiting for it"""
+    global _pool
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return None
+    if _pool is None:
+        # Created on first use so each web worker gets its own pool after fork
+        _pool = ProcessPoolExecutor(max_workers=THUMBNAIL_WORKERS)
+    return _pool.submit(make_variants, rel)
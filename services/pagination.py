@@ -0,0 +1,161 @@
+import json
+from datetime import datetime
+from flask import current_app, request, Response, stream_with_context
+from itsdangerous import URLSafeSerializer, BadSignature
+from sqlalchemy import and_, or_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from config import config
+
+# Keyset (cursor) pagination shared by every list endpoint.
+#
+# Pages are ordered newest first on a unique key, by default (created_at, id),
+# and the next page starts strictly after the last row of the previous one,
+# so fetching page 1,000 costs the same as page 1 and concurrent inserts never
+# shift rows between pages. Cursors are the last row's key values, signed
+# with the app secret so clients can't forge or edit them.
+
+DEFAULT_PAGE_SIZE = getattr(config, "PAGE_SIZE_DEFAULT", 20)
+MAX_PAGE_SIZE = getattr(config, "PAGE_SIZE_MAX", 100)
+EXPORT_BATCH_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config["SECRET_KEY"], salt="page-cursor")
+
+
+def encode_cursor(values):
+    return _serializer().dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+
+
+def decode_cursor(cursor, keys):
+    try:
+        values = _serializer().loads(cursor)
+    except BadSignature:
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise InvalidCursor("Invalid cursor")
+    decoded = []
+    for key, value in zip(keys, values):
+        if value is not None and key.type.python_type is datetime:
+            value = datetime.fromisoformat(value)
+        decoded.append(value)
+    return decoded
+
+
+def _after(keys, values, descending=True):
+    """WHERE clause selecting rows that sort after `values` in key order"""
+    clauses = []
+    for i, (key, value) in enumerate(zip(keys, values)):
+        equal = [k == v for k, v in zip(keys[:i], values[:i])]
+        clauses.append(and_(*equal, key < value if descending else key > value))
+    return or_(*clauses)
+
+
+def _order(keys, descending=True):
+    return [key.desc() if descending else key.asc() for key in keys]
+
+
+def keyset(query, keys, cursor=None, descending=True):
+    """Order `query` by `keys` and start after `cursor`"""
+    if cursor:
+        query = query.filter(_after(keys, decode_cursor(cursor, keys), descending))
+    return query.order_by(*_order(keys, descending))
+
+
+def page_size(limit=None):
+    if limit is None:
+        limit = request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+class _Explain(Executable, ClauseElement):
+    """EXPLAIN of a statement, compiled with bound parameters like the statement itself"""
+
+    inherit_cache = False
+
+    def __init__(self, statement, prefix="EXPLAIN"):
+        self.statement = statement
+        self.prefix = prefix
+
+
+@compiles(_Explain)
+def _compile_explain(element, compiler, **kw):
+    return f"{element.prefix} {compiler.process(element.statement, **kw)}"
+
+
+def estimate_count(query):
+    """Cheap row count estimate from the query planner, exact COUNT(*) where there is none"""
+    session = query.session
+    dialect = session.bind.dialect.name
+    try:
+        # A failed EXPLAIN only rolls back to the savepoint, not the caller's work
+        if dialect == "mysql":
+            with session.begin_nested():
+                rows = session.execute(_Explain(query.statement)).mappings().all()
+            return int(rows[0]["rows"]) if rows else 0
+        if dialect == "postgresql":
+            with session.begin_nested():
+                plan = session.execute(_Explain(query.statement, "EXPLAIN (FORMAT JSON)")).scalar()
+            return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception:
+        # Fall back to an exact count
+        pass
+    return query.order_by(None).count()
+
+
+def paginate(query, keys, serialize, cursor=None, limit=None, with_total=None, descending=True, from_request=True):
+    """Fetch one page of `query` and return a JSON-ready dict
+
+    `keys` are the model columns that define the order, most significant
+    first; the last one must be unique. `serialize` turns the list of rows
+    into a list of dicts (e.g. models.serialize_posts). Arguments left as
+    None are read from the request's query string, unless from_request is
+    False (code that may run outside a request), where they take defaults.
+    """
+    if from_request:
+        limit = page_size(limit)
+        if cursor is None:
+            cursor = request.args.get("cursor")
+        if with_total is None:
+            with_total = request.args.get("total") == "estimate"
+    else:
+        limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+
+    base = query
+    rows = keyset(query, keys, cursor, descending).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    page = {
+        "items": serialize(rows),
+        "next_cursor": encode_cursor([getattr(rows[-1], key.key) for key in keys]) if has_more else None
+    }
+    if with_total:
+        page["total_estimate"] = estimate_count(base)
+    return page
+
+
+def stream_export(query, keys, serialize, batch_size=EXPORT_BATCH_SIZE, descending=True):
+    """Stream every row of `query` as NDJSON, walking it one keyset batch at a time"""
+
+    def generate():
+        cursor_values = None
+        while True:
+            batch_query = query
+            if cursor_values is not None:
+                batch_query = batch_query.filter(_after(keys, cursor_values, descending))
+            rows = batch_query.order_by(*_order(keys, descending)).limit(batch_size).all()
+            if not rows:
+                break
+            for item in serialize(rows):
+                yield json.dumps(item) + "\n"
+            cursor_values = [getattr(rows[-1], key.key) for key in keys]
+            # Don't let the identity map grow with the export
+            query.session.expunge_all()
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
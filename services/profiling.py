@@ -0,0 +1,293 @@
+import os
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from config import config
+from services.redis_store import redis_client, current_counts
+
+# Per-request timing broken down by phase.
+#
+# Each request gets a stats dict in a context variable. SQLAlchemy cursor
+# events add query count and time, the JSON provider adds encoding time, and
+# Redis count and time come from the counting connection in redis_store.
+# At the end of the request the breakdown goes out in a Server-Timing header
+# and into per-endpoint counters and a latency histogram. Those accumulate
+# locally and are flushed to the `metrics` Redis hash every few seconds
+# (like the response cache stats), so GET /metrics reports all workers.
+#
+# With PROFILE_SAMPLE_RATE > 0 a random fraction of requests also runs under
+# cProfile (or pyinstrument, PROFILER = "pyinstrument"); captures of requests
+# slower than PROFILE_SLOW_MS are written to PROFILE_DIR. The time spent in
+# these hooks is itself reported as postloom_instrumentation_seconds_total.
+
+METRICS_KEY = "metrics"
+FLUSH_SECONDS = getattr(config, "METRICS_FLUSH_SECONDS", 5)
+METRICS_TOKEN = getattr(config, "METRICS_TOKEN", None)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+SAMPLE_RATE = getattr(config, "PROFILE_SAMPLE_RATE", 0.0)
+SLOW_MS = getattr(config, "PROFILE_SLOW_MS", 500)
+PROFILER = getattr(config, "PROFILER", "cprofile")
+PROFILE_DIR = getattr(config, "PROFILE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "profiles"))
+PROFILE_KEEP = getattr(config, "PROFILE_KEEP", 50)
+
+_stats = ContextVar("request_stats", default=None)
+
+_pending = Counter()
+_pending_lock = threading.Lock()
+
+COUNTERS = (
+    ("db_queries", "postloom_db_queries_total", "Database queries"),
+    ("db_seconds", "postloom_db_seconds_total", "Time in database queries"),
+    ("redis_commands", "postloom_redis_round_trips_total", "Redis round trips"),
+    ("redis_seconds", "postloom_redis_seconds_total", "Time in Redis round trips"),
+    ("serialize_seconds", "postloom_serialize_seconds_total", "Time encoding JSON responses"),
+)
+
+
+def add(phase, amount):
+    """Add to the current request's breakdown; a no-op outside requests"""
+    stats = _stats.get()
+    if stats is not None:
+        stats[phase] += amount
+
+
+@contextmanager
+def collecting():
+    """Collect the same breakdown for a block of code outside a request
+
+        with collecting() as stats:
+            serialize_posts(posts)
+        stats["db_queries"]
+    """
+    stats = Counter()
+    token = _stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _stats.reset(token)
+
+
+# -- hooks --
+
+# The start time lives on the execution context rather than on a per-connection
+# stack, so a statement that raises leaves nothing behind for the next one
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    stats = _stats.get()
+    if stats is not None and started is not None:
+        stats["db_queries"] += 1
+        stats["db_seconds"] += time.perf_counter() - started
+
+
+def _json_provider(app):
+    base = type(app.json)
+
+    class TimedJSONProvider(base):
+        def dumps(self, obj, **kwargs):
+            started = time.perf_counter()
+            try:
+                return super().dumps(obj, **kwargs)
+            finally:
+                add("serialize_seconds", time.perf_counter() - started)
+
+    return TimedJSONProvider(app)
+
+
+# -- sampled profiling --
+
+def _start_profiler():
+    if PROFILER == "pyinstrument":
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        return profiler
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another request on this process is already being profiled
+        return None
+    return profiler
+
+
+def _save_profile(profiler, endpoint, elapsed):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{endpoint}_{int(elapsed * 1000)}ms"
+    if PROFILER == "pyinstrument":
+        with open(os.path.join(PROFILE_DIR, name + ".html"), "w") as f:
+            f.write(profiler.output_html())
+    else:
+        profiler.dump_stats(os.path.join(PROFILE_DIR, name + ".prof"))
+
+    captures = sorted(os.listdir(PROFILE_DIR))
+    for old in captures[:-PROFILE_KEEP]:
+        os.unlink(os.path.join(PROFILE_DIR, old))
+
+
+def _stop_profiler(profiler, endpoint, elapsed):
+    if PROFILER == "pyinstrument":
+        profiler.stop()
+    else:
+        profiler.disable()
+    if elapsed * 1000 >= SLOW_MS:
+        _save_profile(profiler, endpoint, elapsed)
+
+
+# -- aggregation --
+
+def _observe(endpoint, method, status, elapsed, stats):
+    labels = f"{endpoint}|{method}"
+    with _pending_lock:
+        _pending[f"requests_total|{labels}|{status}"] += 1
+        _pending[f"duration_sum|{labels}"] += elapsed
+        _pending[f"duration_count|{labels}"] += 1
+        for le in BUCKETS:
+            if elapsed <= le:
+                _pending[f"duration_bucket|{labels}|{le}"] += 1
+        for phase, *_ in COUNTERS:
+            if stats[phase]:
+                _pending[f"{phase}|{labels}"] += stats[phase]
+        _pending["instrumentation_seconds"] += stats["overhead_seconds"]
+
+
+def flush():
+    with _pending_lock:
+        pending = _pending.copy()
+        _pending.clear()
+    if pending:
+        pipe = redis_client.pipeline(transaction=False)
+        for field, value in pending.items():
+            pipe.hincrbyfloat(METRICS_KEY, field, value)
+        pipe.execute()
+
+
+def _labels(endpoint, method, **extra):
+    pairs = [("endpoint", endpoint), ("method", method), *extra.items()]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def render():
+    """All workers' metrics in the Prometheus text format"""
+    flush()
+    raw = {k.decode(): float(v) for k, v in redis_client.hgetall(METRICS_KEY).items()}
+    lines = []
+
+    def series(prefix):
+        return sorted((field.split("|")[1:], value) for field, value in raw.items() if field.split("|")[0] == prefix)
+
+    lines += ["# HELP postloom_requests_total Requests by endpoint and status",
+              "# TYPE postloom_requests_total counter"]
+    for (endpoint, method, status), value in series("requests_total"):
+        lines.append(f"postloom_requests_total{_labels(endpoint, method, status=status)} {_number(value)}")
+
+    lines += ["# HELP postloom_request_duration_seconds Request latency",
+              "# TYPE postloom_request_duration_seconds histogram"]
+    for (endpoint, method), count in series("duration_count"):
+        labels = f"{endpoint}|{method}"
+        for le in BUCKETS:
+            value = raw.get(f"duration_bucket|{labels}|{le}", 0)
+            lines.append(f"postloom_request_duration_seconds_bucket{_labels(endpoint, method, le=le)} {_number(value)}")
+        lines.append(f"postloom_request_duration_seconds_bucket{_labels(endpoint, method, le='+Inf')} {_number(count)}")
+        lines.append(f"postloom_request_duration_seconds_sum{_labels(endpoint, method)} {_number(raw.get(f'duration_sum|{labels}', 0))}")
+        lines.append(f"postloom_request_duration_seconds_count{_labels(endpoint, method)} {_number(count)}")
+
+    for phase, metric, help_text in COUNTERS:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        for (endpoint, method), value in series(phase):
+            lines.append(f"{metric}{_labels(endpoint, method)} {_number(value)}")
+
+    lines += ["# HELP postloom_instrumentation_seconds_total Time spent in the instrumentation itself",
+              "# TYPE postloom_instrumentation_seconds_total counter",
+              f"postloom_instrumentation_seconds_total {_number(raw.get('instrumentation_seconds', 0))}"]
+    return "\n".join(lines) + "\n"
+
+
+def init_profiling(app):
+    """Install the timing hooks and the /metrics endpoint"""
+    from flask import request, g, Response, abort
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    app.json = _json_provider(app)
+
+    @app.before_request
+    def _start_request():
+        started = time.perf_counter()
+        g.request_started = started
+        g.request_stats_token = _stats.set(Counter())
+        g.profiler = _start_profiler() if SAMPLE_RATE and random.random() < SAMPLE_RATE else None
+        add("overhead_seconds", time.perf_counter() - started)
+
+    # Registered after init_redis_instrumentation, so this runs before it
+    # stops counting
+    @app.after_request
+    def _finish_request(response):
+        token = g.pop("request_stats_token", None)
+        if token is None:
+            return response
+        hook_started = time.perf_counter()
+        elapsed = hook_started - g.pop("request_started")
+        stats = _stats.get()
+        stats["redis_commands"], stats["redis_seconds"] = current_counts()
+        endpoint = request.endpoint or "unmatched"
+
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            _stop_profiler(profiler, endpoint, elapsed)
+
+        response.headers["Server-Timing"] = ", ".join([
+            f"db;desc=\"{int(stats['db_queries'])} queries\";dur={stats['db_seconds'] * 1000:.1f}",
+            f"redis;desc=\"{int(stats['redis_commands'])} round trips\";dur={stats['redis_seconds'] * 1000:.1f}",
+            f"serialize;dur={stats['serialize_seconds'] * 1000:.1f}",
+            f"total;dur={elapsed * 1000:.1f}",
+        ])
+        _stats.reset(token)
+        stats["overhead_seconds"] += time.perf_counter() - hook_started
+        _observe(endpoint, request.method, response.status_code, elapsed, stats)
+        return response
+
+    @app.teardown_request
+    def _stop_abandoned_profiler(exc):
+        # after_request is skipped when the view raised
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.stop() if PROFILER == "pyinstrument" else profiler.disable()
+
+    @app.route("/metrics")
+    def metrics():
+        if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+            abort(403)
+        return Response(render(), mimetype="text/plain; version=0.0.4")
+
+
+def start_metrics_flusher(app):
+    """Flush this process's metrics to Redis every FLUSH_SECONDS in a daemon thread"""
+
+    def run():
+        while True:
+            time.sleep(FLUSH_SECONDS)
+            try:
+                flush()
+            except Exception:
+                app.logger.exception("Metrics flush failed")
+
+    thread = threading.Thread(target=run, name="metrics-flusher", daemon=True)
+    thread.start()
+    return thread
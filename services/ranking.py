@@ -0,0 +1,286 @@
+import threading
+import time
+import redis
+from config import config
+from services.cache import LRUCache
+from services.redis_store import redis_client, pipelined
+
+# Precomputed post rankings in Redis sorted sets.
+#
+# Every view or like is one script call, pipelined with the analytics
+# counter, that adds the event's weight to
+#   rank_hour_{n}          activity in hour n (expires after the window)
+#   rank_popular           all-time score, plus rank_popular_{dim} for the
+#                          post's category (cat_<id>) and tags (tag_<id>)
+# The post -> dims mapping lives in the rank_dims hash; posts missing from it
+# (drafts, deleted posts) are not ranked. Each process keeps that mapping in
+# a short-lived local cache, so the script is usually handed every key it
+# writes. On a cache miss the script reads the dims itself and returns them
+# for the cache, so an event is always a single EVALSHA on the caller's
+# pipeline; redis-py's Script objects would add a SCRIPT EXISTS round trip
+# to every pipeline they are queued on.
+#
+# A refresher thread folds the hourly buckets into rank_trending with
+# exponentially decaying weights and derives rank_trending_{dim} from the
+# rank_members_{dim} sets, so reading any top-N is a single ZREVRANGE.
+# Less often it rebuilds the popular sets, members and dims from the
+# database (plus not-yet-flushed analytics deltas), which corrects drift and
+# drops posts that were unpublished.
+
+VIEW_WEIGHT = getattr(config, "RANKING_VIEW_WEIGHT", 1)
+LIKE_WEIGHT = getattr(config, "RANKING_LIKE_WEIGHT", 5)
+WINDOW_HOURS = getattr(config, "RANKING_WINDOW_HOURS", 48)
+HALF_LIFE_HOURS = getattr(config, "RANKING_HALF_LIFE_HOURS", 6)
+REFRESH_SECONDS = getattr(config, "RANKING_REFRESH_SECONDS", 60)
+RECONCILE_SECONDS = getattr(config, "RANKING_RECONCILE_SECONDS", 900)
+RECONCILE_CHUNK = 1000
+DIMS_CACHE_TTL = 30
+
+WEIGHTS = {"views": VIEW_WEIGHT, "likes": LIKE_WEIGHT}
+KINDS = ("trending", "popular")
+
+DIMS_KEY = "rank_dims"
+DIM_INDEX_KEY = "rank_dim_index"
+MEMBERS_KEY = "rank_members"
+REFRESH_DUE_KEY = "rank_refresh_due"
+RECONCILE_DUE_KEY = "rank_reconcile_due"
+
+# KEYS: hour bucket, rank_popular, rank_dims, then rank_popular_{dim} for
+# each of the post's dims. ARGV[4] = 1 when the caller doesn't know the dims:
+# they are read from rank_dims and returned (0 if the post isn't ranked).
+RECORD_EVENT = """
+local dims
+if ARGV[4] == '1' then
+    dims = redis.call('HGET', KEYS[3], ARGV[1])
+    if not dims then
+        return 0
+    end
+elseif redis.call('HEXISTS', KEYS[3], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('ZINCRBY', KEYS[1], ARGV[2], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('ZINCRBY', KEYS[2], ARGV[2], ARGV[1])
+for i = 4, #KEYS do
+    redis.call('ZINCRBY', KEYS[i], ARGV[2], ARGV[1])
+end
+if dims then
+    for dim in string.gmatch(dims, '%S+') do
+        redis.call('ZINCRBY', KEYS[2] .. '_' .. dim, ARGV[2], ARGV[1])
+    end
+    return dims
+end
+return 1
+"""
+
+_record_event = redis_client.register_script(RECORD_EVENT)
+
+# post_id -> its dims, as last read from rank_dims
+_dims_cache = LRUCache(maxsize=50_000)
+
+
+def current_hour(now=None):
+    return int((now or time.time()) // 3600)
+
+
+def bucket_key(hour):
+    return f"rank_hour_{hour}"
+
+
+def ranking_key(kind, dim=None):
+    return f"rank_{kind}_{dim}" if dim else f"rank_{kind}"
+
+
+def category_dim(category_id):
+    return f"cat_{category_id}"
+
+
+def tag_dim(tag_id):
+    return f"tag_{tag_id}"
+
+
+def record(post_id, name, amount=1, pipe=None):
+    """Add a view or like to the rankings
+
+    With `pipe` the script call is only queued; pass its reply to
+    recorded() once the pipeline has run (with raise_on_error=False).
+    """
+    if pipe is None:
+        with pipelined(raise_on_error=False) as pipe:
+            record(post_id, name, amount, pipe)
+        recorded(post_id, name, amount, pipe.results[0])
+        return
+
+    dims = _dims_cache.get(post_id)
+    keys = [bucket_key(current_hour()), ranking_key("popular"), DIMS_KEY]
+    if dims is not None:
+        keys += [ranking_key("popular", dim) for dim in dims]
+    pipe.evalsha(_record_event.sha, len(keys), *keys,
+                 post_id, WEIGHTS[name] * amount, (WINDOW_HOURS + 1) * 3600, 0 if dims is not None else 1)
+
+
+def recorded(post_id, name, amount, reply, retry=True):
+    """Handle the reply to a script call queued by record()"""
+    if isinstance(reply, redis.exceptions.NoScriptError) and retry:
+        # Redis lost its script cache (restart, SCRIPT FLUSH) since warmup
+        redis_client.script_load(RECORD_EVENT)
+        with pipelined(raise_on_error=False) as pipe:
+            record(post_id, name, amount, pipe)
+        recorded(post_id, name, amount, pipe.results[0], retry=False)
+    elif isinstance(reply, Exception):
+        raise reply
+    elif isinstance(reply, bytes):
+        _dims_cache.set(post_id, reply.decode().split(), DIMS_CACHE_TTL)
+    elif reply == 0:
+        _dims_cache.set(post_id, [], DIMS_CACHE_TTL)
+
+
+def _dims(category_id, tag_ids):
+    dims = [category_dim(category_id)] if category_id else []
+    dims.extend(tag_dim(tag_id) for tag_id in tag_ids)
+    return dims
+
+
+def index_post(post):
+    """Start ranking a newly published post without waiting for reconciliation"""
+    dims = _dims(post.category_id, [tag.id for tag in post.tags])
+    with pipelined() as pipe:
+        pipe.hset(DIMS_KEY, post.id, " ".join(dims))
+        pipe.sadd(MEMBERS_KEY, post.id)
+        for dim in dims:
+            pipe.sadd(f"{MEMBERS_KEY}_{dim}", post.id)
+            pipe.sadd(DIM_INDEX_KEY, dim)
+    _dims_cache.set(post.id, dims, DIMS_CACHE_TTL)
+
+
+def top(kind="trending", dim=None, limit=10, offset=0):
+    """[(post_id, score)] best first"""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown ranking: {kind}")
+    rows = redis_client.zrevrange(ranking_key(kind, dim), offset, offset + limit - 1, withscores=True)
+    return [(post_id.decode(), score) for post_id, score in rows]
+
+
+def refresh_trending(now=None):
+    """Fold the hourly buckets into the decayed trending sets"""
+    hour = current_hour(now)
+    decay = 0.5 ** (1 / HALF_LIFE_HOURS)
+    buckets = {bucket_key(hour - age): decay ** age for age in range(WINDOW_HOURS)}
+    dims = [dim.decode() for dim in redis_client.smembers(DIM_INDEX_KEY)]
+
+    with pipelined(transaction=True) as pipe:
+        pipe.zunionstore("rank_trending_tmp", buckets)
+        # Intersecting with the members set drops posts no longer published
+        pipe.zinterstore(ranking_key("trending"), {"rank_trending_tmp": 1, MEMBERS_KEY: 0})
+        pipe.delete("rank_trending_tmp")
+        for dim in dims:
+            pipe.zinterstore(ranking_key("trending", dim), {ranking_key("trending"): 1, f"{MEMBERS_KEY}_{dim}": 0})
+    return len(dims)
+
+
+def _published_batches():
+    """Published posts with their analytics in keyset batches of RECONCILE_CHUNK
+
+    Each batch is fetched in full before the next query runs, so other
+    queries can share the connection (MySQL can't interleave them with an
+    unbuffered server-side cursor).
+    """
+    from models import db, Post, PostAnalytics
+
+    last_id = None
+    while True:
+        query = (
+            db.select(Post.id, Post.category_id, PostAnalytics.views, PostAnalytics.likes)
+            .outerjoin(PostAnalytics, PostAnalytics.post_id == Post.id)
+            .where(Post.status == "published")
+        )
+        if last_id is not None:
+            query = query.where(Post.id > last_id)
+        rows = db.session.execute(query.order_by(Post.id).limit(RECONCILE_CHUNK)).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def reconcile():
+    """Rebuild popular scores, members and dims from the database"""
+    from models import db, post_tags
+    from services.analytics import pending_counts
+
+    suffix = "_rebuild"
+    dims_seen = set()
+    rebuilt = 0
+
+    redis_client.delete(DIMS_KEY + suffix, MEMBERS_KEY + suffix, ranking_key("popular") + suffix)
+    for partition in _published_batches():
+        ids = [row[0] for row in partition]
+        pending = pending_counts(ids)
+        tags = {}
+        for post_id, tag_id in db.session.execute(
+            db.select(post_tags.c.post_id, post_tags.c.tag_id).where(post_tags.c.post_id.in_(ids))
+        ):
+            tags.setdefault(post_id, []).append(tag_id)
+
+        with pipelined() as pipe:
+            for post_id, category_id, views, likes in partition:
+                delta = pending.get(post_id, {})
+                score = ((views or 0) + delta.get("views", 0)) * VIEW_WEIGHT \
+                    + ((likes or 0) + delta.get("likes", 0)) * LIKE_WEIGHT
+                dims = _dims(category_id, tags.get(post_id, []))
+                pipe.hset(DIMS_KEY + suffix, post_id, " ".join(dims))
+                pipe.sadd(MEMBERS_KEY + suffix, post_id)
+                pipe.zadd(ranking_key("popular") + suffix, {post_id: score})
+                for dim in dims:
+                    if dim not in dims_seen:
+                        pipe.delete(f"{MEMBERS_KEY}_{dim}{suffix}", ranking_key("popular", dim) + suffix)
+                        dims_seen.add(dim)
+                    pipe.sadd(f"{MEMBERS_KEY}_{dim}{suffix}", post_id)
+                    pipe.zadd(ranking_key("popular", dim) + suffix, {post_id: score})
+        rebuilt += len(ids)
+    db.session.commit()
+
+    stale = {dim.decode() for dim in redis_client.smembers(DIM_INDEX_KEY)} - dims_seen
+    with pipelined(transaction=True) as pipe:
+        # Swap everything in at once; RENAME fails on a missing source, so
+        # an empty table just deletes the live keys
+        for live in (DIMS_KEY, MEMBERS_KEY, ranking_key("popular")):
+            pipe.delete(live)
+            if rebuilt:
+                pipe.rename(live + suffix, live)
+        for dim in dims_seen:
+            pipe.rename(f"{MEMBERS_KEY}_{dim}{suffix}", f"{MEMBERS_KEY}_{dim}")
+            pipe.rename(ranking_key("popular", dim) + suffix, ranking_key("popular", dim))
+        for dim in stale:
+            pipe.delete(f"{MEMBERS_KEY}_{dim}", ranking_key("popular", dim), ranking_key("trending", dim))
+        pipe.delete(DIM_INDEX_KEY)
+        if dims_seen:
+            pipe.sadd(DIM_INDEX_KEY, *dims_seen)
+    return rebuilt
+
+
+def _claim(key, seconds):
+    # Whichever worker sets the marker does the work for this period
+    return redis_client.set(key, "1", nx=True, ex=seconds)
+
+
+def start_ranking(app, interval=REFRESH_SECONDS):
+    """Refresh trending every `interval` seconds and reconcile every RECONCILE_SECONDS, in a daemon thread"""
+
+    def run():
+        while True:
+            with app.app_context():
+                try:
+                    if _claim(RECONCILE_DUE_KEY, RECONCILE_SECONDS):
+                        reconcile()
+                    if _claim(REFRESH_DUE_KEY, interval):
+                        refresh_trending()
+                except Exception:
+                    app.logger.exception("Ranking refresh failed")
+                    from models import db
+                    db.session.rollback()
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="ranking-refresher", daemon=True)
+    thread.start()
+    return thread
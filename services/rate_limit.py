@@ -0,0 +1,169 @@
+import threading
+import time
+from config import config
+from services.cache import LRUCache
+from services.redis_store import redis_client
+
+# Rate limiting shared by every worker through Redis. Each check is a single
+# EVALSHA of one of the scripts below, so it is atomic and costs one round
+# trip. Both scripts read the clock with TIME inside Redis, so workers with
+# skewed clocks still agree on the windows.
+#
+# In front of Redis sits a per-worker pre-limiter running the same algorithm
+# on this worker's traffic only. Requests it sees are a subset of what Redis
+# sees, so when it says no the shared limit is exceeded too, and floods are
+# shed without touching Redis at all.
+
+ENABLED = getattr(config, "RATE_LIMIT_ENABLED", True)
+
+# Sliding window counter: the previous fixed window's count, weighted by how
+# much of it still overlaps the sliding window, plus the current window's.
+# State is one hash {w: window index, c: current count, p: previous count}.
+SLIDING_WINDOW = """
+if redis.replicate_commands then redis.replicate_commands() end
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local index = math.floor(now / window)
+local elapsed = now - index * window
+
+local state = redis.call('HMGET', KEYS[1], 'w', 'c', 'p')
+local w, cur, prev = tonumber(state[1]), tonumber(state[2]) or 0, tonumber(state[3]) or 0
+if w == nil or w < index - 1 then
+    cur, prev = 0, 0
+elseif w == index - 1 then
+    cur, prev = 0, cur
+end
+
+local count = prev * (window - elapsed) / window + cur
+if count + 1 > limit then
+    redis.call('HSET', KEYS[1], 'w', index, 'c', cur, 'p', prev)
+    redis.call('PEXPIRE', KEYS[1], window * 2)
+    return {0, 0, window - elapsed}
+end
+cur = cur + 1
+redis.call('HSET', KEYS[1], 'w', index, 'c', cur, 'p', prev)
+redis.call('PEXPIRE', KEYS[1], window * 2)
+return {1, math.floor(limit - count - 1), 0}
+"""
+
+# Token bucket refilled continuously at `rate` tokens per second up to
+# `capacity`. State is one hash {t: tokens, ts: last refill in ms}.
+TOKEN_BUCKET = """
+if redis.replicate_commands then redis.replicate_commands() end
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 't', 'ts')
+local tokens, ts = tonumber(state[1]), tonumber(state[2])
+if tokens == nil then tokens, ts = capacity, now end
+tokens = math.min(capacity, tokens + (now - ts) * rate / 1000)
+
+local allowed, retry = 0, 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry = math.ceil((cost - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) + 1000)
+return {allowed, math.floor(tokens), retry}
+"""
+
+_sliding_window = redis_client.register_script(SLIDING_WINDOW)
+_token_bucket = redis_client.register_script(TOKEN_BUCKET)
+
+
+class LocalSlidingWindow:
+    """In-process twin of the sliding window script for one key"""
+
+    def __init__(self, limit, window_ms):
+        self.limit = limit
+        self.window = window_ms
+        self.index = None
+        self.cur = 0
+        self.prev = 0
+
+    def hit(self, now_ms):
+        index = now_ms // self.window
+        if self.index is None or self.index < index - 1:
+            self.cur, self.prev = 0, 0
+        elif self.index == index - 1:
+            self.cur, self.prev = 0, self.cur
+        self.index = index
+        elapsed = now_ms - index * self.window
+        if self.prev * (self.window - elapsed) / self.window + self.cur + 1 > self.limit:
+            return False
+        self.cur += 1
+        return True
+
+
+class LocalTokenBucket:
+    """In-process twin of the token bucket script for one key"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.ts = None
+
+    def hit(self, now_ms, cost=1):
+        if self.ts is not None:
+            self.tokens = min(self.capacity, self.tokens + (now_ms - self.ts) * self.rate / 1000)
+        self.ts = now_ms
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+
+class RateLimiter:
+    """A named policy: `limit` requests per `period` seconds per key"""
+
+    def __init__(self, name, limit, period, algorithm="sliding", client=redis_client):
+        if algorithm not in ("sliding", "bucket"):
+            raise ValueError(f"Unknown rate limit algorithm: {algorithm}")
+        self.name = name
+        self.limit = limit
+        self.period = period
+        self.algorithm = algorithm
+        self.client = client
+        self._local = LRUCache(getattr(config, "RATE_LIMIT_LOCAL_KEYS", 50_000))
+        self._lock = threading.Lock()
+
+    def _local_hit(self, key):
+        now_ms = int(time.time() * 1000)
+        with self._lock:
+            state = self._local.get(key)
+            if state is None:
+                if self.algorithm == "sliding":
+                    state = LocalSlidingWindow(self.limit, int(self.period * 1000))
+                else:
+                    state = LocalTokenBucket(self.limit / self.period, self.limit)
+            self._local.set(key, state, self.period * 2)
+            return state.hit(now_ms)
+
+    def hit(self, key):
+        """Count one request for `key`. Returns (allowed, remaining, retry_after_seconds)."""
+        if not ENABLED:
+            return True, self.limit, 0
+        if not self._local_hit(key):
+            return False, 0, self.period
+
+        redis_key = f"rl_{self.name}_{key}"
+        try:
+            if self.algorithm == "sliding":
+                allowed, remaining, retry_ms = _sliding_window(
+                    keys=[redis_key], args=[self.limit, int(self.period * 1000)], client=self.client)
+            else:
+                allowed, remaining, retry_ms = _token_bucket(
+                    keys=[redis_key], args=[self.limit / self.period, self.limit, 1], client=self.client)
+        except Exception:
+            # Fail open: a Redis outage should not take the API down with it
+            return True, self.limit, 0
+        return bool(allowed), int(remaining), (int(retry_ms) + 999) // 1000
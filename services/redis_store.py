@@ -1,4 +1,195 @@
+import asyncio
+import hashlib
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
 import redis
+from redis.commands.core import Script
 from config import config
 
-redis_client = redis.Redis.from_url(config.REDIS_URL)
\ No newline at end of file
+# One tuned connection pool per process. BlockingConnectionPool makes callers
+# wait up to REDIS_POOL_TIMEOUT for a free connection instead of opening
+# connections without bound when traffic spikes.
+#
+# Every command or pipeline sent on a pooled connection counts as one round
+# trip against the current request (see init_redis_instrumentation), which is
+# how the per-endpoint round-trip budgets are checked. Time spent sending and
+# reading replies is accumulated alongside for services/profiling.py.
+#
+# The client itself is built on first use, not at import, so importing a
+# service (or the CLI) costs no pool setup and opens no sockets.
+
+POOL_OPTIONS = {
+    "max_connections": getattr(config, "REDIS_MAX_CONNECTIONS", 50),
+    "socket_timeout": getattr(config, "REDIS_SOCKET_TIMEOUT", 2.0),
+    "socket_connect_timeout": getattr(config, "REDIS_CONNECT_TIMEOUT", 2.0),
+    "socket_keepalive": True,
+    "health_check_interval": getattr(config, "REDIS_HEALTH_CHECK_INTERVAL", 30),
+    "retry_on_timeout": True,
+}
+POOL_TIMEOUT = getattr(config, "REDIS_POOL_TIMEOUT", 5)
+
+_round_trips = ContextVar("redis_round_trips", default=None)
+
+
+class CountingConnection(redis.Connection):
+    """Connection that counts each packet it sends as one round trip, and times them"""
+
+    def send_packed_command(self, command, check_health=True):
+        counter = _round_trips.get()
+        if counter is None:
+            return super().send_packed_command(command, check_health)
+        counter[0] += 1
+        started = time.perf_counter()
+        try:
+            return super().send_packed_command(command, check_health)
+        finally:
+            counter[1] += time.perf_counter() - started
+
+    def read_response(self, *args, **kwargs):
+        counter = _round_trips.get()
+        if counter is None:
+            return super().read_response(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().read_response(*args, **kwargs)
+        finally:
+            counter[1] += time.perf_counter() - started
+
+
+def create_client(url=None, **options):
+    """Client on its own pool; `options` override POOL_OPTIONS"""
+    pool = redis.BlockingConnectionPool.from_url(
+        url or config.REDIS_URL,
+        timeout=POOL_TIMEOUT,
+        connection_class=CountingConnection,
+        **{**POOL_OPTIONS, **options}
+    )
+    return redis.Redis(connection_pool=pool)
+
+
+class _LazyScript(Script):
+    """Lua script bound to the lazy client; its sha is computed locally"""
+
+    def __init__(self, registered_client, script):
+        self.registered_client = registered_client
+        self.script = script
+        self.sha = hashlib.sha1(script.encode() if isinstance(script, str) else script).hexdigest()
+
+
+class LazyClient:
+    """Stands in for the process's Redis client, building it on first use"""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+                client = self._client
+        return client
+
+    def register_script(self, script):
+        return _LazyScript(self, script)
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+
+# Looked up at first use, so a replaced create_client (benchmarks/env.py) applies
+redis_client = LazyClient(lambda: create_client())
+
+# Blocking reads (XREADGROUP BLOCK) wait longer than socket_timeout on an idle
+# stream, so they get a small pool of their own without one
+blocking_client = LazyClient(lambda: create_client(socket_timeout=None, max_connections=4))
+
+
+@contextmanager
+def pipelined(client=None, transaction=False, raise_on_error=True):
+    """Queue commands on a pipeline and send them in one round trip on exit
+
+    The replies are available as `pipe.results` after the block:
+
+        with pipelined() as pipe:
+            pipe.hgetall(key)
+            pipe.ttl(key)
+        data, ttl = pipe.results
+
+    With raise_on_error=False a failed command's exception is left in
+    `pipe.results` in place of its reply.
+    """
+    pipe = (client or redis_client).pipeline(transaction=transaction)
+    try:
+        yield pipe
+        pipe.results = pipe.execute(raise_on_error=raise_on_error)
+    finally:
+        pipe.reset()
+
+
+# asyncio clients are bound to the event loop they were created on, so keep
+# one per loop
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """Pooled redis.asyncio client for the running event loop"""
+    import redis.asyncio
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        pool = redis.asyncio.BlockingConnectionPool.from_url(
+            config.REDIS_URL, timeout=POOL_TIMEOUT, **POOL_OPTIONS
+        )
+        client = redis.asyncio.Redis(connection_pool=pool)
+        _async_clients[loop] = client
+    return client
+
+
+def start_counting():
+    """Start counting round trips made in the current context"""
+    return _round_trips.set([0, 0.0])
+
+
+def current_counts():
+    """(round trips, seconds spent sending and waiting) so far in the current context"""
+    counter = _round_trips.get()
+    return (counter[0], counter[1]) if counter else (0, 0.0)
+
+
+def stop_counting(token):
+    """Stop counting and return the number of round trips since start_counting()"""
+    counter = _round_trips.get()
+    _round_trips.reset(token)
+    return counter[0] if counter else 0
+
+
+# endpoint -> [requests, round trips], for this worker
+round_trip_stats = {}
+
+
+def init_redis_instrumentation(app):
+    """Report Redis round trips per request in an X-Redis-Round-Trips header"""
+    from flask import g, request
+
+    @app.before_request
+    def _start():
+        g.redis_count_token = start_counting()
+
+    @app.after_request
+    def _stop(response):
+        token = g.pop("redis_count_token", None)
+        if token is not None:
+            count = stop_counting(token)
+            stats = round_trip_stats.setdefault(request.endpoint or "unknown", [0, 0])
+            stats[0] += 1
+            stats[1] += count
+            response.headers["X-Redis-Round-Trips"] = str(count)
+        return response
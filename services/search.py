@@ -0,0 +1,273 @@
+import base64
+import html
+import json
+import queue
+import sqlite3
+import threading
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from config import config
+
+# Keyword search over posts, backed by a SQLite FTS5 index that lives next to
+# the main database (SEARCH_INDEX_PATH). FTS5 gives us BM25 ranking and
+# highlighted snippets whatever database the models run on.
+#
+# The index is kept up to date incrementally: Post inserts, updates and
+# deletes are collected at flush time and, once the transaction commits,
+# handed to a background indexer thread that re-reads those posts and
+# rewrites their index rows. Search results trail a commit by one indexer
+# round, typically a few milliseconds.
+#
+# post_id is UNINDEXED in the FTS table, so rows are never looked up by it:
+# posts_fts_ids maps each post to the rowid of its FTS row, and updates and
+# deletes go through that rowid. Highlighted titles and snippets are HTML
+# escaped, with <mark> added around the matches afterwards.
+
+INDEX_PATH = getattr(config, "SEARCH_INDEX_PATH", "search_index.db")
+MAX_PAGE_SIZE = 50
+TITLE_WEIGHT, BODY_WEIGHT, TAGS_WEIGHT = 10.0, 1.0, 5.0
+
+# Match markers for highlight()/snippet(); stripped from indexed text so
+# content can't forge them
+MARK_OPEN, MARK_CLOSE = "\x02", "\x03"
+_STRIP_MARKS = str.maketrans("", "", MARK_OPEN + MARK_CLOSE)
+
+_DELETE = "DELETE FROM posts_fts WHERE rowid = (SELECT id FROM posts_fts_ids WHERE post_id = ?)"
+_INSERT = (
+    "INSERT INTO posts_fts (rowid, post_id, status, title, body, tags)"
+    " SELECT id, ?, ?, ?, ?, ? FROM posts_fts_ids WHERE post_id = ?"
+)
+
+_local = threading.local()
+_queue = queue.Queue()
+_app = None
+_indexer_thread = None
+
+
+def _connect():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(INDEX_PATH)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5("
+            "post_id UNINDEXED, status UNINDEXED, title, body, tags, "
+            "tokenize='porter unicode61')"
+        )
+        with conn:
+            created = not conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'posts_fts_ids'"
+            ).fetchone()
+            conn.execute("CREATE TABLE IF NOT EXISTS posts_fts_ids (id INTEGER PRIMARY KEY, post_id TEXT NOT NULL UNIQUE)")
+            if created:
+                # Index built before the mapping existed
+                conn.execute("INSERT OR IGNORE INTO posts_fts_ids (id, post_id) SELECT rowid, post_id FROM posts_fts")
+        _local.conn = conn
+    return conn
+
+
+def _rows_for(post_ids):
+    """(post_id, status, title, body_md, tags) for the given posts, in two queries"""
+    from models import db, Post, Tag, post_tags
+
+    posts = db.session.execute(
+        db.select(Post.id, Post.status, Post.title, Post.body_md).where(Post.id.in_(post_ids))
+    ).all()
+    tags = {}
+    for post_id, name in db.session.execute(
+        db.select(post_tags.c.post_id, Tag.name)
+        .join(Tag, Tag.id == post_tags.c.tag_id)
+        .where(post_tags.c.post_id.in_(post_ids))
+    ):
+        tags.setdefault(post_id, []).append(name)
+    return [
+        (p.id, p.status, p.title.translate(_STRIP_MARKS), (p.body_md or "").translate(_STRIP_MARKS),
+         " ".join(tags.get(p.id, [])))
+        for p in posts
+    ]
+
+
+def _write(conn, rows):
+    conn.executemany("INSERT OR IGNORE INTO posts_fts_ids (post_id) VALUES (?)", [(row[0],) for row in rows])
+    conn.executemany(_INSERT, [(*row, row[0]) for row in rows])
+
+
+def index_posts(post_ids):
+    """Rewrite the index rows of the given posts. Must run inside an app context."""
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+    rows = _rows_for(post_ids)
+    conn = _connect()
+    with conn:
+        conn.executemany(_DELETE, [(i,) for i in post_ids])
+        _write(conn, rows)
+
+
+def remove_posts(post_ids):
+    conn = _connect()
+    with conn:
+        conn.executemany(_DELETE, [(i,) for i in post_ids])
+        conn.executemany("DELETE FROM posts_fts_ids WHERE post_id = ?", [(i,) for i in post_ids])
+
+
+def rebuild_index(batch_size=1000):
+    """Drop and rebuild the whole index. Must run inside an app context."""
+    from models import db, Post
+
+    conn = _connect()
+    with conn:
+        conn.execute("DELETE FROM posts_fts")
+        conn.execute("DELETE FROM posts_fts_ids")
+    last_id = None
+    while True:
+        query = db.select(Post.id)
+        if last_id is not None:
+            query = query.where(Post.id > last_id)
+        ids = db.session.execute(query.order_by(Post.id).limit(batch_size)).scalars().all()
+        if not ids:
+            break
+        last_id = ids[-1]
+        with conn:
+            _write(conn, _rows_for(ids))
+    with conn:
+        conn.execute("INSERT INTO posts_fts (posts_fts) VALUES ('optimize')")
+
+
+def _match_expression(q):
+    # Treat user input as plain terms so FTS5 query syntax can't be injected;
+    # the last term matches as a prefix for search-as-you-type
+    terms = [t.replace('"', '""') for t in q.split()]
+    if not terms:
+        return None
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _marked(text):
+    """HTML-escape indexed text, then turn the match markers into <mark> tags"""
+    return html.escape(text or "").replace(MARK_OPEN, "<mark>").replace(MARK_CLOSE, "</mark>")
+
+
+def encode_cursor(score, post_id):
+    return base64.urlsafe_b64encode(json.dumps([score, post_id]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    score, post_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return float(score), str(post_id)
+
+
+def search(q, limit=20, cursor=None, status="published"):
+    """BM25-ranked search. Returns (results, next_cursor)."""
+    match = _match_expression(q)
+    if match is None:
+        return [], None
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    # Keyset pagination on (score, post_id); bm25() is lower-is-better
+    sql = (
+        "SELECT rowid, post_id, score FROM ("
+        f"  SELECT rowid, post_id, bm25(posts_fts, 0, 0, {TITLE_WEIGHT}, {BODY_WEIGHT}, {TAGS_WEIGHT}) AS score"
+        "  FROM posts_fts WHERE posts_fts MATCH ? AND status = ?"
+        ")"
+    )
+    params = [match, status]
+    if cursor:
+        last_score, last_id = decode_cursor(cursor)
+        sql += " WHERE score > ? OR (score = ? AND post_id > ?)"
+        params += [last_score, last_score, last_id]
+    sql += " ORDER BY score, post_id LIMIT ?"
+    params.append(limit + 1)
+
+    conn = _connect()
+    page = conn.execute(sql, params).fetchall()
+    has_more = len(page) > limit
+    page = page[:limit]
+    if not page:
+        return [], None
+
+    # Snippets only for the rows on this page
+    rowids = [row[0] for row in page]
+    snippets = {
+        rowid: (title, body)
+        for rowid, title, body in conn.execute(
+            "SELECT rowid, highlight(posts_fts, 2, ?, ?), snippet(posts_fts, 3, ?, ?, '…', 24)"
+            f" FROM posts_fts WHERE posts_fts MATCH ? AND rowid IN ({','.join('?' * len(rowids))})",
+            [MARK_OPEN, MARK_CLOSE, MARK_OPEN, MARK_CLOSE, match, *rowids]
+        )
+    }
+
+    results = []
+    for rowid, post_id, score in page:
+        title, snippet = snippets.get(rowid, ("", ""))
+        results.append({"post_id": post_id, "score": -score, "title": _marked(title), "snippet": _marked(snippet)})
+
+    last = page[-1]
+    return results, encode_cursor(last[2], last[1]) if has_more else None
+
+
+def _collect(session, flush_context):
+    from models import Post
+    changed = session.info.setdefault("search_changed", set())
+    removed = session.info.setdefault("search_removed", set())
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Post):
+            changed.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, Post):
+            removed.add(obj.id)
+
+
+def _dispatch(session):
+    changed = session.info.pop("search_changed", set())
+    removed = session.info.pop("search_removed", set())
+    # Without an indexer in this process (CLI commands, a forked child
+    # before start_background) nothing would drain the queue
+    if _indexer_thread is None or not _indexer_thread.is_alive():
+        return
+    if changed or removed:
+        _queue.put((changed - removed, removed))
+
+
+def _discard(session):
+    session.info.pop("search_changed", None)
+    session.info.pop("search_removed", None)
+
+
+def _indexer():
+    while True:
+        changed, removed = _queue.get()
+        # Fold whatever else is waiting into the same round
+        while not _queue.empty():
+            more_changed, more_removed = _queue.get_nowait()
+            changed = (changed | more_changed) - more_removed
+            removed = (removed - more_changed) | more_removed
+        try:
+            with _app.app_context():
+                if removed:
+                    remove_posts(removed)
+                if changed:
+                    index_posts(changed)
+        except Exception:
+            _app.logger.exception("Search indexing failed")
+
+
+def init_search(app):
+    """Queue committed Post changes for the indexer, when this process runs one (see start_indexer)"""
+    global _app
+    _app = app
+    if not event.contains(Session, "after_flush", _collect):
+        event.listen(Session, "after_flush", _collect)
+        event.listen(Session, "after_commit", _dispatch)
+        event.listen(Session, "after_rollback", _discard)
+
+
+def start_indexer(app):
+    """Apply queued changes to the index in a daemon thread of this process"""
+    global _indexer_thread
+    _indexer_thread = threading.Thread(target=_indexer, name="search-indexer", daemon=True)
+    _indexer_thread.start()
+    return _indexer_thread
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+from services.redis_store import redis_client, pipelined
+from services.token_cache import REVOCATION_CHANNEL, REVOKED_INDEX
+
+# Every login gets a `session_{user_id}_{jti}` hash holding its metadata and a
+# `revoked_{jti}` marker once it is logged out. Per user we also keep a sorted
+# set `sessions_{user_id}` of jtis scored by expiry time, so listing or
+# revoking a user's sessions never has to scan the keyspace with KEYS.
+# Expired members are pruned lazily whenever the index is touched.
+
+SESSION_TTL = timedelta(hours=2)  # match token life
+
+
+def session_key(user_id, jti):
+    return f"session_{user_id}_{jti}"
+
+
+def index_key(user_id):
+    return f"sessions_{user_id}"
+
+
+def revoked_key(jti):
+    return f"revoked_{jti}"
+
+
+def _now():
+    return datetime.utcnow().timestamp()
+
+
+def _revoke(pipe, jtis, ttl):
+    # Blocklist the jtis, record them for the workers' Bloom filters and tell
+    # every worker to update its local revocation cache right away
+    expires_at = _now() + ttl.total_seconds()
+    for jti in jtis:
+        pipe.setex(revoked_key(jti), ttl, "revoked")
+    pipe.zadd(REVOKED_INDEX, {jti: expires_at for jti in jtis})
+    pipe.publish(REVOCATION_CHANNEL, ",".join(jtis))
+
+
+def create_session(user_id, jti, data, ttl=SESSION_TTL):
+    """Store session metadata and add it to the user's index in one round trip"""
+    now = _now()
+    ttl_seconds = int(ttl.total_seconds())
+    with pipelined() as pipe:
+        pipe.hset(session_key(user_id, jti), mapping=data)
+        pipe.expire(session_key(user_id, jti), ttl_seconds)
+        pipe.zremrangebyscore(index_key(user_id), "-inf", now)
+        pipe.zadd(index_key(user_id), {jti: now + ttl_seconds})
+        pipe.expire(index_key(user_id), ttl_seconds)
+
+
+def get_sessions(user_id):
+    """Return the user's live sessions in two pipelined round trips"""
+    now = _now()
+    with pipelined() as pipe:
+        pipe.zremrangebyscore(index_key(user_id), "-inf", now)
+        pipe.zrange(index_key(user_id), 0, -1, withscores=True)
+    _, members = pipe.results
+    if not members:
+        return []
+
+    jtis = [member.decode() for member, _ in members]
+    with pipelined() as pipe:
+        for jti in jtis:
+            pipe.hgetall(session_key(user_id, jti))
+            pipe.exists(revoked_key(jti))
+    results = pipe.results
+
+    sessions = []
+    stale = []
+    for i, (jti, (_, expires_at)) in enumerate(zip(jtis, members)):
+        data, revoked = results[2 * i], results[2 * i + 1]
+        if not data:
+            # Session hash expired or was deleted outside of this module
+            stale.append(jti)
+            continue
+        sessions.append({
+            "jti": jti,
+            "device": data.get(b"device", b"").decode(),
+            "ip": data.get(b"ip", b"").decode(),
+            "created_at": data.get(b"created_at", b"").decode(),
+            "last_active": data.get(b"last_active", b"").decode(),
+            "revoked": bool(revoked),
+            "expires_at": datetime.utcfromtimestamp(expires_at).isoformat()
+        })
+
+    if stale:
+        redis_client.zrem(index_key(user_id), *stale)
+    return sessions
+
+
+def revoke_token(user_id, jti, ttl=SESSION_TTL):
+    """Blocklist a token and drop its session record in one round trip"""
+    with pipelined() as pipe:
+        _revoke(pipe, [jti], ttl)
+        pipe.delete(session_key(user_id, jti))
+        pipe.zrem(index_key(user_id), jti)
+
+
+def revoke_session(user_id, jti, ttl=SESSION_TTL):
+    """Revoke one of the user's sessions. Returns False if it does not exist."""
+    with pipelined() as pipe:
+        pipe.delete(session_key(user_id, jti))
+        pipe.zrem(index_key(user_id), jti)
+    deleted, _ = pipe.results
+    if not deleted:
+        return False
+    with pipelined() as pipe:
+        _revoke(pipe, [jti], ttl)
+    return True
+
+
+def revoke_all(user_id, ttl=SESSION_TTL):
+    """Revoke every session of the user in two round trips. Returns the revoked jtis."""
+    jtis = [member.decode() for member in redis_client.zrange(index_key(user_id), 0, -1)]
+    with pipelined() as pipe:
+        if jtis:
+            _revoke(pipe, jtis, ttl)
+        for jti in jtis:
+            pipe.delete(session_key(user_id, jti))
+        pipe.delete(index_key(user_id))
+    return jtis
@@ -0,0 +1,247 @@
+import re
+import threading
+import time
+import unicodedata
+import uuid
+import redis
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from config import config
+from services.cache import LRUCache
+from services.redis_store import redis_client
+
+# Slug generation, allocation and lookup.
+#
+# Allocation is optimistic: the post is flushed with the base slug inside a
+# savepoint and the unique index on post.slug decides. On a collision the
+# next suffix comes from a Redis counter per base slug (slug_seq_{base}), so
+# concurrent creates of "hello-world" get -2, -3, ... without probing the
+# table, and the index still guarantees no duplicates if the counter is
+# behind or Redis is down.
+#
+# Lookups go local LRU -> Redis hash slug_ids -> database (post.slug, then
+# the slug_redirect table of a post's former slugs). A cached id may belong
+# to a post that has since been renamed; callers compare post.slug with the
+# requested slug and redirect.
+#
+# assign() only records the new mapping on the session; it is written to
+# slug_ids after the commit (nothing is written if it rolls back) and the
+# slugs are published on SLUG_CHANNEL so every worker drops them from its
+# local LRU, rather than resolving a reused slug to its old post for up to
+# SLUG_CACHE_TTL seconds.
+
+MAX_LENGTH = 200
+MAX_ATTEMPTS = 5
+SLUG_IDS_KEY = "slug_ids"
+SLUG_CHANNEL = "slug_changes"
+LOCAL_TTL = getattr(config, "SLUG_CACHE_TTL", 300)
+
+_NON_WORD = re.compile(r"[^\w\s-]")
+_SEPARATORS = re.compile(r"[-\s]+")
+
+# Letters NFKD does not decompose into ASCII
+_TRANSLITERATE = str.maketrans({
+    "ß": "ss", "æ": "ae", "Æ": "ae", "œ": "oe", "Œ": "oe", "ø": "o", "Ø": "o",
+    "đ": "d", "Đ": "d", "ł": "l", "Ł": "l", "þ": "th", "Þ": "th", "ð": "d",
+    "ı": "i", "’": "", "'": "",
+})
+
+try:
+    from unidecode import unidecode
+except ImportError:
+    unidecode = None
+
+# MySQL: "Duplicate entry 'x' for key 'post.slug'" (8.0.19+) or "... for key 'slug'"
+_MYSQL_DUPLICATE_KEY = re.compile(r"for key '([^']+)'$")
+_SQLITE_UNIQUE_FAILED = "UNIQUE constraint failed: "
+
+_local = LRUCache(10000)
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def slugify(text, max_length=MAX_LENGTH):
+    """URL-friendly slug: transliterated to ASCII where possible, lowercase, hyphen-separated"""
+    text = (text or "").translate(_TRANSLITERATE)
+    if unidecode is not None:
+        text = unidecode(text)
+    else:
+        # Drop accents; scripts without an ASCII decomposition are kept as-is
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    slug = _NON_WORD.sub("", text.lower())
+    slug = _SEPARATORS.sub("-", slug).strip("-")
+    if len(slug) > max_length:
+        slug = slug[:max_length].rsplit("-", 1)[0] or slug[:max_length]
+    return slug or "post"
+
+
+def _next_suffix(base):
+    try:
+        # First collision yields 2
+        return redis_client.incr(f"slug_seq_{base}") + 1
+    except redis.RedisError:
+        return uuid.uuid4().hex[:8]
+
+
+def _is_slug_conflict(error):
+    """Whether an IntegrityError was raised by the unique index on post.slug"""
+    from models import Post
+
+    table = Post.__table__.name
+    orig = error.orig
+    # PostgreSQL names the violated constraint
+    constraint = getattr(getattr(orig, "diag", None), "constraint_name", None)
+    if constraint is not None:
+        return constraint == f"{table}_slug_key"
+    message = str(orig.args[-1]) if getattr(orig, "args", None) else str(orig)
+    match = _MYSQL_DUPLICATE_KEY.search(message)
+    if match is not None:
+        return match.group(1) in ("slug", f"{table}.slug")
+    if message.startswith(_SQLITE_UNIQUE_FAILED):
+        return message[len(_SQLITE_UNIQUE_FAILED):] == f"{table}.slug"
+    return False
+
+
+def assign(post, base=None):
+    """Give `post` a unique slug derived from `base` (default: its title) and flush it
+
+    Works for new and existing posts. The caller commits; the lookup caches
+    learn the new slug once it does.
+    """
+    from models import db, SlugRedirect
+
+    base = slugify(base or post.title)
+    old_slug = post.slug if post.id else None
+    if old_slug == base:
+        return base
+
+    if old_slug:
+        # A failed savepoint expires what it touched; don't let that include
+        # the caller's other unflushed changes to this post
+        db.session.flush()
+
+    candidate = base
+    for attempt in range(MAX_ATTEMPTS):
+        post.slug = candidate
+        try:
+            with db.session.begin_nested():
+                db.session.add(post)
+                db.session.flush()
+            break
+        except IntegrityError as e:
+            if not _is_slug_conflict(e):
+                raise
+            candidate = f"{base}-{_next_suffix(base)}"
+    else:
+        post.slug = f"{base}-{uuid.uuid4().hex[:8]}"
+        db.session.add(post)
+        db.session.flush()
+
+    # The slug now belongs to this post, whoever it used to redirect to
+    SlugRedirect.query.filter_by(old_slug=post.slug).delete()
+    if old_slug and old_slug != post.slug:
+        # Cached entries for old_slug still point at this post, which is
+        # what lookups of it should find
+        db.session.add(SlugRedirect(old_slug=old_slug, post_id=post.id))
+    db.session.info.setdefault("slug_changes", {})[post.slug] = post.id
+    return post.slug
+
+
+def remember(slug, post_id):
+    _local.set(slug, post_id, LOCAL_TTL)
+    try:
+        redis_client.hset(SLUG_IDS_KEY, slug, post_id)
+    except redis.RedisError:
+        pass
+
+
+def _publish(session):
+    changes = session.info.pop("slug_changes", None)
+    if not changes:
+        return
+    for slug, post_id in changes.items():
+        _local.set(slug, post_id, LOCAL_TTL)
+    try:
+        pipe = redis_client.pipeline()
+        pipe.hset(SLUG_IDS_KEY, mapping=changes)
+        pipe.publish(SLUG_CHANNEL, ",".join(changes))
+        pipe.execute()
+    except redis.RedisError:
+        # slug_ids may still map these slugs to their previous posts
+        try:
+            redis_client.hdel(SLUG_IDS_KEY, *changes)
+        except redis.RedisError:
+            pass
+
+
+def _discard(session):
+    session.info.pop("slug_changes", None)
+
+
+def init_slugs(app):
+    """Publish slugs assigned by assign() once their transaction commits"""
+    if not event.contains(Session, "after_commit", _publish):
+        event.listen(Session, "after_commit", _publish)
+        event.listen(Session, "after_rollback", _discard)
+
+
+def _ensure_listener():
+    # Started lazily so each forked worker gets its own thread and connection
+    global _listener
+    if _listener is not None and _listener.is_alive():
+        return
+    with _listener_lock:
+        if _listener is not None and _listener.is_alive():
+            return
+        _listener = threading.Thread(target=_listen, name="slug-listener", daemon=True)
+        _listener.start()
+
+
+def _listen():
+    while True:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(SLUG_CHANNEL)
+            # Changes may have been missed while unsubscribed
+            _local.clear()
+            while True:
+                message = pubsub.get_message(timeout=1.0)
+                if message is not None:
+                    for slug in message["data"].decode().split(","):
+                        _local.delete(slug)
+        except Exception:
+            _local.clear()
+            time.sleep(1.0)
+        finally:
+            try:
+                pubsub.close()
+            except Exception:
+                pass
+
+
+def resolve(slug):
+    """Post id for a current or former slug, or None"""
+    _ensure_listener()
+    post_id = _local.get(slug)
+    if post_id is not None:
+        return post_id
+
+    try:
+        cached = redis_client.hget(SLUG_IDS_KEY, slug)
+    except redis.RedisError:
+        cached = None
+    if cached is not None:
+        post_id = cached.decode()
+        _local.set(slug, post_id, LOCAL_TTL)
+        return post_id
+
+    from models import db, Post, SlugRedirect
+    post_id = db.session.execute(db.select(Post.id).where(Post.slug == slug)).scalar()
+    if post_id is None:
+        post_id = db.session.execute(
+            db.select(SlugRedirect.post_id).where(SlugRedirect.old_slug == slug)
+        ).scalar()
+    if post_id is not None:
+        remember(slug, post_id)
+    return post_id
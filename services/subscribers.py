@@ -0,0 +1,120 @@
+import csv
+import io
+import json
+import time
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from models import db, Subscriber
+
+# Bulk subscriber import/export in constant memory.
+#
+# Imports read the input lazily, normalise and de-duplicate each chunk, and
+# insert it with one set-based "insert, skip duplicates" statement in its own
+# transaction, so an address that already exists is dropped by the unique
+# index on email instead of by a lookup per row. Exports stream rows from a
+# server-side cursor straight into the response.
+
+CHUNK_SIZE = 5000
+
+
+def _emails_from_csv(lines):
+    reader = csv.reader(lines)
+    for row in reader:
+        if not row:
+            continue
+        email = row[0].strip()
+        # Tolerate a header row
+        if email.lower() == "email":
+            continue
+        yield email
+
+
+def _emails_from_ndjson(lines):
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield json.loads(line)["email"]
+
+
+def read_emails(lines, fmt):
+    if fmt == "csv":
+        return _emails_from_csv(lines)
+    if fmt == "ndjson":
+        return _emails_from_ndjson(lines)
+    raise ValueError(f"Unsupported format: {fmt}")
+
+
+def _insert_ignore():
+    table = Subscriber.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "mysql":
+        return mysql.insert(table).prefix_with("IGNORE")
+    if dialect == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing(index_elements=["email"])
+    if dialect == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing(index_elements=["email"])
+    raise RuntimeError(f"Bulk import is not supported on {dialect}")
+
+
+def import_emails(emails, chunk_size=CHUNK_SIZE, progress=None):
+    """Insert new subscribers from an iterable of addresses
+
+    Returns {"processed", "inserted", "skipped", "seconds", "rows_per_sec"}.
+    `progress(stats)` is called after every committed chunk.
+    """
+    stmt = _insert_ignore()
+    started = time.perf_counter()
+    stats = {"processed": 0, "inserted": 0, "skipped": 0}
+
+    def flush(chunk):
+        # Subscriber.id's Python-side default fills in the uuids
+        result = db.session.execute(stmt, [{"email": email} for email in chunk])
+        db.session.commit()
+        stats["inserted"] += max(result.rowcount, 0)
+
+    chunk = set()
+    for email in emails:
+        stats["processed"] += 1
+        email = email.strip().lower()
+        if "@" not in email or len(email) > 255:
+            stats["skipped"] += 1
+            continue
+        chunk.add(email)
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = set()
+            if progress:
+                progress(stats)
+    if chunk:
+        flush(chunk)
+        if progress:
+            progress(stats)
+
+    stats["skipped"] = stats["processed"] - stats["inserted"]
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    stats["rows_per_sec"] = round(stats["processed"] / stats["seconds"]) if stats["seconds"] else stats["processed"]
+    return stats
+
+
+def iter_export(fmt, chunk_size=CHUNK_SIZE):
+    """Yield the subscriber table as CSV or NDJSON text, one chunk of rows at a time"""
+    rows = db.session.execute(
+        db.select(Subscriber.email, Subscriber.active, Subscriber.subscribed_at)
+        .order_by(Subscriber.id)
+        .execution_options(stream_results=True, yield_per=chunk_size)
+    )
+    if fmt == "csv":
+        yield "email,active,subscribed_at\r\n"
+    for partition in rows.partitions():
+        buffer = io.StringIO()
+        if fmt == "csv":
+            writer = csv.writer(buffer)
+            for email, active, subscribed_at in partition:
+                writer.writerow([email, int(bool(active)), subscribed_at.isoformat() if subscribed_at else ""])
+        else:
+            for email, active, subscribed_at in partition:
+                buffer.write(json.dumps({
+                    "email": email,
+                    "active": bool(active),
+                    "subscribed_at": subscribed_at.isoformat() if subscribed_at else None
+                }) + "\n")
+        yield buffer.getvalue()
@@ -0,0 +1,231 @@
+import threading
+import time
+from collections import Counter, defaultdict
+from sqlalchemy import event, select, func, bindparam, text, inspect as sa_inspect
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+from config import config
+
+# Tag and Category keep a denormalized posts_count, so tag clouds and category
+# lists never count posts. The counters move in the same transaction as the
+# change that causes them: before a flush that adds or deletes posts, or
+# changes a post's category or tags, the stored links of the affected posts
+# are read; after it they are read again, and the difference is applied with
+# one `posts_count = posts_count + n` UPDATE per distinct n. Statements that
+# bypass the ORM (bulk inserts, raw SQL) don't move the counters, so
+# reconcile() recomputes them with one grouped query per table every
+# COUNTS_RECONCILE_SECONDS, and on demand (postloom reconcile-counts).
+#
+# resolve_tags() turns a list of tag names into Tag rows with one
+# "insert, skip existing" statement and one SELECT, instead of a lookup and
+# insert per name.
+
+RECONCILE_SECONDS = getattr(config, "COUNTS_RECONCILE_SECONDS", 3600)
+RECONCILE_DUE_KEY = "counts_reconcile_due"
+TAG_NAME_LENGTH = 50
+
+# Post attributes whose changes move a counter
+COUNTED = ("category_id", "category", "tags")
+
+
+def _links(connection, post_ids):
+    """{post_id: (category_id, {tag_id, ...})} as currently stored"""
+    from models import Post, post_tags
+
+    links = {}
+    if not post_ids:
+        return links
+    posts = Post.__table__
+    for post_id, category_id in connection.execute(
+        select(posts.c.id, posts.c.category_id).where(posts.c.id.in_(post_ids))
+    ):
+        links[post_id] = (category_id, set())
+    for post_id, tag_id in connection.execute(
+        select(post_tags.c.post_id, post_tags.c.tag_id).where(post_tags.c.post_id.in_(post_ids))
+    ):
+        links[post_id][1].add(tag_id)
+    return links
+
+
+def _deltas(before, after):
+    categories, tags = Counter(), Counter()
+    for post_id in before.keys() | after.keys():
+        old_category, old_tags = before.get(post_id, (None, set()))
+        new_category, new_tags = after.get(post_id, (None, set()))
+        if old_category != new_category:
+            if old_category is not None:
+                categories[old_category] -= 1
+            if new_category is not None:
+                categories[new_category] += 1
+        tags.update(new_tags - old_tags)
+        tags.subtract(old_tags - new_tags)
+    return categories, tags
+
+
+def _apply(connection, table, deltas):
+    by_amount = defaultdict(list)
+    for key, amount in deltas.items():
+        if amount:
+            by_amount[amount].append(key)
+    for amount, ids in by_amount.items():
+        connection.execute(
+            table.update()
+            .where(table.c.id.in_(ids))
+            .values(posts_count=table.c.posts_count + amount)
+        )
+
+
+def _before_flush(session, flush_context, instances):
+    from models import Post
+
+    new = [obj for obj in session.new if isinstance(obj, Post)]
+    changed = [
+        obj.id for obj in session.dirty
+        if isinstance(obj, Post) and any(sa_inspect(obj).attrs[key].history.has_changes() for key in COUNTED)
+    ]
+    changed += [obj.id for obj in session.deleted if isinstance(obj, Post)]
+    if new or changed:
+        session.info["taxonomy_pending"] = (new, changed, _links(session.connection(), changed))
+    else:
+        # A failed flush never reaches _after_flush; don't apply its links later
+        session.info.pop("taxonomy_pending", None)
+
+
+def _after_flush(session, flush_context):
+    pending = session.info.pop("taxonomy_pending", None)
+    if pending is None:
+        return
+    from models import Tag, Category
+
+    new, changed, before = pending
+    connection = session.connection()
+    # Ids are assigned by now, including those of new posts and tags
+    after = _links(connection, changed + [obj.id for obj in new])
+    categories, tags = _deltas(before, after)
+    _apply(connection, Category.__table__, categories)
+    _apply(connection, Tag.__table__, tags)
+
+
+def init_taxonomy(app):
+    """Keep Tag and Category posts_count in step with committed Post changes"""
+    if not event.contains(Session, "before_flush", _before_flush):
+        event.listen(Session, "before_flush", _before_flush)
+        event.listen(Session, "after_flush", _after_flush)
+
+
+def reconcile():
+    """Recompute every posts_count from one grouped query per table
+
+    Only rows that drifted are written; returns {table: rows fixed}. A post
+    committed between the count and the write can leave one counter off by
+    one until the next run.
+    """
+    from models import db, Tag, Category, Post, post_tags
+
+    fixed = {}
+    for model, column in ((Category, Post.category_id), (Tag, post_tags.c.tag_id)):
+        counts = dict(db.session.execute(
+            select(column, func.count()).where(column.isnot(None)).group_by(column)
+        ).all())
+        drift = [
+            {"row_id": row_id, "count": counts.get(row_id, 0)}
+            for row_id, stored in db.session.execute(select(model.id, model.posts_count))
+            if stored != counts.get(row_id, 0)
+        ]
+        table = model.__table__
+        if drift:
+            db.session.execute(
+                table.update().where(table.c.id == bindparam("row_id")).values(posts_count=bindparam("count")),
+                drift
+            )
+        fixed[table.name] = len(drift)
+    db.session.commit()
+    return fixed
+
+
+def add_count_columns(engine):
+    """Add the posts_count columns to tables created before them; returns the tables altered"""
+    from models import Tag, Category
+
+    altered = []
+    columns = sa_inspect(engine)
+    for table in (Category.__table__, Tag.__table__):
+        if "posts_count" not in {column["name"] for column in columns.get_columns(table.name)}:
+            with engine.begin() as connection:
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN posts_count INTEGER NOT NULL DEFAULT 0"))
+            altered.append(table.name)
+    return altered
+
+
+def _insert_ignore():
+    from models import db, Tag
+
+    table = Tag.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "mysql":
+        return mysql.insert(table).prefix_with("IGNORE")
+    if dialect == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing(index_elements=["name"])
+    if dialect == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing(index_elements=["name"])
+    raise RuntimeError(f"Bulk tag resolution is not supported on {dialect}")
+
+
+def resolve_tags(names):
+    """Tags for `names` in the given order, creating the missing ones in one statement
+
+    Names are stripped and de-duplicated; blank ones are dropped. Raises
+    ValueError for a name longer than the column allows.
+    """
+    from models import db, Tag
+
+    wanted = []
+    for name in names:
+        name = str(name).strip()
+        if len(name) > TAG_NAME_LENGTH:
+            raise ValueError(f"Tag names are limited to {TAG_NAME_LENGTH} characters: {name[:20]}...")
+        if name and name not in wanted:
+            wanted.append(name)
+    if not wanted:
+        return []
+
+    # Tag.id's Python-side default fills in the uuids; existing names are skipped
+    db.session.execute(_insert_ignore(), [{"name": name} for name in wanted])
+    tags = Tag.query.filter(Tag.name.in_(wanted)).all()
+    # Case-insensitive collations (MySQL) match a name spelled differently
+    by_name = {tag.name: tag for tag in tags}
+    by_folded = {tag.name.casefold(): tag for tag in tags}
+    resolved = []
+    for name in wanted:
+        tag = by_name.get(name) or by_folded.get(name.casefold())
+        if tag is not None and tag not in resolved:
+            resolved.append(tag)
+    return resolved
+
+
+def _claim(key, seconds):
+    from services.redis_store import redis_client
+    # Whichever worker sets the marker does the work for this period
+    return redis_client.set(key, "1", nx=True, ex=seconds)
+
+
+def start_reconciler(app, interval=RECONCILE_SECONDS):
+    """Reconcile the counters every `interval` seconds (in one process), in a daemon thread"""
+
+    def run():
+        while True:
+            time.sleep(min(interval, 60))
+            with app.app_context():
+                try:
+                    if _claim(RECONCILE_DUE_KEY, interval):
+                        fixed = reconcile()
+                        if any(fixed.values()):
+                            app.logger.warning("posts_count drift corrected: %s", fixed)
+                except Exception:
+                    app.logger.exception("Counter reconciliation failed")
+                    from models import db
+                    db.session.rollback()
+
+    thread = threading.Thread(target=run, name="counts-reconciler", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,143 @@
+import hashlib
+import math
+import threading
+import time
+from config import config
+from services.cache import LRUCache
+from services.redis_store import redis_client
+
+# Local front for the `revoked_{jti}` blocklist so that most protected
+# requests never wait on Redis:
+#
+#   1. a bounded LRU of jtis we have already looked up (revoked or not),
+#   2. a Bloom filter of every revoked jti, rebuilt from `revoked_index`
+#      every REVOCATION_BLOOM_SYNC_SECONDS. A jti the filter has never seen
+#      is definitely not revoked.
+#
+# Revocations are published on REVOCATION_CHANNEL so every worker updates its
+# cache and filter immediately instead of waiting for the next sync. Set
+# REVOCATION_CACHE_ENABLED = False in config to go back to one Redis GET per
+# request.
+
+REVOCATION_CHANNEL = "revoked_tokens"
+REVOKED_INDEX = "revoked_index"
+
+CACHE_ENABLED = getattr(config, "REVOCATION_CACHE_ENABLED", True)
+CACHE_SIZE = getattr(config, "REVOCATION_CACHE_SIZE", 100_000)
+CACHE_TTL = getattr(config, "REVOCATION_CACHE_TTL", 30)  # seconds a "not revoked" answer is trusted
+BLOOM_SYNC_SECONDS = getattr(config, "REVOCATION_BLOOM_SYNC_SECONDS", 60)
+BLOOM_CAPACITY = getattr(config, "REVOCATION_BLOOM_CAPACITY", 1_000_000)
+BLOOM_ERROR_RATE = getattr(config, "REVOCATION_BLOOM_ERROR_RATE", 0.001)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter sized for `capacity` items at `error_rate` false positives"""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RevocationCache:
+    """Answers "is this jti revoked?" from memory when it safely can"""
+
+    def __init__(self, client=redis_client, enabled=CACHE_ENABLED):
+        self.client = client
+        self.enabled = enabled
+        self.cache = LRUCache(CACHE_SIZE)
+        self.bloom = None
+        self._synced_at = 0.0
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def is_revoked(self, jti):
+        if not self.enabled:
+            return self.client.get(f"revoked_{jti}") is not None
+
+        self._ensure_listener()
+
+        cached = self.cache.get(jti)
+        if cached is not None:
+            return cached
+
+        bloom = self.bloom
+        if bloom is not None and jti not in bloom:
+            self.cache.set(jti, False, CACHE_TTL)
+            return False
+
+        revoked = self.client.get(f"revoked_{jti}") is not None
+        # A revocation is final for the life of the token, so only the
+        # negative answer needs a short TTL
+        self.cache.set(jti, revoked, BLOOM_SYNC_SECONDS if revoked else CACHE_TTL)
+        return revoked
+
+    def mark_revoked(self, jti):
+        self.cache.set(jti, True, BLOOM_SYNC_SECONDS)
+        if self.bloom is not None:
+            self.bloom.add(jti)
+
+    def sync_bloom(self):
+        """Rebuild the Bloom filter from the set of currently revoked jtis"""
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(REVOKED_INDEX, "-inf", time.time())
+        pipe.zrange(REVOKED_INDEX, 0, -1)
+        _, members = pipe.execute()
+
+        bloom = BloomFilter(max(BLOOM_CAPACITY, len(members)), BLOOM_ERROR_RATE)
+        for member in members:
+            bloom.add(member.decode())
+        self.bloom = bloom
+        self._synced_at = time.monotonic()
+
+    def _ensure_listener(self):
+        # Started lazily so each forked worker gets its own thread and connection
+        if self._listener is not None and self._listener.is_alive():
+            return
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name="revocation-listener", daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(REVOCATION_CHANNEL)
+                # Anything revoked while we were not subscribed is picked up
+                # by a fresh sync; until then requests fall through to Redis.
+                self.cache.clear()
+                self.sync_bloom()
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        for jti in message["data"].decode().split(","):
+                            self.mark_revoked(jti)
+                    if time.monotonic() - self._synced_at >= BLOOM_SYNC_SECONDS:
+                        self.sync_bloom()
+            except Exception:
+                self.bloom = None
+                self.cache.clear()
+                time.sleep(1.0)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+
+revocation_cache = RevocationCache()
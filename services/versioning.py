@@ -0,0 +1,162 @@
+import json
+from difflib import SequenceMatcher
+from sqlalchemy import text, inspect as sa_inspect
+from config import config
+from models import db, Post, PostVersion
+
+# Post history is stored as keyframes plus deltas. Every
+# VERSION_SNAPSHOT_INTERVAL-th version keeps the full body_md; the versions in
+# between only store a line-level delta against the version before them. Any
+# version is rebuilt from its nearest snapshot with fewer than
+# VERSION_SNAPSHOT_INTERVAL delta applications.
+#
+# A delta is a JSON list of ops over the previous version's lines:
+#   [n]          copy the next n lines
+#   [-n]         skip the next n lines
+#   ["text"]     insert text (already joined, line endings included)
+
+SNAPSHOT_INTERVAL = getattr(config, "VERSION_SNAPSHOT_INTERVAL", 20)
+
+
+def make_delta(old, new):
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    ops = []
+    matcher = SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i2 - i1])
+            continue
+        if i2 > i1:
+            ops.append([-(i2 - i1)])
+        if j2 > j1:
+            ops.append(["".join(new_lines[j1:j2])])
+    return json.dumps(ops, separators=(",", ":"))
+
+
+def apply_delta(old, delta):
+    old_lines = old.splitlines(keepends=True)
+    out = []
+    pos = 0
+    for (op,) in json.loads(delta):
+        if isinstance(op, str):
+            out.append(op)
+        elif op >= 0:
+            out.extend(old_lines[pos:pos + op])
+            pos += op
+        else:
+            pos -= op
+    return "".join(out)
+
+
+def _next_version_number(post_id):
+    # The increment takes a row lock on the post, so concurrent saves of the
+    # same post are serialized until commit and never share a number. A
+    # version_count behind the stored history (rows from before the column
+    # existed) catches up to the highest version_number first.
+    current = db.func.coalesce(Post.version_count, 0)
+    highest = (db.select(db.func.coalesce(db.func.max(PostVersion.version_number), 0))
+               .where(PostVersion.post_id == post_id)
+               .scalar_subquery())
+    db.session.execute(
+        db.update(Post)
+        .where(Post.id == post_id)
+        .values(version_count=db.case((current >= highest, current), else_=highest) + 1)
+    )
+    return db.session.execute(
+        db.select(Post.version_count).where(Post.id == post_id)
+    ).scalar_one()
+
+
+def backfill_version_counts(engine):
+    """Add post.version_count to an older schema and set it from the stored history
+
+    Returns the number of posts updated.
+    """
+    post, versions = Post.__table__, PostVersion.__table__
+    if "version_count" not in {column["name"] for column in sa_inspect(engine).get_columns(post.name)}:
+        with engine.begin() as connection:
+            connection.execute(text(f"ALTER TABLE {post.name} ADD COLUMN version_count INTEGER NOT NULL DEFAULT 0"))
+
+    highest = (db.select(db.func.max(versions.c.version_number))
+               .where(versions.c.post_id == post.c.id)
+               .scalar_subquery())
+    with engine.begin() as connection:
+        return connection.execute(
+            post.update()
+            .where(post.c.version_count < highest)
+            .values(version_count=highest)
+        ).rowcount
+
+
+def _chain(post_id, version_number):
+    """Rows from the nearest snapshot up to `version_number`, oldest first"""
+    snapshot = (db.select(db.func.max(PostVersion.version_number))
+                .where(PostVersion.post_id == post_id,
+                       PostVersion.is_snapshot.is_(True),
+                       PostVersion.version_number <= version_number)
+                .scalar_subquery())
+    return (PostVersion.query
+            .filter(PostVersion.post_id == post_id,
+                    PostVersion.version_number >= snapshot,
+                    PostVersion.version_number <= version_number)
+            .order_by(PostVersion.version_number)
+            .all())
+
+
+def _rebuild(rows):
+    body = None
+    for row in rows:
+        body = row.body_md if row.is_snapshot else apply_delta(body, row.delta)
+    return body
+
+
+def get_version_body(post_id, version_number):
+    """Return the body_md of one version, or None if it does not exist"""
+    rows = _chain(post_id, version_number)
+    if not rows or rows[-1].version_number != version_number:
+        return None
+    return _rebuild(rows)
+
+
+def create_version(post):
+    """Record the post's current body_md as its next version"""
+    number = _next_version_number(post.id)
+    body = post.body_md or ""
+
+    if number == 1 or (number - 1) % SNAPSHOT_INTERVAL == 0:
+        version = PostVersion(post_id=post.id, version_number=number,
+                              is_snapshot=True, body_md=body)
+    else:
+        rows = _chain(post.id, number - 1)
+        if not rows or rows[-1].version_number != number - 1:
+            # History predates delta storage or has a gap; start a new chain
+            version = PostVersion(post_id=post.id, version_number=number,
+                                  is_snapshot=True, body_md=body)
+        else:
+            version = PostVersion(post_id=post.id, version_number=number,
+                                  is_snapshot=False, delta=make_delta(_rebuild(rows), body))
+
+    db.session.add(version)
+    return version
+
+
+def iter_history(post_id, batch_size=500):
+    """Yield (version, body_md) for every version of a post, oldest first
+
+    Rows are streamed in batches and each body is derived from the one
+    before it, so the whole history costs one delta application per version.
+    """
+    query = (PostVersion.query
+             .filter_by(post_id=post_id)
+             .order_by(PostVersion.version_number)
+             .yield_per(batch_size))
+    body = None
+    for row in query:
+        if row.is_snapshot:
+            body = row.body_md
+        elif body is not None:
+            body = apply_delta(body, row.delta)
+        else:
+            body = get_version_body(post_id, row.version_number)
+        yield row, body
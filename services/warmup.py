@@ -0,0 +1,55 @@
+import time
+from sqlalchemy import text
+
+# Boot-time warmup, run in each worker before it takes traffic, so the first
+# request after a deploy doesn't pay for lazy initialisation: it opens the
+# database and Redis pools, loads the Lua scripts, builds the markdown
+# renderer, signs and decodes a token, syncs the revocation Bloom filter and
+# renders the hottest public endpoints once through the test client, which
+# fills the local response cache as well.
+
+WARM_PATHS = ("/api/posts/", "/api/posts/popular", "/api/posts/categories", "/api/posts/tags")
+
+
+def _step(timings, name, fn):
+    started = time.perf_counter()
+    try:
+        fn()
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    except Exception as e:
+        timings[name] = f"failed: {e.__class__.__name__}: {e}"
+
+
+def warmup(app, paths=WARM_PATHS):
+    """Prime pools and caches; returns {step: milliseconds or error}"""
+    from flask_jwt_extended import create_access_token, decode_token
+    from models import db
+    from services.redis_store import redis_client
+    from services import markdown, slugs, ranking, analytics, rate_limit, job_queue, activity
+    from services.token_cache import revocation_cache
+
+    timings = {}
+    with app.app_context():
+        _step(timings, "database", lambda: db.session.execute(text("SELECT 1")))
+        _step(timings, "redis", redis_client.ping)
+
+        def load_scripts():
+            # SCRIPT LOAD now instead of a NOSCRIPT round trip on first use
+            for module in (ranking, analytics, rate_limit, job_queue, activity):
+                for value in vars(module).values():
+                    if hasattr(value, "sha") and hasattr(value, "script"):
+                        value.sha = redis_client.script_load(value.script)
+        _step(timings, "lua_scripts", load_scripts)
+
+        _step(timings, "markdown", lambda: markdown.render("# Warmup\n\nSome *text* with `code`."))
+        _step(timings, "slugs", lambda: slugs.slugify("Warmup — Ünïcode title"))
+        _step(timings, "jwt", lambda: decode_token(create_access_token(identity="warmup")))
+        _step(timings, "revocation_bloom", revocation_cache.sync_bloom)
+        db.session.remove()
+
+    client = app.test_client()
+    for path in paths:
+        _step(timings, path, lambda: client.get(path, headers={"User-Agent": "warmup"}))
+
+    app.logger.info("Warmup: %s", timings)
+    return timings
@@ -418,6 +418,14 @@ const editorConfig = {
 			}
 		]
 	},
+	simpleUpload: {
+		// Images are streamed to the media endpoint; the response's `urls`
+		// map becomes the image's srcset once the resized variants exist
+		uploadUrl: `/api/media/upload?post_id=${encodeURIComponent(document.querySelector('#editor').dataset.postId || '')}`,
+		headers: localStorage.getItem('access_token')
+			? { Authorization: `Bearer ${localStorage.getItem('access_token')}` }
+			: {}
+	},
 	table: {
 		contentToolbar: ['tableColumn', 'tableRow', 'mergeTableCells', 'tableProperties', 'tableCellProperties']
 	}
@@ -430,24 +438,73 @@ const editorConfig = {
 // 	return editor;
 // });
 
+/**
+ * Draft autosave. After the first full upload only the changed span is sent,
+ * as a splice against the revision the server last acknowledged. A 409 means
+ * our base is stale, so the next save falls back to the full document.
+ */
+const postId = document.querySelector('#editor').dataset.postId || 'new';
+const autosaveUrl = `/api/posts/drafts/${encodeURIComponent(postId)}/autosave`;
+
+function diffSplice(oldText, newText) {
+	let start = 0;
+	const maxStart = Math.min(oldText.length, newText.length);
+	while (start < maxStart && oldText[start] === newText[start]) start++;
+
+	let oldEnd = oldText.length;
+	let newEnd = newText.length;
+	while (oldEnd > start && newEnd > start && oldText[oldEnd - 1] === newText[newEnd - 1]) {
+		oldEnd--;
+		newEnd--;
+	}
+	return { start, end: oldEnd, text: newText.slice(start, newEnd) };
+}
+
+function autosaveHeaders() {
+	const headers = { 'Content-Type': 'application/json' };
+	const token = localStorage.getItem('access_token');
+	if (token) headers.Authorization = `Bearer ${token}`;
+	return headers;
+}
+
 ClassicEditor.create(document.querySelector('#editor'), editorConfig).then(editor => {
 	const wordCount = editor.plugins.get('WordCount');
 	document.querySelector('#editor-word-count').appendChild(wordCount.wordCountContainer);
 
 	let autosaveTimeout = null;
+	let savedText = null; // content as of savedRev, null until the first full upload succeeds
+	let savedRev = null;
 
-	editor.model.document.on('change:data', () => {
-		if (autosaveTimeout) clearTimeout(autosaveTimeout);
+	const save = () => {
+		const content = editor.getData();
+		if (content === savedText) return;
 
-		autosaveTimeout = setTimeout(() => {
-			fetch('/api/posts/autosave', {
-				method: 'POST',
-				headers: { 'Content-Type': 'application/json' },
-				body: JSON.stringify({ content: editor.getData() })
+		const body = savedText === null
+			? { content }
+			: { base_rev: savedRev, ...diffSplice(savedText, content), length: content.length };
+
+		fetch(autosaveUrl, {
+			method: 'POST',
+			headers: autosaveHeaders(),
+			body: JSON.stringify(body)
+		})
+			.then(res => {
+				if (res.status === 409) {
+					savedText = null;
+					return save();
+				}
+				if (!res.ok) throw new Error(`HTTP ${res.status}`);
+				return res.json().then(data => {
+					savedText = content;
+					savedRev = data.rev;
+					console.log('✅ Autosaved at', data.saved_at);
+				});
 			})
-			.then(res => res.json())
-			.then(data => console.log("✅ Autosaved at", data.saved_at))
-			.catch(err => console.error("❌ Autosave failed:", err));
-		}, 5000); // 5s debounce
+			.catch(err => console.error('❌ Autosave failed:', err));
+	};
+
+	editor.model.document.on('change:data', () => {
+		if (autosaveTimeout) clearTimeout(autosaveTimeout);
+		autosaveTimeout = setTimeout(save, 5000); // 5s debounce
 	});
 });
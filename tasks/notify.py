@@ -0,0 +1,98 @@
+import json
+import logging
+import smtplib
+import urllib.request
+from email.message import EmailMessage
+from config import config
+from models import db, Post, Subscriber
+from services.job_queue import job, enqueue_many
+
+# Jobs run when a post is published. The publish job itself only renders the
+# post and splits the subscriber table into id ranges; each range becomes its
+# own notify job, so the e-mails for a large list go out from every worker in
+# parallel and a failed batch is retried on its own.
+
+SUBSCRIBER_CHUNK = getattr(config, "NOTIFY_CHUNK_SIZE", 1000)
+SMTP_HOST = getattr(config, "SMTP_HOST", None)
+SMTP_PORT = getattr(config, "SMTP_PORT", 25)
+MAIL_FROM = getattr(config, "MAIL_FROM", "no-reply@localhost")
+WEBHOOK_URLS = getattr(config, "WEBHOOK_URLS", [])
+SITE_URL = getattr(config, "SITE_URL", "http://localhost:8057")
+
+logger = logging.getLogger(__name__)
+
+
+@job("publish_post")
+def publish_post(post_id):
+    post = db.session.get(Post, post_id)
+    if post is None or post.status != "published":
+        return
+
+    post.render_body()
+    db.session.commit()
+
+    # Walk subscriber ids once, cutting them into ranges of SUBSCRIBER_CHUNK
+    ranges = []
+    chunk = []
+    ids = db.session.execute(
+        db.select(Subscriber.id).where(Subscriber.active.is_(True)).order_by(Subscriber.id)
+        .execution_options(yield_per=SUBSCRIBER_CHUNK)
+    ).scalars()
+    for subscriber_id in ids:
+        chunk.append(subscriber_id)
+        if len(chunk) == SUBSCRIBER_CHUNK:
+            ranges.append({"post_id": post_id, "first_id": chunk[0], "last_id": chunk[-1]})
+            chunk = []
+        if len(ranges) == 100:
+            enqueue_many("notify_subscribers", ranges)
+            ranges = []
+    if chunk:
+        ranges.append({"post_id": post_id, "first_id": chunk[0], "last_id": chunk[-1]})
+    if ranges:
+        enqueue_many("notify_subscribers", ranges)
+
+    enqueue_many("fire_webhook", [
+        {"url": url, "event": {"type": "post.published", "post_id": post_id, "slug": post.slug}}
+        for url in WEBHOOK_URLS
+    ])
+
+
+@job("notify_subscribers")
+def notify_subscribers(post_id, first_id, last_id):
+    post = db.session.get(Post, post_id)
+    if post is None:
+        return
+    emails = db.session.execute(
+        db.select(Subscriber.email)
+        .where(Subscriber.active.is_(True), Subscriber.id >= first_id, Subscriber.id <= last_id)
+    ).scalars().all()
+
+    subject = f"New post: {post.title}"
+    body = f"{post.title}\n\n{SITE_URL}/api/posts/{post.slug}\n"
+
+    if not SMTP_HOST:
+        logger.info("SMTP_HOST not set; would have sent %d e-mails for %s", len(emails), post_id)
+        return
+
+    # One SMTP connection for the whole batch
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as smtp:
+        for email in emails:
+            message = EmailMessage()
+            message["From"] = MAIL_FROM
+            message["To"] = email
+            message["Subject"] = subject
+            message.set_content(body)
+            smtp.send_message(message)
+
+
+@job("fire_webhook")
+def fire_webhook(url, event):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(event).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        if response.status >= 400:
+            raise RuntimeError(f"Webhook {url} answered {response.status}")
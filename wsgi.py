@@ -0,0 +1,9 @@
+from app import create_app
+
+# Production entry point: gunicorn -c gunicorn.conf.py
+#
+# Background threads are not started here. With preload_app the app is built
+# once in the gunicorn master and forked, and threads don't survive a fork;
+# gunicorn.conf.py starts them in each worker instead (see after_fork).
+
+app = create_app(background=False)